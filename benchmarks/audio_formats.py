@@ -0,0 +1,81 @@
+"""File size, synthesis latency and download time per TTS output format.
+
+Each typical lesson length is synthesized as WAV (LINEAR16), MP3 and
+OGG_OPUS through generate_audio, then fetched from /audio/{filename}.
+Offline the TTS client is a fake whose output sizes follow the encodings'
+nominal bitrates (24 kHz LINEAR16, ~32 kbps MP3, ~24 kbps Opus) and whose
+latency grows with text length; --live uses the real Text-to-Speech API
+(needs credentials) and so reports real sizes.
+
+    python benchmarks/audio_formats.py
+    python benchmarks/audio_formats.py --live
+"""
+import argparse
+import asyncio
+import os
+import time
+import uuid
+
+import fakes
+
+LESSON_LENGTHS = {"short": 300, "medium": 1500, "long": 4000}
+SENTENCE = "Today we look at how variables hold values and how functions reuse code. "
+
+def lesson(chars):
+    return (SENTENCE * (chars // len(SENTENCE) + 1))[:chars]
+
+async def measure(lengths=LESSON_LENGTHS, formats=("wav", "mp3", "ogg"), live=False):
+    import httpx
+    import main
+    from services.tts_service import generate_audio
+
+    rows = []
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name, chars in lengths.items():
+            # A fresh text every run so the TTS cache never answers
+            text = lesson(chars) + (f" ({uuid.uuid4().hex[:8]})" if live else "")
+            for audio_format in formats:
+                start = time.perf_counter()
+                path = await asyncio.to_thread(generate_audio, text, audio_format)
+                synthesis = time.perf_counter() - start
+                start = time.perf_counter()
+                response = await client.get(f"/audio/{os.path.basename(path)}")
+                download = time.perf_counter() - start
+                rows.append({
+                    "lesson": f"{name} ({chars} chars)",
+                    "format": audio_format,
+                    "bytes": len(response.content),
+                    "kib": round(len(response.content) / 1024, 1),
+                    "synth_ms": round(synthesis * 1000, 1),
+                    "download_ms": round(download * 1000, 2),
+                })
+    wav_sizes = {row["lesson"]: row["bytes"] for row in rows if row["format"] == "wav"}
+    for row in rows:
+        if row["lesson"] in wav_sizes:
+            row["vs_wav"] = f"{row['bytes'] / wav_sizes[row['lesson']]:.0%}"
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--live", action="store_true", help="use the real Text-to-Speech API")
+    parser.add_argument("--tts-latency", type=float, default=0.2)
+    parser.add_argument("--tts-seconds-per-char", type=float, default=0.0002)
+    parser.add_argument("--lengths", help="comma-separated character counts instead of the typical lessons")
+    args = parser.parse_args()
+
+    lengths = LESSON_LENGTHS
+    if args.lengths:
+        lengths = {f"{chars}": int(chars) for chars in args.lengths.split(",")}
+    fakes.work_in_temp_dir()
+    if not args.live:
+        fakes.install(tts=fakes.FakeTTSClient(latency=args.tts_latency, seconds_per_char=args.tts_seconds_per_char),
+                      firestore=fakes.FakeFirestore())
+    with fakes.quiet():
+        import main as app_module  # noqa: F401  (imported with the fakes in place)
+        rows = asyncio.run(measure(lengths, live=args.live))
+    print(f"TTS output formats ({'live API' if args.live else 'fake client, nominal bitrates'})")
+    fakes.print_table(rows, ["lesson", "format", "kib", "vs_wav", "synth_ms", "download_ms"])
+
+if __name__ == "__main__":
+    main()
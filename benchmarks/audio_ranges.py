@@ -0,0 +1,90 @@
+"""Throughput of concurrent seeks (Range requests) into a long WAV lesson.
+
+A silent WAV of --minutes is written to a scratch audio/ directory, then
+--concurrency clients each fetch --requests random byte ranges of
+--range-kib from /audio/{filename}, the way players seek and buffer.
+A run of full-file GETs is timed alongside for comparison. Requests go
+through httpx's ASGI transport, which doesn't offer the zero-copy
+extension, so this measures the threaded read fallback.
+
+    python benchmarks/audio_ranges.py --minutes 30 --concurrency 32
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+
+import fakes
+
+FILENAME = "tts_rangebench.wav"
+
+def write_lesson(minutes):
+    os.makedirs("audio", exist_ok=True)
+    path = os.path.join("audio", FILENAME)
+    with open(path, "wb") as out:
+        out.write(fakes.wav_bytes(minutes * 60))
+    return os.path.getsize(path)
+
+async def measure(size, concurrency=16, requests=50, range_bytes=256 * 1024, full_gets=4):
+    import httpx
+    import main
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def seek(rng):
+            samples = []
+            received = 0
+            for _ in range(requests):
+                start = rng.randrange(0, max(1, size - range_bytes))
+                began = time.perf_counter()
+                response = await client.get(f"/audio/{FILENAME}",
+                                            headers={"Range": f"bytes={start}-{start + range_bytes - 1}"})
+                samples.append(time.perf_counter() - began)
+                assert response.status_code == 206, response.status_code
+                received += len(response.content)
+            return samples, received
+
+        async def download():
+            began = time.perf_counter()
+            response = await client.get(f"/audio/{FILENAME}")
+            assert response.status_code == 200, response.status_code
+            return time.perf_counter() - began, len(response.content)
+
+        rows = []
+        began = time.perf_counter()
+        results = await asyncio.gather(*(seek(random.Random(i)) for i in range(concurrency)))
+        elapsed = time.perf_counter() - began
+        samples = [sample for result, _ in results for sample in result]
+        received = sum(count for _, count in results)
+        rows.append(dict(kind=f"range {range_bytes // 1024} KiB", rps=round(len(samples) / elapsed, 1),
+                         mib_s=round(received / elapsed / 2 ** 20, 1), **fakes.summarize(samples)))
+
+        began = time.perf_counter()
+        results = await asyncio.gather(*(download() for _ in range(full_gets)))
+        elapsed = time.perf_counter() - began
+        rows.append(dict(kind="full file", rps=round(len(results) / elapsed, 1),
+                         mib_s=round(sum(count for _, count in results) / elapsed / 2 ** 20, 1),
+                         **fakes.summarize([seconds for seconds, _ in results])))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, default=30, help="length of the lesson audio")
+    parser.add_argument("--concurrency", type=int, default=16, help="clients seeking at once")
+    parser.add_argument("--requests", type=int, default=50, help="range requests per client")
+    parser.add_argument("--range-kib", type=int, default=256)
+    parser.add_argument("--full-gets", type=int, default=4, help="concurrent whole-file downloads to compare")
+    args = parser.parse_args()
+
+    fakes.work_in_temp_dir()
+    size = write_lesson(args.minutes)
+    fakes.install(firestore=fakes.FakeFirestore())
+    with fakes.quiet():
+        import main as app_module  # noqa: F401  (imported with the fakes in place)
+        rows = asyncio.run(measure(size, args.concurrency, args.requests, args.range_kib * 1024, args.full_gets))
+    print(f"{args.concurrency} clients seeking in a {args.minutes:g} minute WAV ({size / 2 ** 20:.1f} MiB)")
+    fakes.print_table(rows, ["kind", "n", "rps", "mib_s", "p50_ms", "p99_ms", "max_ms"])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Per-call cost of a fresh Google client versus the shared one from services.clients.
+
+Offline (the default) the clients use anonymous credentials and only their
+construction is timed: channel, transport and stub setup. With --live and
+working application default credentials, each iteration also makes one cheap
+RPC, so a fresh client pays credential loading and the TLS handshake again
+while the shared one reuses its channel.
+
+    python benchmarks/client_setup.py --iterations 50
+    python benchmarks/client_setup.py --live --iterations 10
+"""
+import argparse
+import os
+import time
+import warnings
+
+import fakes
+
+def _factories(live):
+    """backend -> (client factory, one cheap RPC against a client)"""
+    from google.cloud import firestore, speech, texttospeech
+
+    project = os.getenv("GOOGLE_CLOUD_PROJECT", "benchmark")
+    kwargs = {}
+    if not live:
+        from google.auth.credentials import AnonymousCredentials
+        kwargs = {"credentials": AnonymousCredentials()}
+
+    def gemini():
+        import vertexai
+        from vertexai.generative_models import GenerativeModel
+        vertexai.init(project=project, location="us-central1", **kwargs)
+        return GenerativeModel("gemini-2.5-flash-lite")
+
+    silence = speech.RecognitionAudio(content=fakes.wav_bytes(0.1, 16000)[44:])
+    speech_config = speech.RecognitionConfig(
+        encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16, sample_rate_hertz=16000, language_code="en-US")
+    return {
+        "speech": (lambda: speech.SpeechClient(**kwargs),
+                   lambda client: client.recognize(config=speech_config, audio=silence)),
+        "tts": (lambda: texttospeech.TextToSpeechClient(**kwargs),
+                lambda client: client.list_voices(language_code="en-US")),
+        "firestore": (lambda: firestore.Client(project=project, **kwargs),
+                      lambda client: client.collection("roadmaps").document("benchmark").get()),
+        "gemini": (gemini, lambda model: model.count_tokens("hello")),
+    }
+
+def measure(iterations=20, live=False, backends=None):
+    from services import clients
+
+    results = []
+    for backend, (factory, rpc) in _factories(live).items():
+        if backends and backend not in backends:
+            continue
+        timings = {}
+        for mode in ("fresh", "shared"):
+            samples = []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                if mode == "fresh":
+                    client = factory()
+                else:
+                    client = clients._get_or_create(f"benchmark:{backend}", factory)
+                if live:
+                    rpc(client)
+                samples.append(time.perf_counter() - start)
+            timings[mode] = fakes.summarize(samples)
+        results.append({
+            "backend": backend,
+            "fresh_p50_ms": timings["fresh"]["p50_ms"],
+            "shared_p50_ms": timings["shared"]["p50_ms"],
+            "fresh_p99_ms": timings["fresh"]["p99_ms"],
+            "shared_p99_ms": timings["shared"]["p99_ms"],
+        })
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--live", action="store_true", help="make one real RPC per iteration (needs credentials)")
+    parser.add_argument("--backend", action="append", choices=["speech", "tts", "firestore", "gemini"])
+    args = parser.parse_args()
+
+    warnings.simplefilter("ignore")
+    with fakes.quiet():
+        results = measure(args.iterations, args.live, args.backend)
+    print(f"Per-call client cost over {args.iterations} calls ({'with one RPC each' if args.live else 'construction only'})")
+    fakes.print_table(results, ["backend", "fresh_p50_ms", "shared_p50_ms", "fresh_p99_ms", "shared_p99_ms"])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+"""Sleeping stand-ins for the Google clients, so benchmarks run without a project.
+
+install() registers them in services.clients before the services create real
+clients; each fake sleeps for a configurable latency to play the remote call.
+"""
+import bisect
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import wave
+from types import SimpleNamespace
+
+# Make "services" importable when a script is run as benchmarks/<name>.py
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+SAMPLE_RATE = 24000
+# Roughly how long TTS audio runs per character of text
+SECONDS_PER_CHAR = 0.06
+
+def wav_bytes(seconds, sample_rate=SAMPLE_RATE):
+    """Silent mono 16-bit WAV of the given length"""
+    output = io.BytesIO()
+    with wave.open(output, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(sample_rate)
+        out.writeframes(b"\x00\x00" * int(seconds * sample_rate))
+    return output.getvalue()
+
+def fake_roadmap(topic="Python", days=7, lesson_chars=600):
+    return {
+        "topic": topic,
+        "summary": f"A {days} day plan to learn {topic} from the basics to a small project.",
+        "days": [
+            {
+                "day": day,
+                "title": f"Day {day}",
+                "tasks": ["Read", "Practice"],
+                "lesson": (f"Day {day} of {topic}. " + "Practice makes progress. " * lesson_chars)[:lesson_chars],
+            }
+            for day in range(1, days + 1)
+        ],
+    }
+
+class FakeGeminiModel:
+    """GenerativeModel.generate_content with fixed latency and a JSON roadmap (or canned text) reply.
+
+    reply may be a function of (contents, system_instruction=..., generation_config=...).
+    Prompt tokens are estimated at 4 characters each, system instruction included,
+    and each one adds seconds_per_prompt_token to the latency.
+    """
+
+    def __init__(self, latency=2.0, reply=None, days=7, chunk_chars=200, usage_tokens=None,
+                 seconds_per_prompt_token=0.0):
+        self.latency = latency
+        self.seconds_per_prompt_token = seconds_per_prompt_token
+        self.reply = reply
+        self.days = days
+        self.chunk_chars = chunk_chars
+        self.usage_tokens = usage_tokens
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def with_system_instruction(self, system_instruction=None):
+        """Stand-in for clients.get_gemini_model: one fake behind every instruction"""
+        if system_instruction is None:
+            return self
+        return SimpleNamespace(generate_content=lambda contents, stream=False, **kwargs: self.generate_content(
+            contents, stream, system_instruction=system_instruction, **kwargs))
+
+    def _text(self, contents, **kwargs):
+        if self.reply is not None:
+            return self.reply(contents, **kwargs) if callable(self.reply) else self.reply
+        return json.dumps(fake_roadmap(days=self.days))
+
+    def _usage(self, contents, system_instruction=None):
+        prompt = str(contents) + (system_instruction or "")
+        prompt_tokens = len(prompt) // 4 if self.usage_tokens is None else self.usage_tokens
+        return SimpleNamespace(prompt_token_count=prompt_tokens, cached_content_token_count=0,
+                               candidates_token_count=100)
+
+    def generate_content(self, contents, stream=False, system_instruction=None, **kwargs):
+        with self._lock:
+            self.calls += 1
+        text = self._text(contents, system_instruction=system_instruction, **kwargs)
+        usage = self._usage(contents, system_instruction)
+        latency = self.latency + self.seconds_per_prompt_token * usage.prompt_token_count
+        if stream:
+            return self._stream(text, usage, latency)
+        time.sleep(latency)
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+    def _stream(self, text, usage, latency):
+        pieces = [text[i:i + self.chunk_chars] for i in range(0, len(text), self.chunk_chars)]
+        for piece in pieces:
+            time.sleep(latency / max(1, len(pieces)))
+            yield SimpleNamespace(text=piece, usage_metadata=usage)
+
+class FakeTTSClient:
+    """TextToSpeechClient.synthesize_speech: latency plus a fixed cost per character"""
+
+    def __init__(self, latency=0.3, seconds_per_char=0.0):
+        self.latency = latency
+        self.seconds_per_char = seconds_per_char
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def synthesize_speech(self, input, voice, audio_config, timeout=None):
+        from google.cloud import texttospeech
+
+        with self._lock:
+            self.calls += 1
+        text = input.text
+        time.sleep(self.latency + self.seconds_per_char * len(text))
+        seconds = max(0.2, len(text) * SECONDS_PER_CHAR)
+        encoding = audio_config.audio_encoding
+        if encoding == texttospeech.AudioEncoding.LINEAR16:
+            audio = wav_bytes(seconds)
+        elif encoding == texttospeech.AudioEncoding.MP3:
+            # 32 kbps, about what the API returns for speech
+            audio = b"\xff\xfb" + b"\x00" * int(seconds * 4000)
+        else:
+            # Opus at about 24 kbps
+            audio = b"OggS" + b"\x00" * int(seconds * 3000)
+        return SimpleNamespace(audio_content=audio)
+
+class FakeSpeechClient:
+    """SpeechClient.recognize: rejects configs that don't match accept(config), else returns a transcript"""
+
+    def __init__(self, latency=0.5, transcript="I want to learn Python", accept=None):
+        self.latency = latency
+        self.transcript = transcript
+        self.accept = accept
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def recognize(self, config, audio, timeout=None):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        if self.accept is not None and not self.accept(config):
+            raise ValueError("Invalid recognition config")
+        alternative = SimpleNamespace(transcript=self.transcript, confidence=0.93)
+        return SimpleNamespace(results=[SimpleNamespace(alternatives=[alternative])])
+
+class _Snapshot:
+    def __init__(self, doc_id, data, fields=None):
+        self.id = doc_id
+        self.exists = data is not None
+        if data is not None and fields is not None:
+            data = {key: value for key, value in data.items() if key in fields}
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+class FakeFirestore:
+    """In-memory Firestore with a per-RPC latency and a per-document read cost.
+
+    Supports what firestore_service uses: document get/set/delete, batches,
+    subcollections, and collection queries with select, order_by, limit,
+    start_after and stream.
+    """
+
+    def __init__(self, latency=0.02, per_document=0.0):
+        self.latency = latency
+        self.per_document = per_document
+        self.docs = {}  # "collection/id[/sub/id]" -> dict
+        self.reads = 0
+        self.writes = 0
+        # (collection, order fields) -> sorted documents, for paged queries
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def _rpc(self, documents=0):
+        with self._lock:
+            self.reads += max(1, documents)
+        time.sleep(self.latency + self.per_document * documents)
+
+    def _index(self, path, fields, documents, value):
+        """(positions, documents) of a collection sorted ascending on fields, rebuilt when it changes"""
+        key = (path, fields)
+        with self._lock:
+            cached = self._indexes.get(key)
+        if cached is not None and cached[0] == (self.writes, len(self.docs)):
+            return cached[1]
+        ordered = sorted(documents(), key=lambda item: tuple(value(item[0], item[1], field) for field in fields))
+        index = ([tuple(value(doc_id, data, field) for field in fields) for doc_id, data in ordered], ordered)
+        with self._lock:
+            self._indexes[key] = ((self.writes, len(self.docs)), index)
+        return index
+
+    def collection(self, name):
+        return _Query(self, name)
+
+    def batch(self):
+        return _Batch(self)
+
+class _DocRef:
+    def __init__(self, db, path):
+        self.db = db
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    def collection(self, name):
+        return _Query(self.db, f"{self.path}/{name}")
+
+    def get(self, timeout=None):
+        self.db._rpc(1)
+        data = self.db.docs.get(self.path)
+        return _Snapshot(self.id, data)
+
+    def set(self, data, merge=False):
+        self.db._rpc()
+        self._write(data, merge)
+
+    def _write(self, data, merge):
+        from google.cloud import firestore
+
+        self.db.writes += 1
+        current = dict(self.db.docs.get(self.path) or {}) if merge else {}
+        for key, value in data.items():
+            if isinstance(value, firestore.ArrayUnion):
+                value = list(current.get(key, [])) + list(value.values)
+            current[key] = value
+        self.db.docs[self.path] = current
+
+    def delete(self):
+        self.db._rpc()
+        self.db.writes += 1
+        self.db.docs.pop(self.path, None)
+
+class _Batch:
+    def __init__(self, db):
+        self.db = db
+        self.writes = []
+
+    def set(self, ref, data, merge=False):
+        self.writes.append((ref, data, merge))
+
+    def commit(self):
+        self.db._rpc()
+        for ref, data, merge in self.writes:
+            ref._write(data, merge)
+
+class _Query:
+    def __init__(self, db, path, fields=None, orders=(), limit_to=None, after=None):
+        self.db = db
+        self.path = path
+        self.fields = fields
+        self.orders = orders
+        self.limit_to = limit_to
+        self.after = after
+
+    def _with(self, **changes):
+        state = dict(fields=self.fields, orders=self.orders, limit_to=self.limit_to, after=self.after)
+        state.update(changes)
+        return _Query(self.db, self.path, **state)
+
+    def document(self, doc_id):
+        return _DocRef(self.db, f"{self.path}/{doc_id}")
+
+    def select(self, fields):
+        return self._with(fields=list(fields))
+
+    def order_by(self, field, direction="ASCENDING"):
+        return self._with(orders=self.orders + ((field, direction == "DESCENDING"),))
+
+    def limit(self, count):
+        return self._with(limit_to=count)
+
+    def start_after(self, values):
+        return self._with(after=values)
+
+    @staticmethod
+    def _value(doc_id, data, field):
+        return doc_id if field == "__name__" else data.get(field)
+
+    def _documents(self):
+        prefix = f"{self.path}/"
+        return [
+            (path[len(prefix):], data) for path, data in list(self.db.docs.items())
+            if path.startswith(prefix) and "/" not in path[len(prefix):]
+        ]
+
+    def stream(self, timeout=None):
+        if self.orders and self.limit_to is not None and all(descending for _, descending in self.orders):
+            # Newest-first pages: walk a sorted index like Firestore would, not the whole collection
+            fields = tuple(field for field, _ in self.orders)
+            positions, items = self.db._index(self.path, fields, self._documents, self._value)
+            end = len(items)
+            if self.after is not None:
+                end = bisect.bisect_left(positions, tuple(self.after[field] for field in fields))
+            docs = items[max(0, end - self.limit_to):end][::-1]
+            self.db._rpc(len(docs))
+            return iter([_Snapshot(doc_id, data, self.fields) for doc_id, data in docs])
+        docs = self._documents()
+        for field, descending in reversed(self.orders):
+            docs.sort(key=lambda item: self._value(item[0], item[1], field), reverse=descending)
+        if self.after is not None:
+            position = tuple(self.after[field] for field, _ in self.orders)
+            for index, (doc_id, data) in enumerate(docs):
+                if tuple(self._value(doc_id, data, field) for field, _ in self.orders) == position:
+                    docs = docs[index + 1:]
+                    break
+        if self.limit_to is not None:
+            docs = docs[:self.limit_to]
+        self.db._rpc(len(docs))
+        return iter([_Snapshot(doc_id, data, self.fields) for doc_id, data in docs])
+
+def install(gemini=None, tts=None, speech=None, firestore=None):
+    """Register fakes in the shared client registry (before any service module is imported)"""
+    os.environ.setdefault("GOOGLE_CLOUD_PROJECT", "benchmark")
+    from services import clients
+
+    clients._clients["vertexai"] = True
+    for name, fake in (("gemini", gemini), ("tts", tts), ("speech", speech), ("firestore", firestore)):
+        if fake is not None:
+            clients._clients[name] = fake
+    if gemini is not None:
+        # Models with a system instruction are created per instruction
+        clients.get_gemini_model = gemini.with_system_instruction
+
+def work_in_temp_dir():
+    """Run in a scratch directory so audio/ written by the services is thrown away"""
+    directory = tempfile.mkdtemp(prefix="vlt-bench-")
+    os.chdir(directory)
+    return directory
+
+@contextlib.contextmanager
+def quiet():
+    """Silence the services' per-call logging while measuring"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    if not ordered:
+        return float("nan")
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+def summarize(samples):
+    """p50/p99/max of seconds, in milliseconds"""
+    return {
+        "n": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 2),
+        "p99_ms": round(percentile(samples, 99) * 1000, 2),
+        "max_ms": round(max(samples) * 1000, 2) if samples else float("nan"),
+    }
+
+def print_table(rows, columns):
+    widths = [max(len(str(column)), *(len(str(row.get(column, ""))) for row in rows)) for column in columns]
+    print("  ".join(str(column).ljust(width) for column, width in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(str(row.get(column, "")).ljust(width) for column, width in zip(columns, widths)))
+
@@ -0,0 +1,113 @@
+"""/health latency while roadmap generations are in flight.
+
+Gemini, TTS and Firestore are replaced by sleeping fakes, so the numbers
+show only what the app itself adds. /health is polled before and during a
+burst of concurrent /create-roadmap calls; with the blocking SDK calls on
+the worker pools its p99 should stay flat. --inline runs those calls on the
+event loop instead, as before the pools existed, for comparison.
+
+    python benchmarks/health_under_load.py --generations 50
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+os.environ.setdefault("ROADMAP_CACHE_ENABLED", "false")
+import fakes
+
+async def _inline(backend, func, *args, **kwargs):
+    return func(*args, **kwargs)
+
+def _run_inline():
+    """Call every blocking function directly on the event loop (the old behaviour)"""
+    for name, module in list(sys.modules.items()):
+        if (name == "main" or name.startswith("services.")) and hasattr(module, "run_blocking"):
+            module.run_blocking = _inline
+
+async def _poll_health(client, stop, interval, samples):
+    # Latency counts from when the poll was due, so time spent waiting for a
+    # blocked event loop shows up instead of being skipped
+    due = time.perf_counter()
+    while not stop.is_set():
+        response = await client.get("/health")
+        samples.append(time.perf_counter() - due)
+        assert response.status_code == 200
+        due = max(due + interval, time.perf_counter())
+        await asyncio.sleep(max(0, due - time.perf_counter()))
+
+async def measure(generations=50, interval=0.02, baseline_seconds=1.0):
+    import httpx
+    import main
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        idle = []
+        stop = asyncio.Event()
+        poller = asyncio.ensure_future(_poll_health(client, stop, interval, idle))
+        await asyncio.sleep(baseline_seconds)
+        stop.set()
+        await poller
+
+        loaded = []
+        stop = asyncio.Event()
+        poller = asyncio.ensure_future(_poll_health(client, stop, interval, loaded))
+
+        async def generate(index):
+            start = time.perf_counter()
+            response = await client.post("/create-roadmap", json={"prompt": f"learn topic {index} in a week"})
+            return response.status_code, time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(generate(index) for index in range(generations)))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await poller
+
+    failed = [status for status, _ in results if status != 200]
+    return {
+        "idle": fakes.summarize(idle),
+        "loaded": fakes.summarize(loaded),
+        "roadmaps": fakes.summarize([seconds for _, seconds in results]),
+        "failed": len(failed),
+        "elapsed_s": round(elapsed, 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--generations", type=int, default=50)
+    parser.add_argument("--gemini-latency", type=float, default=2.0)
+    parser.add_argument("--tts-latency", type=float, default=0.5)
+    parser.add_argument("--firestore-latency", type=float, default=0.05)
+    parser.add_argument("--interval", type=float, default=0.02, help="seconds between /health polls")
+    parser.add_argument("--baseline-seconds", type=float, default=1.0, help="idle polling before the burst")
+    parser.add_argument("--inline", action="store_true", help="run blocking calls on the event loop")
+    parser.add_argument("--max-p99-ms", type=float, help="exit 1 if /health p99 under load is above this")
+    args = parser.parse_args()
+
+    fakes.work_in_temp_dir()
+    fakes.install(
+        gemini=fakes.FakeGeminiModel(latency=args.gemini_latency),
+        tts=fakes.FakeTTSClient(latency=args.tts_latency),
+        firestore=fakes.FakeFirestore(latency=args.firestore_latency),
+    )
+    with fakes.quiet():
+        import main as app_module  # noqa: F401  (imported with the fakes in place)
+        if args.inline:
+            _run_inline()
+        result = asyncio.run(measure(args.generations, args.interval, args.baseline_seconds))
+
+    print(f"{args.generations} concurrent /create-roadmap calls "
+          f"({'inline' if args.inline else 'worker pools'}), done in {result['elapsed_s']}s, "
+          f"{result['failed']} failed")
+    fakes.print_table([
+        dict(phase="/health idle", **result["idle"]),
+        dict(phase="/health under load", **result["loaded"]),
+        dict(phase="/create-roadmap", **result["roadmaps"]),
+    ], ["phase", "n", "p50_ms", "p99_ms", "max_ms"])
+    if args.max_p99_ms is not None and result["loaded"]["p99_ms"] > args.max_p99_ms:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Roadmap and lesson read QPS with and without the in-process read cache.
+
+--roadmaps roadmaps are saved into the fake Firestore, then --concurrency
+clients read /roadmap/{id} and /get-lesson/{id}/{day} for --seconds, with
+a few popular roadmaps getting most of the traffic as in practice. The
+same load runs once with the read cache and once reading Firestore on
+every request.
+
+    python benchmarks/read_cache.py --concurrency 32 --seconds 5
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import fakes
+
+async def _load(client, roadmap_ids, concurrency, seconds, days):
+    # Zipf-like popularity: the n-th roadmap is read 1/n as often as the first
+    weights = [1 / rank for rank in range(1, len(roadmap_ids) + 1)]
+    samples = []
+    failures = 0
+    stop_at = time.perf_counter() + seconds
+
+    async def reader(seed):
+        nonlocal failures
+        rng = random.Random(seed)
+        while time.perf_counter() < stop_at:
+            roadmap_id = rng.choices(roadmap_ids, weights)[0]
+            if rng.random() < 0.5:
+                url = f"/roadmap/{roadmap_id}"
+            else:
+                url = f"/get-lesson/{roadmap_id}/{rng.randint(1, days)}"
+            start = time.perf_counter()
+            response = await client.get(url)
+            samples.append(time.perf_counter() - start)
+            failures += response.status_code != 200
+
+    start = time.perf_counter()
+    await asyncio.gather(*(reader(seed) for seed in range(concurrency)))
+    return samples, failures, time.perf_counter() - start
+
+async def measure(roadmaps=200, concurrency=16, seconds=3.0, days=7):
+    import httpx
+    import main
+    from services import firestore_service
+
+    roadmap_ids = [
+        firestore_service.save_roadmap(f"Topic {i}", f"learn topic {i}", fakes.fake_roadmap(f"Topic {i}", days))
+        for i in range(roadmaps)
+    ]
+    cached_read = firestore_service._cached_read
+    rows = []
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for mode in ("no cache", "read cache"):
+            if mode == "no cache":
+                firestore_service._cached_read = lambda key, read: read()
+            else:
+                firestore_service._cached_read = cached_read
+            reads_before = firestore_service.db.reads
+            samples, failures, elapsed = await _load(client, roadmap_ids, concurrency, seconds, days)
+            rows.append(dict(
+                mode=mode,
+                qps=round(len(samples) / elapsed, 1),
+                firestore_reads=firestore_service.db.reads - reads_before,
+                failed=failures,
+                **fakes.summarize(samples),
+            ))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--roadmaps", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=3.0, help="duration of each run")
+    parser.add_argument("--firestore-latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    fakes.work_in_temp_dir()
+    fakes.install(firestore=fakes.FakeFirestore(latency=args.firestore_latency))
+    with fakes.quiet():
+        import main as app_module  # noqa: F401  (imported with the fakes in place)
+        rows = asyncio.run(measure(args.roadmaps, args.concurrency, args.seconds))
+    print(f"{args.concurrency} clients reading {args.roadmaps} roadmaps for {args.seconds:g}s each "
+          f"({args.firestore_latency * 1000:g} ms per Firestore read)")
+    fakes.print_table(rows, ["mode", "n", "qps", "firestore_reads", "failed", "p50_ms", "p99_ms", "max_ms"])
+
+if __name__ == "__main__":
+    main()
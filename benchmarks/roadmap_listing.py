@@ -0,0 +1,111 @@
+"""GET /roadmaps page latency and documents read over a large collection.
+
+--docs synthetic roadmaps are seeded, then the listing is walked page by
+page with cursors, uncached and then with the listing cache. Each page
+should read limit + 1 documents however deep it is; the full-collection
+read the listing used to do is timed once for comparison. Offline the
+collection lives in the in-memory fake, which serves pages from a sorted
+index as Firestore does; with FIRESTORE_EMULATOR_HOST set it is seeded
+into the Firestore emulator instead (docs_read is only counted offline).
+
+    python benchmarks/roadmap_listing.py --docs 100000 --pages 20
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python benchmarks/roadmap_listing.py --docs 20000
+"""
+import argparse
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+import fakes
+
+def _roadmap(i, created_at):
+    return {
+        "topic": f"Topic {i}",
+        "description": f"learn topic {i} in a week",
+        "roadmap": {"topic": f"Topic {i}", "summary": ""},
+        "day_count": 7,
+        "summary": f"A week of topic {i}.",
+        "summary_audio_path": None,
+        "created_at": created_at,
+    }
+
+def seed(db, count):
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    if isinstance(db, fakes.FakeFirestore):
+        for i in range(count):
+            db.docs[f"roadmaps/bench-{i:07d}"] = _roadmap(i, start + timedelta(seconds=i))
+        # Build the fake's index now; Firestore maintains its indexes on write
+        query = db.collection("roadmaps").order_by("created_at", direction="DESCENDING")
+        list(query.order_by("__name__", direction="DESCENDING").limit(1).stream())
+        return
+    for first in range(0, count, 500):
+        batch = db.batch()
+        for i in range(first, min(first + 500, count)):
+            batch.set(db.collection("roadmaps").document(f"bench-{i:07d}"), _roadmap(i, start + timedelta(seconds=i)))
+        batch.commit()
+
+def _reads(db):
+    return db.reads if isinstance(db, fakes.FakeFirestore) else None
+
+def walk(pages, limit):
+    """Latency and documents read per page, following next_cursor from the first page"""
+    from services import firestore_service
+
+    samples, reads = [], []
+    cursor = None
+    for _ in range(pages):
+        before = _reads(firestore_service.db)
+        start = time.perf_counter()
+        roadmaps, cursor = firestore_service.get_all_roadmaps(limit, cursor)
+        samples.append(time.perf_counter() - start)
+        if before is not None:
+            reads.append(firestore_service.db.reads - before)
+        if cursor is None:
+            break
+    return samples, reads
+
+def measure(pages=20, limit=20):
+    from services import firestore_service
+
+    rows = []
+    firestore_service.ROADMAP_LIST_CACHE_TTL_SECONDS = 0
+    samples, reads = walk(pages, limit)
+    rows.append(dict(kind="paged, uncached", docs_read=max(reads, default="?"), **fakes.summarize(samples)))
+
+    firestore_service.ROADMAP_LIST_CACHE_TTL_SECONDS = 30
+    walk(pages, limit)
+    samples, reads = walk(pages, limit)
+    rows.append(dict(kind="paged, cached", docs_read=max(reads, default="?"), **fakes.summarize(samples)))
+
+    # What the listing did before it was paginated
+    db = firestore_service.db
+    before = _reads(db)
+    start = time.perf_counter()
+    count = sum(1 for _ in db.collection("roadmaps").order_by("created_at", direction="DESCENDING").stream())
+    elapsed = time.perf_counter() - start
+    rows.append(dict(kind=f"whole collection ({count})", docs_read=(db.reads - before) if before is not None else "?",
+                     **fakes.summarize([elapsed])))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=100000)
+    parser.add_argument("--pages", type=int, default=20, help="pages to walk with cursors")
+    parser.add_argument("--limit", type=int, default=20, help="roadmaps per page")
+    parser.add_argument("--firestore-latency", type=float, default=0.02)
+    parser.add_argument("--per-document", type=float, default=0.00002, help="fake read cost per document (seconds)")
+    args = parser.parse_args()
+
+    emulator = os.getenv("FIRESTORE_EMULATOR_HOST")
+    if not emulator:
+        fakes.install(firestore=fakes.FakeFirestore(latency=args.firestore_latency, per_document=args.per_document))
+    with fakes.quiet():
+        from services import firestore_service
+        seed(firestore_service.db, args.docs)
+        rows = measure(args.pages, args.limit)
+    print(f"Listing {args.docs} roadmaps, {args.limit} per page "
+          f"({'emulator at ' + emulator if emulator else 'in-memory fake'})")
+    fakes.print_table(rows, ["kind", "n", "docs_read", "p50_ms", "p99_ms", "max_ms"])
+
+if __name__ == "__main__":
+    main()
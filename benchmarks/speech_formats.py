@@ -0,0 +1,121 @@
+"""Recognize calls and latency per upload format, first upload vs repeats.
+
+A corpus of sample recordings (WAV, FLAC, Ogg Opus and WebM headers, plus
+headerless WebM chunks as MediaRecorder sends after the first) is sent
+through transcribe_audio. The fake Speech client only accepts the config
+that matches each sample, like the real API, so formats that can't be
+sniffed show the cost of the fallback race and what learning the format
+per content type saves on repeats. Finally a flood of distinct content
+types checks that the learned formats stay bounded.
+
+    python benchmarks/speech_formats.py --repeats 5
+"""
+import argparse
+import io
+import struct
+import time
+import wave
+
+import fakes
+
+def wav(sample_rate):
+    output = io.BytesIO()
+    with wave.open(output, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(sample_rate)
+        out.writeframes(b"\x00\x00" * (sample_rate // 10))
+    return output.getvalue()
+
+def flac(sample_rate, channels=1):
+    streaminfo = bytearray(34)
+    streaminfo[10] = (sample_rate >> 12) & 0xFF
+    streaminfo[11] = (sample_rate >> 4) & 0xFF
+    streaminfo[12] = ((sample_rate & 0x0F) << 4) | ((channels - 1) << 1)
+    return b"fLaC" + b"\x80\x00\x00\x22" + bytes(streaminfo) + bytes(4096)
+
+def ogg_opus(input_rate):
+    head = b"OpusHead" + bytes([1, 1]) + struct.pack("<H", 312) + struct.pack("<I", input_rate)
+    return b"OggS" + bytes(24) + head + bytes(4096)
+
+def webm(sample_rate):
+    return (b"\x1a\x45\xdf\xa3" + bytes(16) + b"\x86\x86A_OPUS"
+            + b"\xe1\x89\xb5\x88" + struct.pack(">d", sample_rate) + bytes(4096))
+
+# name -> (upload bytes, content type, the (encoding, sample rate) the API accepts)
+CORPUS = {
+    "wav 16k": (wav(16000), "audio/wav", ("LINEAR16", 16000)),
+    "wav 44.1k": (wav(44100), "audio/x-wav", ("LINEAR16", 44100)),
+    "flac 44.1k": (flac(44100), "audio/flac", ("FLAC", 44100)),
+    "ogg opus 16k": (ogg_opus(16000), "audio/ogg;codecs=opus", ("OGG_OPUS", 16000)),
+    "webm opus 48k": (webm(48000.0), "audio/webm;codecs=opus", ("WEBM_OPUS", 48000)),
+    "webm chunk 48k": (bytes(4096), "audio/webm;codecs=opus", ("WEBM_OPUS", 48000)),
+    "webm chunk 16k": (bytes(4096), "video/webm", ("WEBM_OPUS", 16000)),
+}
+
+class Accepting:
+    """accept() for the fake client: only the current sample's real format is valid"""
+
+    def __init__(self):
+        self.expected = None
+
+    def __call__(self, config):
+        encoding = config.encoding.name
+        return (encoding, config.sample_rate_hertz or None) == self.expected
+
+def measure(repeats=5):
+    from services import speech_service
+
+    rows = []
+    for name, (data, content_type, expected) in CORPUS.items():
+        accept.expected = expected
+        calls, samples = [], []
+        for _ in range(repeats):
+            before = speech_client.calls
+            start = time.perf_counter()
+            transcript = speech_service.transcribe_audio(data, content_type)
+            samples.append(time.perf_counter() - start)
+            calls.append(speech_client.calls - before)
+            assert transcript, name
+        rows.append({
+            "sample": name,
+            "content_type": content_type,
+            "calls_first": calls[0],
+            "calls_repeat": max(calls[1:], default=calls[0]),
+            "first_ms": round(samples[0] * 1000, 1),
+            "repeat_p50_ms": fakes.summarize(samples[1:] or samples)["p50_ms"],
+        })
+    return rows
+
+def flood(count):
+    """Learned formats after uploads with count distinct, client-chosen content types"""
+    from services import speech_service
+
+    accept.expected = ("WEBM_OPUS", 48000)
+    speech_client.latency = 0
+    for i in range(count):
+        kind = "audio/webm" if i % 2 else f"audio/x-made-up-{i}"
+        speech_service.transcribe_audio(bytes(64), f"{kind};codecs=opus;session={i}")
+    return speech_service._learned_formats.stats()["entries"]
+
+accept = Accepting()
+speech_client = fakes.FakeSpeechClient(latency=0.1, accept=accept)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=5, help="uploads of each sample")
+    parser.add_argument("--speech-latency", type=float, default=0.1)
+    parser.add_argument("--flood", type=int, default=2000, help="uploads with distinct content types")
+    args = parser.parse_args()
+
+    speech_client.latency = args.speech_latency
+    fakes.install(speech=speech_client)
+    with fakes.quiet():
+        rows = measure(args.repeats)
+        entries = flood(args.flood)
+    print(f"Speech recognition per sample format ({args.repeats} uploads each, {args.speech_latency}s per call)")
+    fakes.print_table(rows, ["sample", "content_type", "calls_first", "calls_repeat", "first_ms", "repeat_p50_ms"])
+    print(f"Learned formats after {args.flood} distinct content types: {entries}")
+
+if __name__ == "__main__":
+    main()
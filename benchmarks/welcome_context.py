@@ -0,0 +1,104 @@
+"""Prompt tokens and latency per welcome turn as a conversation grows.
+
+One welcome conversation of --turns turns goes through /welcome/chat, once
+with the token-budgeted chat window (WELCOME_CONTEXT_TOKEN_BUDGET) and once
+sending the whole history every turn, as the prompt used to. Prompt tokens
+come from the usage the fake model reports, which counts the system
+instruction too, and the fake adds --seconds-per-token of latency for each
+one the way prefill time grows with the prompt.
+
+    python benchmarks/welcome_context.py --turns 60
+"""
+import argparse
+import asyncio
+import time
+
+import fakes
+
+OPENING = ["hi", "I want to learn Python", "I have 14 days", "I'm a beginner"]
+
+def reply(contents, system_instruction=None, generation_config=None):
+    """A plain reply of about 45 words, like the instructions ask for"""
+    if "Generate a brief learning summary" in contents:
+        return "Learn Python in 14 days as a beginner, from variables and loops to a small project."
+    return ("That sounds like a great plan. We can start with the basics, practice every day and "
+            "build something small you can be proud of by the end. Is there anything else you "
+            "would like me to know before we begin? Press Enter to record your response.")
+
+def user_turns(count):
+    turns = OPENING + [f"Also, question {n}: will we cover files, testing and the standard library?"
+                       for n in range(1, count)]
+    return turns[:count]
+
+async def _conversation(client, turns):
+    """(prompt tokens, seconds) for each turn"""
+    from services.gemini_service import gemini_usage_stats
+
+    def prompt_tokens():
+        return gemini_usage_stats().get("welcome_turn", {}).get("prompt_tokens", 0)
+
+    response = await client.post("/welcome/start")
+    guest_id = response.json()["guest_id"]
+    results = []
+    for user_input in turns:
+        before = prompt_tokens()
+        start = time.perf_counter()
+        response = await client.post("/welcome/chat", json={"guest_id": guest_id, "user_input": user_input})
+        elapsed = time.perf_counter() - start
+        assert response.status_code == 200, response.text
+        results.append((prompt_tokens() - before, elapsed))
+    return results
+
+async def measure(turns=60, bucket=10):
+    import httpx
+    import main
+    from services import welcome_service
+    from services.chat_context import ChatWindow
+
+    class WholeHistory(ChatWindow):
+        @classmethod
+        def from_history(cls, history, token_budget=None):
+            return super().from_history(history, 10 ** 9)
+
+    rows = []
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        # Untimed: fills the greeting pool and pays the SDK imports
+        await _conversation(client, user_turns(2))
+        for mode, window in (("whole history", WholeHistory), ("budgeted window", ChatWindow)):
+            welcome_service.ChatWindow = window
+            results = await _conversation(client, user_turns(turns))
+            for first in range(0, len(results), bucket):
+                part = results[first:first + bucket]
+                rows.append(dict(
+                    mode=mode,
+                    turns=f"{first + 1}-{first + len(part)}",
+                    prompt_tokens=round(sum(tokens for tokens, _ in part) / len(part)),
+                    **fakes.summarize([seconds for _, seconds in part]),
+                ))
+        welcome_service.ChatWindow = ChatWindow
+    return rows
+
+gemini = fakes.FakeGeminiModel(latency=0.3, reply=reply)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=60)
+    parser.add_argument("--bucket", type=int, default=10, help="turns per row")
+    parser.add_argument("--gemini-latency", type=float, default=0.3)
+    parser.add_argument("--seconds-per-token", type=float, default=0.0002, help="fake prefill cost per prompt token")
+    args = parser.parse_args()
+
+    gemini.latency = args.gemini_latency
+    gemini.seconds_per_prompt_token = args.seconds_per_token
+    fakes.work_in_temp_dir()
+    fakes.install(gemini=gemini, tts=fakes.FakeTTSClient(latency=0.01), firestore=fakes.FakeFirestore())
+    with fakes.quiet():
+        import main as app_module  # noqa: F401  (imported with the fakes in place)
+        rows = asyncio.run(measure(args.turns, args.bucket))
+    print(f"A {args.turns} turn welcome conversation ({args.gemini_latency:g}s per Gemini call "
+          f"+ {args.seconds_per_token * 1000:g} ms per prompt token)")
+    fakes.print_table(rows, ["mode", "turns", "prompt_tokens", "n", "p50_ms", "p99_ms", "max_ms"])
+
+if __name__ == "__main__":
+    main()
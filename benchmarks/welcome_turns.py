@@ -0,0 +1,100 @@
+"""Welcome turn latency and Gemini calls per conversation, structured vs plain turns.
+
+--conversations scripted welcome conversations (greeting, topic, days,
+level, confirmation) go through /welcome/start and /welcome/chat, --concurrency
+at a time. Plain turns ask Gemini for the reply and, once the topic, days
+and level are known, make a second call for the learning summary; structured
+turns (WELCOME_STRUCTURED_TURNS) get the reply, extracted fields and summary
+from one JSON call.
+
+    python benchmarks/welcome_turns.py --conversations 20 --gemini-latency 0.8
+"""
+import argparse
+import asyncio
+import json
+import re
+import time
+
+import fakes
+
+SCRIPT = ["hi, I'm guest {n}", "I want to learn Python", "I have 14 days", "I'm a beginner", "No, that's everything", "Yes"]
+SUMMARY = "Learn Python in 14 days as a beginner, from variables and loops to a small project."
+
+def reply(contents, system_instruction=None, generation_config=None):
+    """What the fake model answers: JSON for structured turns, text otherwise"""
+    if "Generate a brief learning summary" in contents:
+        return SUMMARY
+    said = re.search(r'User just said: "(.*)"', contents)
+    text = f"Got it, {said.group(1) if said else 'thanks'}. What next? Press Enter to record your response."
+    if generation_config is None:
+        return text
+    # The progress lines show "Not collected" until the keyword extraction has all three fields
+    complete = "Not collected" not in contents and "already written" not in contents
+    return json.dumps({"reply": text, "topic": None, "days": None, "experience_level": None,
+                       "summary": SUMMARY if complete else None})
+
+async def _conversation(client, n, samples):
+    response = await client.post("/welcome/start")
+    assert response.status_code == 200, response.text
+    guest_id = response.json()["guest_id"]
+    for user_input in SCRIPT:
+        start = time.perf_counter()
+        response = await client.post("/welcome/chat", json={"guest_id": guest_id, "user_input": user_input.format(n=n)})
+        samples.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.text
+    assert response.json()["learning_summary"], "conversation ended without a summary"
+
+async def measure(conversations=20, concurrency=4):
+    import httpx
+    import main
+    from services import welcome_service
+
+    rows = []
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for mode in ("plain", "structured"):
+            welcome_service.WELCOME_STRUCTURED_TURNS = mode == "structured"
+            # One untimed conversation fills the greeting pool and pays the SDK imports
+            await _conversation(client, f"{mode}-warmup", [])
+            gemini_before, tts_before = gemini.calls, tts.calls
+            samples = []
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def run_one(n):
+                async with semaphore:
+                    await _conversation(client, f"{mode}-{n}", samples)
+
+            await asyncio.gather(*(run_one(n) for n in range(conversations)))
+            rows.append(dict(
+                mode=mode,
+                gemini_per_conversation=round((gemini.calls - gemini_before) / conversations, 2),
+                tts_per_conversation=round((tts.calls - tts_before) / conversations, 2),
+                **fakes.summarize(samples),
+            ))
+    return rows
+
+gemini = fakes.FakeGeminiModel(latency=0.8, reply=reply)
+tts = fakes.FakeTTSClient(latency=0.1)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conversations", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4, help="conversations in flight at once")
+    parser.add_argument("--gemini-latency", type=float, default=0.8)
+    parser.add_argument("--tts-latency", type=float, default=0.1)
+    args = parser.parse_args()
+
+    gemini.latency = args.gemini_latency
+    tts.latency = args.tts_latency
+    fakes.work_in_temp_dir()
+    fakes.install(gemini=gemini, tts=tts, firestore=fakes.FakeFirestore())
+    with fakes.quiet():
+        import main as app_module  # noqa: F401  (imported with the fakes in place)
+        rows = asyncio.run(measure(args.conversations, args.concurrency))
+    print(f"{args.conversations} welcome conversations of {len(SCRIPT)} turns "
+          f"({args.gemini_latency:g}s per Gemini call, {args.tts_latency:g}s per TTS call)")
+    fakes.print_table(rows, ["mode", "n", "gemini_per_conversation", "tts_per_conversation",
+                             "p50_ms", "p99_ms", "max_ms"])
+
+if __name__ == "__main__":
+    main()
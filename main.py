@@ -1,17 +1,40 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse, JSONResponse, RedirectResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+import asyncio
+import json
 import os
+import queue
 from dotenv import load_dotenv
-from services.speech_service import transcribe_audio
-from services.gemini_service import generate_roadmap
-from services.tts_service import generate_audio
-from services.firestore_service import save_roadmap, get_lesson, get_all_roadmaps, get_single_roadmap
+from google.api_core.exceptions import DeadlineExceeded
+from services.speech_service import transcribe_audio, stream_transcribe
+from services.roadmap_cache import stream_roadmap, roadmap_cache_stats
+from services.gemini_service import gemini_usage_stats
+from services.gemini_scheduler import GeminiOverloaded, gemini_scheduler_stats
+from services.tts_service import (
+    generate_audio, tts_cache_stats, resolve_audio_format, negotiate_audio_format, accepts_audio_ranges,
+    media_type_for, find_audio_variant, audio_path_for, pending_audio, stream_audio
+)
+from services.firestore_service import (
+    get_lesson, get_all_roadmaps, get_single_roadmap, roadmap_read_cache_stats, ROADMAP_PAGE_SIZE
+)
 from services.session_service import create_session, add_audio_to_session, cleanup_session
+from services.executor import run_blocking, shutdown_executors
+from services.deadlines import DeadlineMiddleware, deadline_stats
+from services.audio_response import AudioFileResponse, safe_audio_path
+from services.audio_storage import get_audio_storage, audio_url_for, audio_urls_for, audio_storage_stats
+from services.roadmap_pipeline import run_roadmap_pipeline, finish_roadmap, synthesize_until_first_chunk
+from services.clients import warm_up as warm_up_clients
+from services.session_writer import stop as stop_session_writer, session_writer_stats
+from services.janitor import start as start_janitor, stop as stop_janitor, janitor_stats
 # Import welcome service with error handling
 try:
-    from services.welcome_service import create_welcome_session, process_welcome_input, generate_roadmap_from_session
+    from services.welcome_service import (
+        create_welcome_session, process_welcome_input, generate_roadmap_from_session,
+        get_welcome_session, save_welcome_session
+    )
+    from services.prompt_pool import start as start_prompt_pool, stop as stop_prompt_pool, prompt_pool_stats
     WELCOME_SERVICE_AVAILABLE = True
 except ImportError as e:
     print(f"[WARN] Welcome service not available: {e}")
@@ -26,6 +49,8 @@ else:
 
 # Cloud Run environment detection
 IS_CLOUD_RUN = os.getenv('K_SERVICE') is not None
+# Retry-After sent with 503s when Gemini is overloaded
+GEMINI_RETRY_AFTER_SECONDS = os.getenv('GEMINI_RETRY_AFTER_SECONDS', '5')
 print(f"[ENV] Running on Cloud Run: {IS_CLOUD_RUN}")
 
 # Debug environment variables
@@ -37,6 +62,27 @@ if IS_CLOUD_RUN:
 
 app = FastAPI(title="Voice Learning Tutor API")
 
+@app.on_event("startup")
+async def startup():
+    # Build the shared Google clients before the first request arrives
+    await run_blocking("startup", warm_up_clients)
+    # Attach the storage backend before any audio is stored so every file gets published
+    await run_blocking("startup", get_audio_storage)
+    # Keeps audio/ and the session store within their budgets
+    start_janitor()
+    if WELCOME_SERVICE_AVAILABLE:
+        # Greetings and fallback lines are rendered ahead of time, off the request path
+        start_prompt_pool()
+
+@app.on_event("shutdown")
+async def shutdown():
+    stop_janitor()
+    if WELCOME_SERVICE_AVAILABLE:
+        stop_prompt_pool()
+    # Write queued welcome session changes before the pools go away
+    await run_blocking("firestore", stop_session_writer)
+    shutdown_executors(wait=False)
+
 @app.get("/")
 async def health_check():
     return {
@@ -58,6 +104,21 @@ async def readiness():
 async def liveness():
     return {"status": "alive"}
 
+@app.get("/metrics")
+async def metrics():
+    return {
+        "tts_cache": tts_cache_stats(),
+        "roadmap_cache": roadmap_cache_stats(),
+        "roadmap_read_cache": roadmap_read_cache_stats(),
+        "session_writes": session_writer_stats(),
+        "janitor": janitor_stats(),
+        "audio_storage": audio_storage_stats(),
+        "prompt_pool": prompt_pool_stats() if WELCOME_SERVICE_AVAILABLE else None,
+        "gemini_usage": gemini_usage_stats(),
+        "gemini_scheduler": gemini_scheduler_stats(),
+        "deadlines": deadline_stats()
+    }
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -66,6 +127,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Per-endpoint latency budget, passed down as RPC timeouts
+app.add_middleware(DeadlineMiddleware)
 
 class RoadmapRequest(BaseModel):
     prompt:str
@@ -73,6 +136,8 @@ class RoadmapRequest(BaseModel):
 class TTSRequest(BaseModel):
     text: str
     session_id: str = None
+    audio_format: str = None
+    chunked: bool = False
 
 class SessionRequest(BaseModel):
     session_id: str
@@ -83,6 +148,35 @@ class WelcomeRequest(BaseModel):
 
 class RoadmapGenerationRequest(BaseModel):
     learning_summary: str
+    audio_format: str = None
+
+def _requested_audio_format(audio_format=None, accept=None):
+    """Explicit format from the body wins, then the Accept header, then the deployment default"""
+    if audio_format:
+        try:
+            return resolve_audio_format(audio_format)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    negotiated = negotiate_audio_format(accept)
+    if negotiated:
+        return negotiated
+    if accept and accepts_audio_ranges(accept):
+        # The client named audio types but refused every one we can produce (e.g. q=0)
+        raise HTTPException(status_code=406, detail="None of the supported audio formats is acceptable")
+    return resolve_audio_format()
+
+async def _audio_file_response(audio_path, request):
+    # Stat and (for legacy names) ETag hashing touch the disk, keep them off the loop
+    return await run_blocking("files", AudioFileResponse, audio_path, request.headers, media_type_for(audio_path))
+
+async def _serve_audio(audio_path, request):
+    """Redirect to the storage backend when it has the file, else serve it from disk; None if neither can"""
+    url = await run_blocking("storage", audio_url_for, audio_path)
+    if not url.startswith("/audio/"):
+        return RedirectResponse(url, status_code=307)
+    if os.path.exists(audio_path):
+        return await _audio_file_response(audio_path, request)
+    return None
 
 @app.post("/capture")
 async def capture_audio(audio: UploadFile = File(...)):
@@ -94,49 +188,191 @@ async def capture_audio(audio: UploadFile = File(...)):
         audio_bytes = await audio.read()
         print(f"[CAPTURE] Read {len(audio_bytes)} bytes from file")
         
-        transcript = transcribe_audio(audio_bytes)
+        transcript = await run_blocking("speech", transcribe_audio, audio_bytes, audio.content_type)
         print(f"[CAPTURE] Transcript result: {transcript}")
         
         return {"transcript": transcript}
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         print(f"[CAPTURE] Error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _stream_transcription(websocket: WebSocket) -> str:
+    """Forward one utterance of binary audio frames to streaming recognition.
+
+    Interim and final results are sent back as JSON while audio is still
+    arriving. The utterance ends when the client sends the text frame "end".
+    Returns the final transcript; raises WebSocketDisconnect if the client leaves.
+    """
+    loop = asyncio.get_running_loop()
+    audio_frames = queue.Queue()
+    results = asyncio.Queue()
+    disconnected = False
+
+    def frames():
+        while True:
+            frame = audio_frames.get()
+            if frame is None:
+                return
+            yield frame
+
+    def recognize():
+        try:
+            for result in stream_transcribe(frames()):
+                loop.call_soon_threadsafe(results.put_nowait, result)
+        except Exception as e:
+            loop.call_soon_threadsafe(results.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(results.put_nowait, None)
+
+    async def forward_audio():
+        nonlocal disconnected
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    disconnected = True
+                    return
+                if message.get("bytes"):
+                    audio_frames.put(message["bytes"])
+                elif (message.get("text") or "").strip().lower() == "end":
+                    return
+        finally:
+            audio_frames.put(None)
+
+    recognizer = asyncio.ensure_future(run_blocking("speech_stream", recognize))
+    forwarder = asyncio.ensure_future(forward_audio())
+    final_parts = []
+    while True:
+        result = await results.get()
+        if result is None:
+            break
+        if isinstance(result, Exception):
+            # Report it now rather than after the client finishes speaking
+            forwarder.cancel()
+            await recognizer
+            raise result
+        if result["is_final"]:
+            final_parts.append(result["transcript"].strip())
+        if not disconnected:
+            await websocket.send_json({"type": "final" if result["is_final"] else "interim", **result})
+    await forwarder
+    await recognizer
+    if disconnected:
+        raise WebSocketDisconnect()
+    return " ".join(part for part in final_parts if part)
+
+@app.websocket("/capture/stream")
+async def capture_stream(websocket: WebSocket):
+    """Streaming /capture: send binary audio frames, then "end"; transcripts arrive as they are recognized"""
+    await websocket.accept()
+    try:
+        transcript = await _stream_transcription(websocket)
+        print(f"[CAPTURE] Streaming transcript: {transcript}")
+        await websocket.send_json({"type": "complete", "transcript": transcript})
+        await websocket.close()
+    except WebSocketDisconnect:
+        print("[CAPTURE] Client disconnected during streaming capture")
+    except Exception as e:
+        print(f"[CAPTURE] Streaming error: {str(e)}")
+        await websocket.send_json({"type": "error", "detail": str(e)})
+        await websocket.close(code=1011)
+
 class RoadmapRequest(BaseModel):
     prompt: str
     session_id: str = None
+    audio_format: str = None
 
 @app.post("/create-roadmap")
 async def create_roadmap(request: RoadmapRequest):
     try:
-        roadmap_json = generate_roadmap(request.prompt)
-        day1_lesson = roadmap_json["days"][0]["lesson"]
-        audio_path = generate_audio(day1_lesson)
-        
-        summary = roadmap_json.get("summary", "")
-        summary_audio_path = generate_audio(summary) if summary else None
-        
-        # Add audio files to session for cleanup
-        if request.session_id:
-            add_audio_to_session(request.session_id, audio_path)
-            if summary_audio_path:
-                add_audio_to_session(request.session_id, summary_audio_path)
-        
-        roadmap_id = save_roadmap(roadmap_json["topic"], request.prompt, roadmap_json, summary, summary_audio_path)
-        
-        return {
-            "roadmap_id": roadmap_id,
-            "roadmap": roadmap_json,
-            "day1_audio_url": f"/audio/{os.path.basename(audio_path)}",
-            "summary_audio_url": f"/audio/{os.path.basename(summary_audio_path)}" if summary_audio_path else None
-        }
+        audio_format = _requested_audio_format(request.audio_format)
+        result, timings = await run_roadmap_pipeline(request.prompt, audio_format, request.session_id)
+        return JSONResponse(result, headers={"Server-Timing": timings.header()})
+    except HTTPException:
+        raise
+    except GeminiOverloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": GEMINI_RETRY_AFTER_SECONDS})
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _format_event(event, data, sse):
+    if sse:
+        return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+    return json.dumps({"event": event, **data}, default=str) + "\n"
+
+async def _roadmap_stream_events(request: RoadmapRequest, audio_format, sse):
+    """Stream roadmap days as Gemini produces them, starting Day 1 audio as soon as Day 1 arrives"""
+    events = stream_roadmap(request.prompt)
+    done = object()
+    next_event = asyncio.ensure_future(run_blocking("gemini", next, events, done))
+    day1_audio = None
+    day1_sent = False
+    roadmap_json = None
+    try:
+        while next_event is not None or (day1_audio and not day1_sent):
+            waiting = {task for task in (next_event, None if day1_sent else day1_audio) if task}
+            await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+
+            if day1_audio and not day1_sent and day1_audio.done():
+                day1_sent = True
+                if day1_audio.exception():
+                    # The roadmap is still streamed and saved, just without Day 1 audio
+                    yield _format_event("day1_audio", {
+                        "day1_audio_url": None,
+                        "day1_first_chunk_audio_url": None,
+                        "error": str(day1_audio.exception())
+                    }, sse)
+                else:
+                    first_chunk_path, audio_path = day1_audio.result()
+                    day1_url, first_chunk_url = await run_blocking("storage", audio_urls_for, audio_path, first_chunk_path)
+                    yield _format_event("day1_audio", {
+                        "day1_audio_url": day1_url,
+                        "day1_first_chunk_audio_url": first_chunk_url
+                    }, sse)
+
+            if next_event is None or not next_event.done():
+                continue
+            item = next_event.result()
+            next_event = None
+            if item is done:
+                continue
+            kind, payload = item
+            if kind == "day":
+                yield _format_event("day", {"day": payload}, sse)
+                if day1_audio is None and payload.get("lesson"):
+                    day1_audio = asyncio.ensure_future(synthesize_until_first_chunk(payload["lesson"], audio_format))
+            else:
+                roadmap_json = payload
+                if day1_audio is None:
+                    # No day came through the stream (fallback roadmap)
+                    day1_audio = asyncio.ensure_future(
+                        synthesize_until_first_chunk(roadmap_json["days"][0]["lesson"], audio_format))
+            next_event = asyncio.ensure_future(run_blocking("gemini", next, events, done))
+
+        result = await finish_roadmap(request.prompt, roadmap_json, audio_format, request.session_id, day1_audio=day1_audio)
+        yield _format_event("complete", result, sse)
+    except Exception as e:
+        print(f"[ROADMAP] Streaming generation failed: {e}")
+        yield _format_event("error", {"detail": str(e)}, sse)
+
+@app.post("/create-roadmap/stream")
+async def create_roadmap_stream(request: RoadmapRequest, http_request: Request):
+    """NDJSON (or SSE with Accept: text/event-stream) stream of days, Day 1 audio and the saved roadmap"""
+    audio_format = _requested_audio_format(request.audio_format)
+    sse = "text/event-stream" in http_request.headers.get("accept", "")
+    return StreamingResponse(
+        _roadmap_stream_events(request, audio_format, sse),
+        media_type="text/event-stream" if sse else "application/x-ndjson"
+    )
+
 @app.get("/get-lesson/{roadmap_id}/{day}")
 async def get_lesson_endpoint(roadmap_id: str, day: int):
     try:
-        lesson = get_lesson(roadmap_id, day)
+        lesson = await run_blocking("firestore", get_lesson, roadmap_id, day)
         return lesson
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -144,41 +380,92 @@ async def get_lesson_endpoint(roadmap_id: str, day: int):
 @app.post("/create-session")
 async def create_audio_session():
     try:
-        session_id = create_session()
+        session_id = await run_blocking("sessions", create_session)
         return {"session_id": session_id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/text-to-speech")
-async def text_to_speech(request: TTSRequest):
+async def text_to_speech(request: TTSRequest, http_request: Request):
+    if not request.text.strip():
+        raise HTTPException(status_code=400, detail="text must not be empty")
+    try:
+        audio_format = _requested_audio_format(request.audio_format, http_request.headers.get("accept"))
+        if request.chunked:
+            first_chunk_path, audio_path = await synthesize_until_first_chunk(request.text, audio_format)
+        else:
+            audio_path = await run_blocking("tts", generate_audio, request.text, audio_format)
+            first_chunk_path = audio_path
+        if request.session_id:
+            await run_blocking("sessions", add_audio_to_session, request.session_id, audio_path, first_chunk_path)
+        audio_url, first_chunk_url = await run_blocking("storage", audio_urls_for, audio_path, first_chunk_path)
+        return {
+            "audio_url": audio_url,
+            "first_chunk_audio_url": first_chunk_url
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def _iterate_in_pool(backend, first_item, iterator):
+    """Async view of a blocking iterator, advanced on the backend's pool"""
+    yield first_item
+    done = object()
+    while True:
+        item = await run_blocking(backend, next, iterator, done)
+        if item is done:
+            return
+        yield item
+
+@app.post("/text-to-speech/stream")
+async def text_to_speech_stream(request: TTSRequest, http_request: Request):
+    """Stream synthesized audio while later chunks are still being synthesized"""
+    if not request.text.strip():
+        raise HTTPException(status_code=400, detail="text must not be empty")
     try:
-        audio_path = generate_audio(request.text)
+        audio_format = _requested_audio_format(request.audio_format, http_request.headers.get("accept"))
+        audio_path = audio_path_for(request.text, audio_format)
+        chunks = stream_audio(request.text, audio_format)
+        # Pull the first chunk before sending headers so synthesis errors still map to a 500
+        first_chunk = await run_blocking("tts", next, chunks, b"")
         if request.session_id:
-            add_audio_to_session(request.session_id, audio_path)
-        return {"audio_url": f"/audio/{os.path.basename(audio_path)}"}
+            await run_blocking("sessions", add_audio_to_session, request.session_id, audio_path)
+        return StreamingResponse(
+            _iterate_in_pool("tts", first_chunk, chunks),
+            media_type=media_type_for(audio_path),
+            # Not stored yet; /audio/ redirects to the storage backend once it is
+            headers={"X-Audio-Url": get_audio_storage().local_url(audio_path)}
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/cleanup-session")
 async def cleanup_audio_session(request: SessionRequest):
     try:
-        success = cleanup_session(request.session_id)
+        success = await run_blocking("sessions", cleanup_session, request.session_id)
         return {"success": success, "message": "Session cleaned up" if success else "Session not found"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/roadmaps")
-async def get_roadmaps():
+async def get_roadmaps(limit: int = ROADMAP_PAGE_SIZE, cursor: str = None):
+    if not 1 <= limit <= 100:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 100")
     try:
-        roadmaps = get_all_roadmaps()
-        return {"roadmaps": roadmaps}
+        roadmaps, next_cursor = await run_blocking("firestore", get_all_roadmaps, limit, cursor)
+        return {"roadmaps": roadmaps, "next_cursor": next_cursor}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/roadmap/{roadmap_id}")
 async def get_roadmap(roadmap_id: str):
     try:
-        roadmap = get_single_roadmap(roadmap_id)
+        roadmap = await run_blocking("firestore", get_single_roadmap, roadmap_id)
         if roadmap:
             return roadmap
         raise HTTPException(status_code=404, detail="Roadmap not found")
@@ -186,14 +473,31 @@ async def get_roadmap(roadmap_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/roadmap-summary-audio/{roadmap_id}")
-async def get_roadmap_summary_audio(roadmap_id: str):
+async def get_roadmap_summary_audio(roadmap_id: str, request: Request):
     try:
-        roadmap = get_single_roadmap(roadmap_id)
+        roadmap = await run_blocking("firestore", get_single_roadmap, roadmap_id, False)
         if roadmap and roadmap.get("summary_audio_path"):
             audio_path = roadmap["summary_audio_path"]
-            if os.path.exists(audio_path):
-                return FileResponse(audio_path, media_type="audio/wav")
+            audio_format = _requested_audio_format(accept=request.headers.get("accept"))
+            if not audio_path.endswith(f".{audio_format}"):
+                # Serve (or synthesize) the variant the client asked for
+                variant = find_audio_variant(audio_path, audio_format)
+                if variant:
+                    audio_path = variant
+                elif roadmap.get("summary"):
+                    audio_path = audio_path_for(roadmap["summary"], audio_format)
+            response = await _serve_audio(audio_path, request)
+            if response is None and roadmap.get("summary"):
+                # Saved before its synthesis finished, or evicted since: the path is content-addressed
+                audio_path = await run_blocking("tts", generate_audio, roadmap["summary"], audio_format)
+                response = await _serve_audio(audio_path, request)
+            if response is not None:
+                # The variant served here depends on the Accept header
+                response.headers["Vary"] = "Accept"
+                return response
         raise HTTPException(status_code=404, detail="Summary audio not found")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -202,7 +506,7 @@ async def start_welcome_session():
     if not WELCOME_SERVICE_AVAILABLE:
         raise HTTPException(status_code=503, detail="Welcome service not available")
     try:
-        guest_id, welcome_message, audio_url = create_welcome_session()
+        guest_id, welcome_message, audio_url = await run_blocking("welcome", create_welcome_session)
         return {
             "guest_id": guest_id,
             "message": welcome_message,
@@ -216,38 +520,104 @@ async def welcome_chat(request: WelcomeRequest):
     if not WELCOME_SERVICE_AVAILABLE:
         raise HTTPException(status_code=503, detail="Welcome service not available")
     try:
-        result = process_welcome_input(request.guest_id, request.user_input)
+        result = await run_blocking("welcome", process_welcome_input, request.guest_id, request.user_input)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.websocket("/welcome/voice/{guest_id}")
+async def welcome_voice(websocket: WebSocket, guest_id: str, audio_format: str = None):
+    """Full-duplex voice turns for the welcome conversation.
+
+    Per turn the client streams mic audio as binary frames and sends "end" when
+    the user stops speaking. The server streams back transcripts, then each
+    reply sentence as a "reply_sentence" message followed by its audio as a
+    binary frame, and finally "turn_complete" with the usual /welcome/chat result.
+    """
+    await websocket.accept()
+    if not WELCOME_SERVICE_AVAILABLE:
+        await websocket.close(code=1013, reason="Welcome service not available")
+        return
+    session = await run_blocking("welcome", get_welcome_session, guest_id)
+    if not session:
+        await websocket.close(code=4404, reason="Welcome session not found")
+        return
+    try:
+        audio_format = resolve_audio_format(audio_format)
+    except ValueError as e:
+        await websocket.close(code=1003, reason=str(e))
+        return
+
+    done = object()
+    try:
+        while True:
+            transcript = await _stream_transcription(websocket)
+            if not transcript:
+                await websocket.send_json({"type": "no_speech"})
+                continue
+
+            events = session.process_user_input_stream(transcript, audio_format)
+            while True:
+                event = await run_blocking("welcome", next, events, done)
+                if event is done:
+                    break
+                if event[0] == "sentence":
+                    _, sentence, audio = event
+                    await websocket.send_json({"type": "reply_sentence", "text": sentence})
+                    await websocket.send_bytes(audio)
+                else:
+                    result = event[1]
+                    await run_blocking("sessions", save_welcome_session, session)
+                    await websocket.send_json({"type": "turn_complete", **result})
+    except WebSocketDisconnect:
+        print(f"[WELCOME] Voice session closed for guest: {guest_id}")
+    except Exception as e:
+        print(f"[WELCOME] Voice session error: {str(e)}")
+        await websocket.send_json({"type": "error", "detail": str(e)})
+        await websocket.close(code=1011)
+
 @app.post("/welcome/generate-roadmap")
 async def generate_welcome_roadmap(request: RoadmapGenerationRequest):
     try:
         # Generate roadmap directly from learning summary
-        roadmap_json = generate_roadmap(request.learning_summary)
-        day1_lesson = roadmap_json["days"][0]["lesson"]
-        audio_path = generate_audio(day1_lesson)
-        
-        summary = roadmap_json.get("summary", "")
-        summary_audio_path = generate_audio(summary) if summary else None
-        
-        roadmap_id = save_roadmap(roadmap_json["topic"], request.learning_summary, roadmap_json, summary, summary_audio_path)
-        
-        return {
-            "roadmap_id": roadmap_id,
-            "roadmap": roadmap_json,
-            "day1_audio_url": f"/audio/{os.path.basename(audio_path)}",
-            "summary_audio_url": f"/audio/{os.path.basename(summary_audio_path)}" if summary_audio_path else None
-        }
+        audio_format = _requested_audio_format(request.audio_format)
+        result, timings = await run_roadmap_pipeline(request.learning_summary, audio_format)
+        return JSONResponse(result, headers={"Server-Timing": timings.header()})
+    except HTTPException:
+        raise
+    except GeminiOverloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": GEMINI_RETRY_AFTER_SECONDS})
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/audio/{filename}")
-async def get_audio(filename: str):
-    audio_path = f"audio/{filename}"
+async def get_audio(filename: str, request: Request):
+    audio_path = safe_audio_path(filename)
+    if not audio_path:
+        raise HTTPException(status_code=400, detail="Invalid audio filename")
+    accept = request.headers.get("accept")
+    if accept and not negotiate_audio_format(accept, [os.path.splitext(filename)[1].lstrip(".")]):
+        # The client can't play this encoding; offer another variant of the same utterance
+        audio_format = negotiate_audio_format(accept)
+        variant = find_audio_variant(audio_path, audio_format) if audio_format else None
+        if variant:
+            # Each variant keeps its own URL, so cached bytes never differ by Accept
+            return RedirectResponse(f"/audio/{os.path.basename(variant)}", status_code=307, headers={"Vary": "Accept"})
+    pending = pending_audio(audio_path)
+    if pending and not os.path.exists(audio_path):
+        # Still being synthesized in the background (chunked mode)
+        try:
+            await asyncio.wrap_future(pending)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
     if os.path.exists(audio_path):
-        return FileResponse(audio_path, media_type="audio/wav")
+        return await _audio_file_response(audio_path, request)
+    # Stored by another instance (or before a redeploy)
+    remote_url = await run_blocking("storage", get_audio_storage().remote_url, os.path.basename(audio_path))
+    if remote_url:
+        return RedirectResponse(remote_url, status_code=307)
     raise HTTPException(status_code=404, detail="Audio file not found")
 
 if __name__ == "__main__":
@@ -0,0 +1,63 @@
+"""Move roadmap days out of the roadmap document into its "days" subcollection.
+
+Usage: python migrate_roadmaps.py [--dry-run]
+
+Safe to re-run: roadmaps already in the per-day layout are skipped.
+"""
+import sys
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from services.firestore_service import db, split_roadmap, DAYS_COLLECTION
+
+# Firestore allows at most 500 writes per batch
+MAX_BATCH_WRITES = 500
+
+def migrate_roadmap(doc, dry_run=False):
+    """Write one legacy roadmap's days as documents and strip them from the header"""
+    roadmap = doc.to_dict().get("roadmap") or {}
+    if "days" not in roadmap:
+        return False
+    header, days = split_roadmap(roadmap)
+    if dry_run:
+        print(f"[MIGRATE] Would migrate {doc.id} ({len(days)} days)")
+        return True
+
+    batch = db.batch()
+    writes = 0
+    for day_data in days:
+        batch.set(doc.reference.collection(DAYS_COLLECTION).document(str(day_data["day"])), day_data)
+        writes += 1
+        if writes == MAX_BATCH_WRITES - 1:
+            batch.commit()
+            batch = db.batch()
+            writes = 0
+    # The header is rewritten last so an interrupted run is simply retried
+    batch.update(doc.reference, {
+        "roadmap": header,
+        "day_count": len(days),
+    })
+    batch.commit()
+    print(f"[MIGRATE] Migrated {doc.id} ({len(days)} days)")
+    return True
+
+def migrate_all(dry_run=False):
+    if not db:
+        print("[MIGRATE] Firestore not configured. Check GOOGLE_CLOUD_PROJECT in .env")
+        return 1
+
+    migrated, skipped = 0, 0
+    for doc in db.collection("roadmaps").order_by("__name__").stream():
+        try:
+            if migrate_roadmap(doc, dry_run):
+                migrated += 1
+            else:
+                skipped += 1
+        except Exception as e:
+            print(f"[MIGRATE] Failed to migrate {doc.id}: {e}")
+    print(f"[MIGRATE] Done: {migrated} migrated, {skipped} already in the per-day layout")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(migrate_all(dry_run="--dry-run" in sys.argv[1:]))
@@ -0,0 +1,292 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from .cache import SingleFlight
+
+AUDIO_DIR = "audio"
+TTS_CACHE_PREFIX = "tts_"
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+TTS_CACHE_MAX_AGE_SECONDS = int(os.getenv("TTS_CACHE_MAX_AGE_SECONDS", str(24 * 3600)))
+# Partial writes older than this were interrupted (newer ones may belong to another worker)
+STALE_TMP_SECONDS = 300
+
+def make_key(*parts) -> str:
+    """Stable content digest for a synthesis request (same on every worker)"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()[:32]
+
+class AudioCache:
+    """Content-addressed audio files on disk with LRU, size and idle-age eviction"""
+
+    def __init__(self, directory: str = AUDIO_DIR, max_bytes: int = TTS_CACHE_MAX_BYTES,
+                 max_age_seconds: int = TTS_CACHE_MAX_AGE_SECONDS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        # filename -> (size, last_access), least recently used first
+        self._entries: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+        # filename -> {owner: pin expiry}; pinned files are evicted only as a last resort.
+        # Pins are per process: they expire on their own so a session cleaned up
+        # on another instance doesn't keep its files here forever.
+        self._pins: Dict[str, Dict[str, float]] = {}
+        # Same, for files still being written (e.g. chunked synthesis); applied when they are stored
+        self._pending_pins: Dict[str, Dict[str, float]] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._inflight = SingleFlight()
+        # Called with the path of every newly stored file (e.g. to upload it)
+        self.on_store: List[Callable[[str], None]] = []
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.pinned_evictions = 0
+        self._load_existing()
+
+    def _load_existing(self):
+        """Index files left by a previous run so they are reused and evictable; drop interrupted writes"""
+        if not os.path.isdir(self.directory):
+            return
+        found = []
+        stale_before = time.time() - STALE_TMP_SECONDS
+        for name in os.listdir(self.directory):
+            if not name.startswith(TTS_CACHE_PREFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+                if name.endswith(".tmp"):
+                    if stat.st_mtime < stale_before:
+                        os.remove(path)
+                    continue
+            except OSError:
+                continue
+            found.append((stat.st_mtime, name, stat.st_size))
+        for mtime, name, size in sorted(found):
+            self._entries[name] = (size, mtime)
+            self._bytes += size
+
+    def path_for(self, filename: str) -> str:
+        return f"{self.directory}/{filename}"
+
+    def _pinned(self, filename: str, now: float) -> bool:
+        owners = self._pins.get(filename)
+        return bool(owners) and max(owners.values()) > now
+
+    def _lookup(self, filename: str) -> bool:
+        """Whether filename is a live entry; marks it recently used and counts a hit"""
+        with self._lock:
+            entry = self._entries.get(filename)
+            if entry is None:
+                return False
+            size, last_access = entry
+            now = time.time()
+            expired = now - last_access > self.max_age_seconds and not self._pinned(filename, now)
+            if expired or not os.path.exists(self.path_for(filename)):
+                # Expired, or removed from disk behind our back
+                self._drop(filename)
+                return False
+            self._entries[filename] = (size, now)
+            self._entries.move_to_end(filename)
+            self.hits += 1
+            return True
+
+    def _drop(self, filename: str):
+        size, _ = self._entries.pop(filename)
+        self._bytes -= size
+
+    def _store(self, filename: str, data: bytes):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path_for(filename)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as out:
+            out.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if filename in self._entries:
+                self._drop(filename)
+            self._entries[filename] = (len(data), time.time())
+            self._bytes += len(data)
+            pending = self._pending_pins.pop(filename, None)
+            if pending:
+                self._pins.setdefault(filename, {}).update(pending)
+        for hook in self.on_store:
+            try:
+                hook(path)
+            except Exception as e:
+                print(f"[TTS_CACHE] Store hook failed for {filename}: {e}")
+        self.evict()
+
+    def filename_for(self, key: str, extension: str) -> str:
+        return f"{TTS_CACHE_PREFIX}{key}.{extension}"
+
+    def put(self, key: str, extension: str, data: bytes) -> str:
+        """Store already synthesized audio under key and return its path"""
+        filename = self.filename_for(key, extension)
+        self._store(filename, data)
+        return self.path_for(filename)
+
+    def cached_path(self, key: str, extension: str):
+        """Path of a live cache entry for key, or None (counts as a hit when found)"""
+        filename = self.filename_for(key, extension)
+        if self._lookup(filename):
+            return self.path_for(filename)
+        return None
+
+    def tracks(self, filename: str) -> bool:
+        """Whether filename is a file managed by this cache"""
+        with self._lock:
+            return filename in self._entries
+
+    def manages(self, path: str) -> bool:
+        """Whether path is (or will be, once written) one of this cache's files"""
+        return os.path.dirname(path) == self.directory and os.path.basename(path).startswith(TTS_CACHE_PREFIX)
+
+    def pin(self, path: str, owner: str, ttl_seconds: float):
+        """Keep a cached file on disk while owner (e.g. a session) uses it, for at most ttl_seconds.
+
+        A file that isn't stored yet is pinned as soon as it is.
+        """
+        filename = os.path.basename(path)
+        with self._lock:
+            pins = self._pins if filename in self._entries else self._pending_pins
+            pins.setdefault(filename, {})[owner] = time.time() + ttl_seconds
+
+    def unpin(self, path: str, owner: str):
+        """Release owner's reference; the file stays cached until normal eviction"""
+        filename = os.path.basename(path)
+        with self._lock:
+            for pins in (self._pins, self._pending_pins):
+                owners = pins.get(filename)
+                if owners is not None:
+                    owners.pop(owner, None)
+                    if not owners:
+                        del pins[filename]
+
+    def pending(self, filename: str):
+        """Future for a file that is still being produced, or None"""
+        return self._inflight.pending(filename)
+
+    def get_or_create(self, key: str, extension: str, producer: Callable[[], bytes]) -> str:
+        """Return the cached file for key, calling producer at most once per key on a miss"""
+        filename = self.filename_for(key, extension)
+        if self._lookup(filename):
+            return self.path_for(filename)
+
+        def build():
+            # A concurrent caller may have just finished building it
+            if self._lookup(filename):
+                return self.path_for(filename)
+            with self._lock:
+                self.misses += 1
+            self._store(filename, producer())
+            return self.path_for(filename)
+
+        return self._inflight.do(filename, build)
+
+    def stream(self, key: str, extension: str, produce: Callable[[], Iterator[bytes]],
+               block_bytes: int = 64 * 1024) -> Iterator[bytes]:
+        """Yield the file for key, streaming it from produce() on a miss.
+
+        produce is a generator function: it yields bytes to send as they become
+        available and returns the complete file to store. Like get_or_create, at
+        most one producer runs per key; concurrent callers wait for it and then
+        replay the stored file. If the producing stream is abandoned, a waiting
+        caller takes over the build.
+        """
+        filename = self.filename_for(key, extension)
+        path = self.path_for(filename)
+        while not self._lookup(filename):
+            call, leader = self._inflight.claim(filename)
+            if not leader:
+                if call.result() is not None:
+                    break
+                continue
+            if self._lookup(filename):
+                self._inflight.release(filename, path)
+                break
+            with self._lock:
+                self.misses += 1
+            try:
+                data = yield from produce()
+                self._store(filename, data)
+            except GeneratorExit:
+                self._inflight.release(filename, None)
+                raise
+            except BaseException as e:
+                self._inflight.release(filename, error=e)
+                raise
+            self._inflight.release(filename, path)
+            return
+        with open(path, "rb") as f:
+            while True:
+                block = f.read(block_bytes)
+                if not block:
+                    return
+                yield block
+
+    def evict(self, max_bytes: Optional[int] = None):
+        """Drop idle entries, then least recently used ones until under the size budget.
+
+        max_bytes tightens the budget (e.g. when audio/ as a whole is too big).
+        The budget is hard: if unpinned files alone can't meet it, the least
+        recently used pinned files go too.
+        """
+        budget = self.max_bytes if max_bytes is None else min(max_bytes, self.max_bytes)
+        victims = []
+        with self._lock:
+            now = time.time()
+            # Forget pins whose owner never released them
+            for pins in (self._pins, self._pending_pins):
+                for filename, owners in list(pins.items()):
+                    for owner, expires_at in list(owners.items()):
+                        if expires_at <= now:
+                            del owners[owner]
+                    if not owners:
+                        del pins[filename]
+            cutoff = now - self.max_age_seconds
+            for filename, (size, last_access) in list(self._entries.items()):
+                if last_access >= cutoff and self._bytes <= budget:
+                    break
+                if filename in self._pins:
+                    continue
+                self._drop(filename)
+                victims.append(filename)
+            for filename in list(self._entries):
+                if self._bytes <= budget:
+                    break
+                self._pins.pop(filename, None)
+                self._drop(filename)
+                victims.append(filename)
+                self.pinned_evictions += 1
+                print(f"[TTS_CACHE] Over its {budget} byte budget; evicting pinned {filename}")
+            self.evictions += len(victims)
+        for filename in victims:
+            try:
+                os.remove(self.path_for(filename))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries, total, pinned = len(self._entries), self._bytes, len(self._pins)
+            hits, misses = self.hits, self.misses
+            evictions, pinned_evictions = self.evictions, self.pinned_evictions
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "coalesced": self._inflight.coalesced,
+            "evictions": evictions,
+            "pinned_evictions": pinned_evictions,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "entries": entries,
+            "bytes": total,
+            "pinned": pinned,
+            "max_bytes": self.max_bytes,
+        }
@@ -0,0 +1,139 @@
+import hashlib
+import os
+import re
+import threading
+from email.utils import formatdate
+from typing import Dict, Optional, Tuple
+
+import anyio
+from starlette.responses import Response
+
+from .audio_cache import AUDIO_DIR, TTS_CACHE_PREFIX
+
+SAFE_FILENAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]*$")
+READ_CHUNK_BYTES = 256 * 1024
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, max-age=0, must-revalidate"
+
+# (path, size, mtime) -> ETag for files whose name isn't a content digest
+_etags: Dict[Tuple[str, int, float], str] = {}
+_etags_lock = threading.Lock()
+
+def safe_audio_path(filename: str, directory: str = AUDIO_DIR) -> Optional[str]:
+    """Path of filename inside directory, or None if it could escape it"""
+    if not SAFE_FILENAME.match(filename) or ".." in filename:
+        return None
+    root = os.path.realpath(directory)
+    path = os.path.realpath(os.path.join(root, filename))
+    if os.path.dirname(path) != root:
+        return None
+    return f"{directory}/{filename}"
+
+def is_content_addressed(path: str) -> bool:
+    return os.path.basename(path).startswith(TTS_CACHE_PREFIX)
+
+def _etag_for(path: str, stat: os.stat_result) -> str:
+    if is_content_addressed(path):
+        # The name is a digest of the utterance; the extension tells the encodings apart
+        stem, extension = os.path.splitext(os.path.basename(path))
+        return f'"{stem[len(TTS_CACHE_PREFIX):]}{extension}"'
+    key = (path, stat.st_size, stat.st_mtime)
+    with _etags_lock:
+        etag = _etags.get(key)
+    if etag is None:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(READ_CHUNK_BYTES), b""):
+                digest.update(block)
+        etag = f'"{digest.hexdigest()[:32]}"'
+        with _etags_lock:
+            _etags[key] = etag
+    return etag
+
+def _parse_range(header: str, size: int):
+    """(start, end) for a single byte range, None to ignore the header, or "unsatisfiable" """
+    unit, _, ranges = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        # Unknown units and multipart ranges: send the whole file
+        return None
+    first, _, last = ranges.strip().partition("-")
+    try:
+        if not first:
+            suffix = int(last)
+            if suffix <= 0:
+                return "unsatisfiable"
+            return max(size - suffix, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return "unsatisfiable"
+    return start, min(end, size - 1)
+
+class AudioFileResponse(Response):
+    """File response with byte ranges, strong ETags and conditional requests.
+
+    Uses the ASGI zero-copy extension (sendfile) when the server offers it and
+    falls back to reading the file in a worker thread otherwise.
+    """
+
+    def __init__(self, path: str, request_headers, media_type: str):
+        self.path = path
+        stat = os.stat(path)
+        self.size = stat.st_size
+        etag = _etag_for(path, stat)
+        headers = {
+            "accept-ranges": "bytes",
+            "etag": etag,
+            "last-modified": formatdate(stat.st_mtime, usegmt=True),
+            "cache-control": IMMUTABLE_CACHE_CONTROL if is_content_addressed(path) else REVALIDATE_CACHE_CONTROL,
+        }
+        self.start, self.end = 0, self.size - 1
+        status_code = 200
+
+        if_none_match = request_headers.get("if-none-match")
+        range_header = request_headers.get("range")
+        if_range = request_headers.get("if-range")
+        if if_none_match and (if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]):
+            status_code = 304
+        elif range_header and (not if_range or if_range.strip() == etag):
+            byte_range = _parse_range(range_header, self.size)
+            if byte_range == "unsatisfiable":
+                status_code = 416
+                headers["content-range"] = f"bytes */{self.size}"
+            elif byte_range:
+                status_code = 206
+                self.start, self.end = byte_range
+                headers["content-range"] = f"bytes {self.start}-{self.end}/{self.size}"
+
+        self.send_body = status_code in (200, 206)
+        if self.send_body:
+            headers["content-length"] = str(self.end - self.start + 1)
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type if self.send_body else None)
+        if status_code == 304:
+            # Response.__init__ adds content-length: 0 for the empty body
+            self.raw_headers = [(k, v) for k, v in self.raw_headers if k != b"content-length"]
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if not self.send_body or scope.get("method") == "HEAD":
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        count = self.end - self.start + 1
+        if "http.response.zerocopy" in scope.get("extensions", {}):
+            with open(self.path, "rb") as f:
+                await send({"type": "http.response.zerocopy", "file": f, "offset": self.start, "count": count})
+            return
+
+        async with await anyio.open_file(self.path, "rb") as f:
+            await f.seek(self.start)
+            remaining = count
+            while remaining > 0:
+                block = await f.read(min(READ_CHUNK_BYTES, remaining))
+                if not block:
+                    break
+                remaining -= len(block)
+                await send({"type": "http.response.body", "body": block, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
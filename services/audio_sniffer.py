@@ -0,0 +1,90 @@
+import struct
+from typing import Dict, Optional
+
+# Sample rates the Speech API accepts for OGG_OPUS / WEBM_OPUS
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+# Matroska elements scanned in WebM headers
+_EBML_MAGIC = b"\x1a\x45\xdf\xa3"
+_SAMPLING_FREQUENCY_ID = b"\xb5"
+# How much of the upload to look at; codec headers sit at the very start
+SNIFF_BYTES = 64 * 1024
+
+def _opus_rate(rate: int) -> int:
+    return rate if rate in OPUS_SAMPLE_RATES else 48000
+
+def _sniff_wav(data: bytes) -> Optional[Dict]:
+    pos = 12
+    while pos + 8 <= len(data):
+        chunk_id = data[pos:pos + 4]
+        chunk_size = struct.unpack("<I", data[pos + 4:pos + 8])[0]
+        if chunk_id == b"fmt " and pos + 24 <= len(data):
+            fmt_code, channels, sample_rate = struct.unpack("<HHI", data[pos + 8:pos + 16])
+            bits = struct.unpack("<H", data[pos + 22:pos + 24])[0]
+            if fmt_code == 1 and bits == 16:
+                encoding = "LINEAR16"
+            elif fmt_code == 7:
+                encoding = "MULAW"
+            else:
+                return None
+            return {"container": "wav", "encoding": encoding, "sample_rate": sample_rate, "channels": channels}
+        pos += 8 + chunk_size + (chunk_size & 1)
+    return None
+
+def _sniff_flac(data: bytes) -> Optional[Dict]:
+    # STREAMINFO is always the first metadata block: 4-byte block header, then
+    # min/max block and frame sizes (10 bytes), then a 20-bit sample rate
+    if len(data) < 22:
+        return None
+    sample_rate = (data[18] << 12) | (data[19] << 4) | (data[20] >> 4)
+    channels = ((data[20] >> 1) & 0x07) + 1
+    return {"container": "flac", "encoding": "FLAC", "sample_rate": sample_rate, "channels": channels}
+
+def _sniff_ogg(data: bytes) -> Optional[Dict]:
+    head = data.find(b"OpusHead")
+    if head == -1 or head + 16 > len(data):
+        return None
+    channels = data[head + 9]
+    input_rate = struct.unpack("<I", data[head + 12:head + 16])[0]
+    return {"container": "ogg", "encoding": "OGG_OPUS", "sample_rate": _opus_rate(input_rate), "channels": channels}
+
+def _sniff_webm(data: bytes) -> Optional[Dict]:
+    codec = data.find(b"A_OPUS")
+    if codec == -1:
+        return None
+    sample_rate = 48000
+    pos = codec
+    while True:
+        pos = data.find(_SAMPLING_FREQUENCY_ID, pos + 1)
+        if pos == -1 or pos + 2 > len(data):
+            break
+        size = data[pos + 1]
+        # EBML size byte 0x84 / 0x88: 4- or 8-byte big-endian float follows
+        if size == 0x84 and pos + 6 <= len(data):
+            value = struct.unpack(">f", data[pos + 2:pos + 6])[0]
+        elif size == 0x88 and pos + 10 <= len(data):
+            value = struct.unpack(">d", data[pos + 2:pos + 10])[0]
+        else:
+            continue
+        if 8000 <= value <= 192000 and value == int(value):
+            sample_rate = int(value)
+            break
+    return {"container": "webm", "encoding": "WEBM_OPUS", "sample_rate": _opus_rate(sample_rate), "channels": None}
+
+def sniff_audio(data: bytes) -> Optional[Dict]:
+    """Detect container, Speech API encoding and sample rate from an upload's header bytes.
+
+    Returns None when the format isn't recognized.
+    """
+    head = data[:SNIFF_BYTES]
+    try:
+        if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+            return _sniff_wav(head)
+        if head[:4] == b"fLaC":
+            return _sniff_flac(head)
+        if head[:4] == b"OggS":
+            return _sniff_ogg(head)
+        if head[:4] == _EBML_MAGIC:
+            return _sniff_webm(head)
+    except struct.error:
+        return None
+    return None
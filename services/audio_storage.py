@@ -0,0 +1,161 @@
+import os
+import threading
+from datetime import timedelta
+from typing import Dict, Optional
+from urllib.parse import quote
+from .cache import TTLCache
+from .clients import get_storage_client
+from .executor import submit
+from .tts_service import audio_cache, media_type_for
+
+# local: files are served by this API from audio/
+# gcs: files are uploaded to AUDIO_BUCKET and clients download them with signed URLs
+AUDIO_STORAGE_BACKEND = os.getenv("AUDIO_STORAGE_BACKEND", "local").lower()
+AUDIO_BUCKET = os.getenv("AUDIO_BUCKET")
+AUDIO_OBJECT_PREFIX = os.getenv("AUDIO_OBJECT_PREFIX", "audio/")
+AUDIO_URL_TTL_SECONDS = int(os.getenv("AUDIO_URL_TTL_SECONDS", "3600"))
+STORAGE_EMULATOR_HOST = os.getenv("STORAGE_EMULATOR_HOST")
+
+class LocalAudioStorage:
+    """Audio stays on this instance's disk and is served by /audio/{filename}"""
+
+    def local_url(self, path: str) -> str:
+        return f"/audio/{os.path.basename(path)}"
+
+    def url_for(self, path: str) -> str:
+        return self.local_url(path)
+
+    def remote_url(self, filename: str) -> Optional[str]:
+        """Direct download URL for a file this instance doesn't have, or None"""
+        return None
+
+    def stats(self) -> Dict:
+        return {"backend": "local"}
+
+class GCSAudioStorage(LocalAudioStorage):
+    """Audio uploaded to a Cloud Storage bucket as soon as it is stored locally.
+
+    Clients get V4 signed URLs and download straight from the bucket; the
+    local copy only serves requests that arrive before the upload finished.
+    """
+
+    def __init__(self, bucket_name: str = AUDIO_BUCKET):
+        if not bucket_name:
+            raise Exception("AUDIO_STORAGE_BACKEND=gcs requires AUDIO_BUCKET")
+        self.bucket = get_storage_client().bucket(bucket_name)
+        self._published = set()
+        self._lock = threading.Lock()
+        # Signed URLs are reused for half their lifetime
+        self._urls = TTLCache(10000, AUDIO_URL_TTL_SECONDS / 2)
+        self.uploads = 0
+        self.upload_failures = 0
+
+    def _blob(self, filename: str):
+        return self.bucket.blob(f"{AUDIO_OBJECT_PREFIX}{filename}")
+
+    def publish(self, path: str):
+        """Upload a stored file; content-addressed names never change, so each is uploaded once"""
+        filename = os.path.basename(path)
+        with self._lock:
+            if filename in self._published:
+                return
+        blob = self._blob(filename)
+        blob.cache_control = "public, max-age=31536000, immutable"
+        try:
+            blob.upload_from_filename(path, content_type=media_type_for(path))
+        except Exception as e:
+            self.upload_failures += 1
+            print(f"[STORAGE] Upload of {filename} failed, serving it locally: {e}")
+            return
+        self.uploads += 1
+        with self._lock:
+            self._published.add(filename)
+
+    def is_published(self, filename: str) -> bool:
+        with self._lock:
+            if filename in self._published:
+                return True
+        # Uploaded by another instance or before a redeploy
+        if self._blob(filename).exists():
+            with self._lock:
+                self._published.add(filename)
+            return True
+        return False
+
+    def signed_url(self, filename: str) -> str:
+        url = self._urls.get(filename)
+        if url is not None:
+            return url
+        blob = self._blob(filename)
+        if STORAGE_EMULATOR_HOST:
+            # The emulator can't verify signatures; link to the object directly
+            url = f"{STORAGE_EMULATOR_HOST.rstrip('/')}/download/storage/v1/b/{self.bucket.name}/o/{quote(blob.name, safe='')}?alt=media"
+        else:
+            credentials = get_storage_client()._credentials
+            kwargs = {}
+            if not hasattr(credentials, "sign_bytes"):
+                # Cloud Run / GCE credentials have no private key: sign through the IAM API
+                from google.auth.transport.requests import Request
+                credentials.refresh(Request())
+                kwargs = {"service_account_email": credentials.service_account_email,
+                          "access_token": credentials.token}
+            url = blob.generate_signed_url(
+                version="v4", expiration=timedelta(seconds=AUDIO_URL_TTL_SECONDS), method="GET", **kwargs)
+        self._urls.set(filename, url)
+        return url
+
+    def url_for(self, path: str) -> str:
+        filename = os.path.basename(path)
+        if audio_cache.pending(filename):
+            # Still being synthesized: only this instance can serve it yet
+            return self.local_url(path)
+        with self._lock:
+            published = filename in self._published
+        if published or (not os.path.exists(path) and self.is_published(filename)):
+            return self.signed_url(filename)
+        return self.local_url(path)
+
+    def remote_url(self, filename: str) -> Optional[str]:
+        return self.signed_url(filename) if self.is_published(filename) else None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            published = len(self._published)
+        return {
+            "backend": "gcs",
+            "bucket": self.bucket.name,
+            "uploads": self.uploads,
+            "upload_failures": self.upload_failures,
+            "published": published,
+        }
+
+_storage = None
+_storage_lock = threading.Lock()
+
+def get_audio_storage():
+    """Process-wide audio storage for AUDIO_STORAGE_BACKEND, created on first use"""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                if AUDIO_STORAGE_BACKEND == "gcs":
+                    _storage = GCSAudioStorage()
+                    # Upload on the storage pool so synthesis doesn't wait on GCS
+                    audio_cache.on_store.append(lambda path: submit("storage", _storage.publish, path))
+                elif AUDIO_STORAGE_BACKEND == "local":
+                    _storage = LocalAudioStorage()
+                else:
+                    raise Exception(f"Unknown AUDIO_STORAGE_BACKEND '{AUDIO_STORAGE_BACKEND}'")
+                print(f"[STORAGE] Using {AUDIO_STORAGE_BACKEND} audio storage")
+    return _storage
+
+def audio_url_for(path: str) -> str:
+    """URL a client should fetch the audio file at path from"""
+    return get_audio_storage().url_for(path)
+
+def audio_urls_for(*paths):
+    """audio_url_for each path (None stays None)"""
+    return [audio_url_for(path) if path else None for path in paths]
+
+def audio_storage_stats() -> Dict:
+    return get_audio_storage().stats()
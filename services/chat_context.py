@@ -0,0 +1,64 @@
+import os
+from collections import deque
+from typing import Dict, List
+
+# Rough prompt budget for the conversation part of a welcome turn
+WELCOME_CONTEXT_TOKEN_BUDGET = int(os.getenv("WELCOME_CONTEXT_TOKEN_BUDGET", "800"))
+PRESS_ENTER = "Press Enter to record your response."
+
+def estimate_tokens(text: str) -> int:
+    """Cheap local estimate (about 4 characters per token); exact counts come back in usage_metadata"""
+    return len(text) // 4 + 1
+
+def render_message(message: Dict) -> str:
+    # Drop the "Press Enter" instruction, it carries no context for the model
+    clean_content = message["content"].replace(PRESS_ENTER, "").strip()
+    return f"{message['role']}: {clean_content}"
+
+class ChatWindow:
+    """The most recent conversation lines that fit in a token budget.
+
+    Each message is rendered once when it is added and the oldest lines fall
+    out as new ones push the window over budget, so building a prompt never
+    re-walks or re-concatenates the whole history.
+    """
+
+    def __init__(self, token_budget: int = WELCOME_CONTEXT_TOKEN_BUDGET):
+        self.token_budget = token_budget
+        self._lines = deque()  # (line, tokens), oldest first
+        self.tokens = 0
+        self._rendered = None
+
+    @classmethod
+    def from_history(cls, history: List[Dict], token_budget: int = WELCOME_CONTEXT_TOKEN_BUDGET) -> "ChatWindow":
+        """Window over the tail of history, walking back only as far as the budget reaches"""
+        window = cls(token_budget)
+        lines = []
+        for message in reversed(history):
+            line = render_message(message)
+            tokens = estimate_tokens(line)
+            if lines and window.tokens + tokens > token_budget:
+                break
+            lines.append((line, tokens))
+            window.tokens += tokens
+        window._lines.extend(reversed(lines))
+        return window
+
+    def append(self, message: Dict):
+        line = render_message(message)
+        tokens = estimate_tokens(line)
+        self._lines.append((line, tokens))
+        self.tokens += tokens
+        # Always keep the newest line, even if it alone is over budget
+        while self.tokens > self.token_budget and len(self._lines) > 1:
+            _, dropped = self._lines.popleft()
+            self.tokens -= dropped
+        self._rendered = None
+
+    def render(self) -> str:
+        if self._rendered is None:
+            self._rendered = "\n".join(line for line, _ in self._lines)
+        return self._rendered
+
+    def __len__(self):
+        return len(self._lines)
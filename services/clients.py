@@ -0,0 +1,91 @@
+import hashlib
+import os
+import threading
+from typing import Dict
+
+# Process-wide Google clients. Each one is created lazily on first use and then
+# reused so its gRPC channel, credentials and TLS session are set up only once.
+GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-2.5-flash-lite")
+GEMINI_LOCATION = os.getenv("GEMINI_LOCATION", "us-central1")
+
+_clients: Dict[str, object] = {}
+_lock = threading.RLock()  # factories may create the clients they depend on
+
+def _get_or_create(name, factory):
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                client = factory()
+                _clients[name] = client
+                print(f"[CLIENTS] Created {name} client")
+    return client
+
+def get_speech_client():
+    """Shared Speech-to-Text client"""
+    from google.cloud import speech
+    return _get_or_create("speech", speech.SpeechClient)
+
+def get_tts_client():
+    """Shared Text-to-Speech client"""
+    from google.cloud import texttospeech
+    return _get_or_create("tts", texttospeech.TextToSpeechClient)
+
+def _init_vertexai():
+    def factory():
+        import vertexai
+
+        project_id = os.getenv("GOOGLE_CLOUD_PROJECT")
+        if not project_id:
+            raise Exception("GOOGLE_CLOUD_PROJECT not configured")
+        vertexai.init(project=project_id, location=GEMINI_LOCATION)
+        return True
+    _get_or_create("vertexai", factory)
+
+def get_gemini_model(system_instruction=None):
+    """Shared Gemini model, initializing Vertex AI once per process.
+
+    Each distinct system_instruction gets its own shared model, so a static
+    instruction block is sent as the system prompt rather than inside every
+    request's contents.
+    """
+    def factory():
+        from vertexai.generative_models import GenerativeModel
+
+        _init_vertexai()
+        if system_instruction is None:
+            return GenerativeModel(GEMINI_MODEL_NAME)
+        return GenerativeModel(GEMINI_MODEL_NAME, system_instruction=system_instruction)
+    if system_instruction is None:
+        return _get_or_create("gemini", factory)
+    digest = hashlib.sha256(system_instruction.encode("utf-8")).hexdigest()[:12]
+    return _get_or_create(f"gemini:{digest}", factory)
+
+def get_firestore_client():
+    """Shared Firestore client"""
+    def factory():
+        from google.cloud import firestore
+
+        project_id = os.getenv("GOOGLE_CLOUD_PROJECT", "seventh-league-472711-a6")
+        print(f"[FIRESTORE] Project ID: {project_id}")
+        return firestore.Client(project=project_id)
+    return _get_or_create("firestore", factory)
+
+def get_storage_client():
+    """Shared Cloud Storage client (honours STORAGE_EMULATOR_HOST)"""
+    from google.cloud import storage
+    return _get_or_create("storage", storage.Client)
+
+def warm_up():
+    """Create every client up front so the first request doesn't pay for it"""
+    for name, getter in (
+        ("speech", get_speech_client),
+        ("tts", get_tts_client),
+        ("gemini", get_gemini_model),
+        ("firestore", get_firestore_client),
+    ):
+        try:
+            getter()
+        except Exception as e:
+            print(f"[CLIENTS] Warm-up of {name} client failed: {e}")
@@ -0,0 +1,322 @@
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+from typing import Callable, Dict, Iterable, Optional
+from google.api_core import exceptions as api_exceptions
+from .executor import submit
+
+# Latency budget per endpoint (path prefix -> seconds, longest prefix wins).
+# Everything a request calls shares its budget, so it ends well before Cloud Run's timeout.
+REQUEST_BUDGET_SECONDS = float(os.getenv("REQUEST_BUDGET_SECONDS", "30"))
+ROADMAP_BUDGET_SECONDS = float(os.getenv("ROADMAP_BUDGET_SECONDS", "240"))
+ENDPOINT_BUDGETS: Dict[str, float] = {
+    "/capture": float(os.getenv("CAPTURE_BUDGET_SECONDS", "15")),
+    "/text-to-speech": float(os.getenv("TTS_BUDGET_SECONDS", "60")),
+    "/welcome": float(os.getenv("WELCOME_BUDGET_SECONDS", "20")),
+    "/create-roadmap": ROADMAP_BUDGET_SECONDS,
+    "/welcome/generate-roadmap": ROADMAP_BUDGET_SECONDS,
+    "/get-lesson": float(os.getenv("READ_BUDGET_SECONDS", "10")),
+    "/roadmap": float(os.getenv("READ_BUDGET_SECONDS", "10")),
+}
+# Clients may ask for a tighter budget than the endpoint's
+REQUEST_TIMEOUT_HEADER = b"x-request-timeout"
+
+# Per-RPC timeout when there is no request deadline (background work) or more budget than this
+RPC_TIMEOUTS: Dict[str, float] = {
+    "speech": float(os.getenv("SPEECH_RPC_TIMEOUT_SECONDS", "30")),
+    "tts": float(os.getenv("TTS_RPC_TIMEOUT_SECONDS", "30")),
+    "gemini": float(os.getenv("GEMINI_RPC_TIMEOUT_SECONDS", "120")),
+    "firestore": float(os.getenv("FIRESTORE_RPC_TIMEOUT_SECONDS", "10")),
+}
+# Streaming RPCs: the longest wait for the first chunk, then between chunks (also capped by the request budget)
+STREAM_FIRST_CHUNK_TIMEOUT_SECONDS = float(os.getenv("STREAM_FIRST_CHUNK_TIMEOUT_SECONDS", "60"))
+STREAM_CHUNK_TIMEOUT_SECONDS = float(os.getenv("STREAM_CHUNK_TIMEOUT_SECONDS", "30"))
+
+# Hedged requests: send a backup call once the first has been running longer than
+# the backend's HEDGE_PERCENTILE latency, and keep whichever answers first.
+# Comma-separated backends, e.g. "speech,tts,firestore"; off by default.
+HEDGE_BACKENDS = {name.strip() for name in os.getenv("HEDGE_BACKENDS", "").split(",") if name.strip()}
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+# No hedging until this many latencies have been seen
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_MIN_DELAY_SECONDS = float(os.getenv("HEDGE_MIN_DELAY_SECONDS", "0.05"))
+# Backups may add at most this fraction of extra calls
+HEDGE_MAX_RATIO = float(os.getenv("HEDGE_MAX_RATIO", "0.1"))
+LATENCY_WINDOW = int(os.getenv("LATENCY_WINDOW", "500"))
+
+# time.monotonic() by which the current request must be answered
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+def budget_for(path: str) -> float:
+    best, budget = -1, REQUEST_BUDGET_SECONDS
+    for prefix, seconds in ENDPOINT_BUDGETS.items():
+        if path.startswith(prefix) and len(prefix) > best:
+            best, budget = len(prefix), seconds
+    return budget
+
+def set_deadline(seconds: float) -> contextvars.Token:
+    """Bound the current context by seconds from now (never extends an existing deadline)"""
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None:
+        deadline = min(deadline, current)
+    return _deadline.set(deadline)
+
+def reset_deadline(token: contextvars.Token):
+    _deadline.reset(token)
+
+def current_deadline() -> Optional[float]:
+    return _deadline.get()
+
+def without_deadline(func: Callable, *args, **kwargs):
+    """Call func outside the current request's budget, for work that outlives the request"""
+    token = _deadline.set(None)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _deadline.reset(token)
+
+def remaining() -> Optional[float]:
+    """Seconds left in the current request's budget, or None outside a request"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+def rpc_timeout(backend: str) -> float:
+    """Timeout for one RPC: the backend's default, capped by the request's remaining budget"""
+    timeout = RPC_TIMEOUTS.get(backend, REQUEST_BUDGET_SECONDS)
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        _count(backend, "deadline_exceeded")
+        raise api_exceptions.DeadlineExceeded(f"Request budget exhausted before {backend} call")
+    return min(timeout, left)
+
+class DeadlineMiddleware:
+    """ASGI middleware starting each HTTP request's deadline from its endpoint budget"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        budget = budget_for(scope["path"])
+        for name, value in scope.get("headers", []):
+            if name == REQUEST_TIMEOUT_HEADER:
+                try:
+                    budget = min(budget, float(value))
+                except ValueError:
+                    pass
+        token = set_deadline(budget)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            reset_deadline(token)
+
+class LatencyTracker:
+    """Latencies of a backend's recent calls"""
+
+    def __init__(self, size: int = LATENCY_WINDOW):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+    def __len__(self):
+        return len(self._samples)
+
+_trackers: Dict[str, LatencyTracker] = {}
+_metrics: Dict[str, Dict[str, int]] = {}
+_lock = threading.Lock()
+
+def _tracker(backend: str) -> LatencyTracker:
+    with _lock:
+        return _trackers.setdefault(backend, LatencyTracker())
+
+def _count(backend: str, name: str):
+    with _lock:
+        counters = _metrics.setdefault(backend, {
+            "calls": 0, "deadline_exceeded": 0, "hedges": 0, "hedge_wins": 0, "primary_wins": 0})
+        counters[name] += 1
+
+def _hedge_delay(backend: str) -> Optional[float]:
+    """When to send the backup call, or None if this call shouldn't be hedged"""
+    tracker = _tracker(backend)
+    if backend not in HEDGE_BACKENDS or len(tracker) < HEDGE_MIN_SAMPLES:
+        return None
+    return max(HEDGE_MIN_DELAY_SECONDS, tracker.percentile(HEDGE_PERCENTILE))
+
+def _may_hedge(backend: str) -> bool:
+    with _lock:
+        counters = _metrics[backend]
+        if counters["hedges"] >= counters["calls"] * HEDGE_MAX_RATIO:
+            return False
+        counters["hedges"] += 1
+        return True
+
+def _timed(func: Callable, timeout: float, tracker: LatencyTracker):
+    start = time.monotonic()
+    result = func(timeout)
+    tracker.record(time.monotonic() - start)
+    return result
+
+def _when_finished(futures, on_done: Callable[[], None]):
+    """Call on_done once every future has finished (now, if they all have)"""
+    pending = [future for future in futures if not future.done()]
+    if not pending:
+        on_done()
+        return
+    left = [len(pending)]
+    lock = threading.Lock()
+
+    def finished(_):
+        with lock:
+            left[0] -= 1
+            last = left[0] == 0
+        if last:
+            on_done()
+
+    for future in pending:
+        future.add_done_callback(finished)
+
+def call_with_deadline(backend: str, func: Callable[[float], object], hedge: bool = True, enforce: bool = False,
+                       pool: str = "rpc", on_done: Optional[Callable[[], None]] = None):
+    """Run func(timeout) within the request's budget, hedging it if enabled for backend.
+
+    func must pass timeout on to its RPC. enforce=True is for SDKs without a
+    per-call timeout: the wait is bounded here instead, and a call that runs
+    past the deadline is abandoned (it finishes in the background on pool).
+    on_done is called once every attempt has really finished, abandoned ones
+    included, e.g. to free a concurrency slot. Only idempotent calls should be
+    hedged.
+    """
+    futures = []
+    try:
+        return _call_with_deadline(backend, func, hedge, enforce, pool, futures)
+    finally:
+        if on_done is not None:
+            _when_finished(futures, on_done)
+
+def _call_with_deadline(backend, func, hedge, enforce, pool, futures):
+    _count(backend, "calls")
+    timeout = rpc_timeout(backend)
+    tracker = _tracker(backend)
+    delay = _hedge_delay(backend) if hedge else None
+    if delay is None and not enforce:
+        try:
+            return _timed(func, timeout, tracker)
+        except api_exceptions.DeadlineExceeded:
+            _count(backend, "deadline_exceeded")
+            raise
+
+    start = time.monotonic()
+    deadline = start + timeout
+    primary = submit(pool, _timed, func, timeout, tracker)
+    futures.append(primary)
+    pending, backup, error = {primary}, None, None
+    while pending:
+        wait_until = deadline if delay is None else min(deadline, start + delay)
+        done, pending = wait(pending, timeout=max(0, wait_until - time.monotonic()), return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                result = future.result()
+            except Exception as e:
+                error = e
+                continue
+            if backup is not None:
+                _count(backend, "hedge_wins" if future is backup else "primary_wins")
+            for other in pending:
+                other.cancel()
+            return result
+        if not pending:
+            break
+        now = time.monotonic()
+        if now >= deadline:
+            # Attempts still queued on the pool never start; running ones are abandoned
+            for other in pending:
+                other.cancel()
+            _count(backend, "deadline_exceeded")
+            raise api_exceptions.DeadlineExceeded(f"{backend} call exceeded its {timeout:.1f}s budget")
+        if delay is not None and now >= start + delay:
+            delay = None
+            if _may_hedge(backend):
+                backup = submit(pool, _timed, func, deadline - now, tracker)
+                futures.append(backup)
+                pending.add(backup)
+    if isinstance(error, api_exceptions.DeadlineExceeded):
+        _count(backend, "deadline_exceeded")
+    raise error
+
+_END = object()
+
+def stream_with_deadline(backend: str, start: Callable[[], Iterable], pool: str = "rpc",
+                         on_done: Optional[Callable[[], None]] = None):
+    """Iterate the stream start() returns, bounding the wait for each chunk.
+
+    For streaming SDK calls without a per-call timeout. The first chunk may
+    take STREAM_FIRST_CHUNK_TIMEOUT_SECONDS and each later one
+    STREAM_CHUNK_TIMEOUT_SECONDS, both capped by the request's budget. Chunks
+    are read on pool, so a stream that stalls is abandoned there with
+    DeadlineExceeded. on_done is called once the last read has really
+    finished, as for call_with_deadline.
+    """
+    _count(backend, "calls")
+    state = {}
+    reads = []
+
+    def read():
+        if "chunks" not in state:
+            state["chunks"] = iter(start())
+        return next(state["chunks"], _END)
+
+    try:
+        limit, waiting_for = STREAM_FIRST_CHUNK_TIMEOUT_SECONDS, "first chunk"
+        while True:
+            left = remaining()
+            timeout = limit if left is None else min(limit, left)
+            if timeout <= 0:
+                _count(backend, "deadline_exceeded")
+                raise api_exceptions.DeadlineExceeded(f"Request budget exhausted during {backend} stream")
+            future = submit(pool, read)
+            reads[:] = [future]
+            done, _ = wait([future], timeout=timeout)
+            if not done:
+                future.cancel()
+                _count(backend, "deadline_exceeded")
+                raise api_exceptions.DeadlineExceeded(f"{backend} stream sent no {waiting_for} within {timeout:.1f}s")
+            chunk = future.result()
+            if chunk is _END:
+                return
+            yield chunk
+            limit, waiting_for = STREAM_CHUNK_TIMEOUT_SECONDS, "chunk"
+    finally:
+        if on_done is not None:
+            _when_finished(reads, on_done)
+
+def deadline_stats() -> Dict:
+    with _lock:
+        backends = list(_metrics.items())
+    stats = {}
+    for backend, counters in backends:
+        tracker = _tracker(backend)
+        p50, p95 = tracker.percentile(50), tracker.percentile(95)
+        stats[backend] = dict(
+            counters,
+            p50_ms=round(p50 * 1000, 1) if p50 is not None else None,
+            p95_ms=round(p95 * 1000, 1) if p95 is not None else None,
+            hedging=backend in HEDGE_BACKENDS,
+        )
+    return stats
@@ -0,0 +1,68 @@
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+
+# Per-backend worker limits. Every blocking Google SDK call runs on the pool of
+# its backend so a slow backend can't starve the others or the event loop.
+BACKEND_LIMITS: Dict[str, int] = {
+    "speech": int(os.getenv("SPEECH_MAX_WORKERS", "8")),
+    "speech_fallback": int(os.getenv("SPEECH_FALLBACK_MAX_WORKERS", "8")),
+    # Held for the whole duration of a streaming recognition
+    "speech_stream": int(os.getenv("SPEECH_STREAM_MAX_WORKERS", "32")),
+    "tts": int(os.getenv("TTS_MAX_WORKERS", "16")),
+    "tts_chunks": int(os.getenv("TTS_CHUNK_MAX_WORKERS", "16")),
+    "gemini": int(os.getenv("GEMINI_MAX_WORKERS", "16")),
+    "firestore": int(os.getenv("FIRESTORE_MAX_WORKERS", "16")),
+    "welcome": int(os.getenv("WELCOME_MAX_WORKERS", "16")),
+    # Uploads and URL signing for the audio storage backend
+    "storage": int(os.getenv("STORAGE_MAX_WORKERS", "8")),
+    # Session store reads and writes (Redis or Firestore)
+    "sessions": int(os.getenv("SESSION_STORE_MAX_WORKERS", "16")),
+    # Deadline-bounded and hedged RPCs (services/deadlines.py)
+    "rpc": int(os.getenv("RPC_MAX_WORKERS", "32")),
+    # Gemini calls bounded by the caller; an abandoned call keeps its worker until it returns
+    "gemini_rpc": int(os.getenv("GEMINI_RPC_MAX_WORKERS", "16")),
+}
+DEFAULT_LIMIT = int(os.getenv("DEFAULT_MAX_WORKERS", "8"))
+
+_executors: Dict[str, ThreadPoolExecutor] = {}
+_lock = threading.Lock()
+
+def get_executor(backend: str) -> ThreadPoolExecutor:
+    """Get (or lazily create) the thread pool for a backend"""
+    executor = _executors.get(backend)
+    if executor is None:
+        with _lock:
+            executor = _executors.get(backend)
+            if executor is None:
+                workers = BACKEND_LIMITS.get(backend, DEFAULT_LIMIT)
+                executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{backend}-worker")
+                _executors[backend] = executor
+                print(f"[EXECUTOR] Created '{backend}' pool with {workers} workers")
+    return executor
+
+async def run_blocking(backend: str, func, *args, **kwargs):
+    """Run a blocking call on the backend's pool without stalling the event loop"""
+    loop = asyncio.get_running_loop()
+    # Copy the caller's context so request-scoped contextvars survive the hop
+    ctx = contextvars.copy_context()
+    call = functools.partial(ctx.run, func, *args, **kwargs)
+    return await loop.run_in_executor(get_executor(backend), call)
+
+def submit(backend: str, func, *args, **kwargs):
+    """Submit a blocking call to the backend's pool, carrying over the caller's contextvars"""
+    ctx = contextvars.copy_context()
+    return get_executor(backend).submit(ctx.run, func, *args, **kwargs)
+
+def shutdown_executors(wait: bool = True):
+    """Shut down all backend pools (called on application shutdown)"""
+    with _lock:
+        executors = list(_executors.items())
+        _executors.clear()
+    for backend, executor in executors:
+        executor.shutdown(wait=wait)
+        print(f"[EXECUTOR] Shut down '{backend}' pool")
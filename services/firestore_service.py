@@ -1,21 +1,54 @@
-from google.cloud import firestore
-import uuid
-from datetime import datetime
+import base64
+import copy
+import json
 import os
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from google.cloud import firestore
+from .clients import get_firestore_client
+from .cache import SingleFlight, TTLCache
+from .deadlines import call_with_deadline, rpc_timeout
+
+# Fields returned by roadmap listings; the day content is never fetched for them
+LISTING_FIELDS = ["topic", "description", "summary", "created_at"]
+ROADMAP_PAGE_SIZE = int(os.getenv("ROADMAP_PAGE_SIZE", "20"))
+ROADMAP_LIST_CACHE_TTL_SECONDS = float(os.getenv("ROADMAP_LIST_CACHE_TTL_SECONDS", "30"))
 
-# Initialize Firestore client
-project_id = os.getenv("GOOGLE_CLOUD_PROJECT", "seventh-league-472711-a6")
-print(f"[FIRESTORE] Project ID: {project_id}")
+# Roadmaps are stored as a header document (the roadmap without its days) plus
+# one document per day in its "days" subcollection, keyed by day number
+DAYS_COLLECTION = "days"
+
+# (limit, cursor) -> listing page; cleared whenever a roadmap is saved
+_listing_cache = TTLCache(256, ROADMAP_LIST_CACHE_TTL_SECONDS)
+
+# Roadmaps don't change after save_roadmap, so single reads are cached in process
+ROADMAP_READ_CACHE_MAX_ENTRIES = int(os.getenv("ROADMAP_READ_CACHE_MAX_ENTRIES", "1024"))
+ROADMAP_READ_CACHE_TTL_SECONDS = float(os.getenv("ROADMAP_READ_CACHE_TTL_SECONDS", "3600"))
+# Watch cached roadmaps and drop them when their document changes (e.g. a migration)
+ROADMAP_READ_CACHE_LISTEN = os.getenv("ROADMAP_READ_CACHE_LISTEN", "false").lower() == "true"
+
+# ("roadmap", id, include_days) / ("lesson", id, day) -> result
+_read_cache = TTLCache(ROADMAP_READ_CACHE_MAX_ENTRIES, ROADMAP_READ_CACHE_TTL_SECONDS)
+_read_inflight = SingleFlight()
+# roadmap id -> snapshot watch, oldest first
+_watches = OrderedDict()
+_watches_lock = threading.Lock()
 
 try:
     # In Cloud Run, use default credentials (no local JSON file needed)
-    db = firestore.Client(project=project_id)
+    db = get_firestore_client()
     print(f"[FIRESTORE] Client initialized successfully")
 except Exception as e:
     print(f"[FIRESTORE] Client initialization failed: {e}")
     print(f"[FIRESTORE] Continuing without database for demo purposes")
     db = None
 
+def _get(doc_ref):
+    """Point read bounded by the request's deadline (and hedged when enabled for firestore)"""
+    return call_with_deadline("firestore", lambda timeout: doc_ref.get(timeout=timeout))
+
 def save_roadmap(topic, description, roadmap_json, summary=None, summary_audio_path=None):
     roadmap_id = str(uuid.uuid4())
     
@@ -26,43 +59,152 @@ def save_roadmap(topic, description, roadmap_json, summary=None, summary_audio_p
     
     try:
         doc_ref = db.collection("roadmaps").document(roadmap_id)
-        doc_ref.set({
+        header, days = split_roadmap(roadmap_json)
+        batch = db.batch()
+        batch.set(doc_ref, {
             "topic": topic,
             "description": description,
-            "roadmap": roadmap_json,
+            "roadmap": header,
+            "day_count": len(days),
             "summary": summary,
             "summary_audio_path": summary_audio_path,
             "created_at": datetime.now()
         })
+        for day_data in days:
+            batch.set(doc_ref.collection(DAYS_COLLECTION).document(str(day_data["day"])), day_data)
+        batch.commit()
+        _listing_cache.clear()
         print(f"[FIRESTORE] Roadmap saved with ID: {roadmap_id}")
     except Exception as e:
-        print(f"[FIRESTORE] Failed to save roadmap, continuing anyway: {e}")
+        print(f"[FIRESTORE] Failed to save roadmap: {e}")
+        raise Exception(f"Failed to save roadmap: {e}") from e
     
     return roadmap_id
 
+def split_roadmap(roadmap_json):
+    """(header, days): the roadmap without its days, and the day dicts.
+
+    A day the model left unnumbered gets its 1-based position in the list.
+    """
+    header = {key: value for key, value in roadmap_json.items() if key != "days"}
+    days = [
+        day_data if day_data.get("day") is not None else dict(day_data, day=index)
+        for index, day_data in enumerate(roadmap_json.get("days", []), start=1)
+    ]
+    return header, days
+
+def invalidate_roadmap(roadmap_id):
+    """Drop every cached read of roadmap_id"""
+    for key, _ in _read_cache.items():
+        if key[1] == roadmap_id:
+            _read_cache.delete(key)
+
+def _watch_roadmap(roadmap_id):
+    with _watches_lock:
+        if roadmap_id in _watches:
+            return
+        _watches[roadmap_id] = None
+        # Keep about one watch per cache entry
+        stale = []
+        while len(_watches) > ROADMAP_READ_CACHE_MAX_ENTRIES:
+            stale.append(_watches.popitem(last=False)[1])
+
+    first_snapshot = [True]
+
+    def on_change(docs, changes, read_time):
+        # The listener fires once with the current state when it attaches
+        if first_snapshot[0]:
+            first_snapshot[0] = False
+            return
+        print(f"[FIRESTORE] Roadmap {roadmap_id} changed, invalidating cached reads")
+        invalidate_roadmap(roadmap_id)
+
+    try:
+        watch = db.collection("roadmaps").document(roadmap_id).on_snapshot(on_change)
+    except Exception as e:
+        print(f"[FIRESTORE] Failed to watch roadmap {roadmap_id}: {e}")
+        watch = None
+    with _watches_lock:
+        if roadmap_id in _watches:
+            _watches[roadmap_id] = watch
+        elif watch:
+            stale.append(watch)
+    for old in stale:
+        if old:
+            old.unsubscribe()
+
+def _cached_read(key, read):
+    """Read-through cache for roadmap reads; concurrent misses on one key share a single read"""
+    value = _read_cache.get(key)
+    if value is None:
+        def load():
+            result = read()
+            if result is not None:
+                # Not-found isn't cached: the roadmap may still be being saved
+                _read_cache.set(key, result)
+                if ROADMAP_READ_CACHE_LISTEN:
+                    _watch_roadmap(key[1])
+            return result
+        value = _read_inflight.do(key, load)
+    return copy.deepcopy(value)
+
 def get_lesson(roadmap_id, day):
+    return _cached_read(("lesson", roadmap_id, day), lambda: _read_lesson(roadmap_id, day))
+
+def _read_lesson(roadmap_id, day):
     if not db:
         raise Exception("Firestore not configured. Check GOOGLE_CLOUD_PROJECT in .env")
     
     doc_ref = db.collection("roadmaps").document(roadmap_id)
-    doc = doc_ref.get()
+    day_doc = _get(doc_ref.collection(DAYS_COLLECTION).document(str(day)))
+    if day_doc.exists:
+        return day_doc.to_dict()
     
+    # Roadmaps saved before the per-day layout keep their days inline
+    doc = _get(doc_ref)
     if doc.exists:
         roadmap = doc.to_dict()["roadmap"]
-        for day_data in roadmap["days"]:
-            if day_data["day"] == day:
+        for index, day_data in enumerate(roadmap.get("days", []), start=1):
+            if day_data.get("day", index) == day:
                 return day_data
     
     return None
 
-def get_all_roadmaps():
+def _encode_cursor(created_at, roadmap_id):
+    payload = json.dumps({"created_at": created_at.isoformat(), "id": roadmap_id})
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+def _decode_cursor(cursor):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(payload["created_at"]), payload["id"]
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid cursor")
+
+def get_all_roadmaps(limit=ROADMAP_PAGE_SIZE, cursor=None):
+    """One page of roadmaps, newest first. Returns (roadmaps, next_cursor)."""
     if not db:
         raise Exception("Firestore not configured. Check GOOGLE_CLOUD_PROJECT in .env")
     
-    docs = db.collection("roadmaps").stream()
-    roadmaps = []
+    cache_key = (limit, cursor)
+    if ROADMAP_LIST_CACHE_TTL_SECONDS > 0:
+        page = _listing_cache.get(cache_key)
+        if page is not None:
+            return page
+    
+    query = (
+        db.collection("roadmaps")
+        .select(LISTING_FIELDS)
+        .order_by("created_at", direction=firestore.Query.DESCENDING)
+        .order_by("__name__", direction=firestore.Query.DESCENDING)
+        .limit(limit + 1)
+    )
+    if cursor:
+        created_at, roadmap_id = _decode_cursor(cursor)
+        query = query.start_after({"created_at": created_at, "__name__": roadmap_id})
     
-    for doc in docs:
+    roadmaps = []
+    for doc in query.stream(timeout=rpc_timeout("firestore")):
         data = doc.to_dict()
         roadmaps.append({
             "id": doc.id,
@@ -72,22 +214,39 @@ def get_all_roadmaps():
             "created_at": data["created_at"]
         })
     
-    return roadmaps
+    next_cursor = None
+    if len(roadmaps) > limit:
+        # The extra document only tells us another page exists
+        roadmaps = roadmaps[:limit]
+        next_cursor = _encode_cursor(roadmaps[-1]["created_at"], roadmaps[-1]["id"])
+    
+    page = (roadmaps, next_cursor)
+    if ROADMAP_LIST_CACHE_TTL_SECONDS > 0:
+        _listing_cache.set(cache_key, page)
+    return page
+
+def get_single_roadmap(roadmap_id, include_days=True):
+    """Roadmap by ID; include_days=False skips reading the day documents"""
+    return _cached_read(("roadmap", roadmap_id, include_days), lambda: _read_roadmap(roadmap_id, include_days))
 
-def get_single_roadmap(roadmap_id):
+def _read_roadmap(roadmap_id, include_days):
     if not db:
         raise Exception("Firestore not configured. Check GOOGLE_CLOUD_PROJECT in .env")
     
     doc_ref = db.collection("roadmaps").document(roadmap_id)
-    doc = doc_ref.get()
+    doc = _get(doc_ref)
     
     if doc.exists:
         data = doc.to_dict()
+        roadmap = data["roadmap"]
+        if include_days and "days" not in roadmap:
+            days = doc_ref.collection(DAYS_COLLECTION).order_by("day").stream(timeout=rpc_timeout("firestore"))
+            roadmap = dict(roadmap, days=[day_doc.to_dict() for day_doc in days])
         return {
             "id": doc.id,
             "topic": data["topic"],
             "description": data["description"],
-            "roadmap": data["roadmap"],
+            "roadmap": roadmap,
             "summary": data.get("summary", ""),
             "summary_audio_path": data.get("summary_audio_path"),
             "created_at": data["created_at"]
@@ -95,26 +254,38 @@ def get_single_roadmap(roadmap_id):
     
     return None
 
+def roadmap_read_cache_stats():
+    with _watches_lock:
+        watches = len(_watches)
+    return dict(_read_cache.stats(), coalesced=_read_inflight.coalesced, watches=watches)
+
 # Welcome Session Database Functions
-def save_welcome_session(guest_id, session_name, chat_history, collected_info, current_step):
-    """Save welcome session to database"""
-    if not db:
-        print("[FIRESTORE] Database not configured, skipping save")
+def save_welcome_session_updates(updates):
+    """Write several welcome session changes in one batch.
+
+    Each update is {"guest_id", "session_name", "new_messages", "collected_info",
+    "current_step"}; only new messages are sent and appended with ArrayUnion,
+    so the write size doesn't grow with the conversation.
+    """
+    if not db or not updates:
         return
     
-    try:
-        doc_ref = db.collection("welcome_sessions").document(guest_id)
-        doc_ref.set({
-            "guest_id": guest_id,
-            "session_name": session_name,
-            "chat_history": chat_history,
-            "collected_info": collected_info,
-            "current_step": current_step,
-            "updated_at": datetime.now()
-        }, merge=True)
-        print(f"[FIRESTORE] Welcome session saved for guest: {guest_id}")
-    except Exception as e:
-        print(f"[FIRESTORE] Failed to save welcome session: {e}")
+    # Firestore allows at most 500 writes per batch
+    for start in range(0, len(updates), 500):
+        batch = db.batch()
+        for update in updates[start:start + 500]:
+            fields = {
+                "guest_id": update["guest_id"],
+                "session_name": update["session_name"],
+                "collected_info": update["collected_info"],
+                "current_step": update["current_step"],
+                "updated_at": datetime.now()
+            }
+            if update["new_messages"]:
+                fields["chat_history"] = firestore.ArrayUnion(update["new_messages"])
+            batch.set(db.collection("welcome_sessions").document(update["guest_id"]), fields, merge=True)
+        batch.commit()
+    print(f"[FIRESTORE] Welcome sessions saved: {len(updates)}")
 
 def get_welcome_session_from_db(guest_id):
     """Get welcome session from database"""
@@ -123,11 +294,77 @@ def get_welcome_session_from_db(guest_id):
     
     try:
         doc_ref = db.collection("welcome_sessions").document(guest_id)
-        doc = doc_ref.get()
+        doc = _get(doc_ref)
         
         if doc.exists:
             return doc.to_dict()
         return None
     except Exception as e:
         print(f"[FIRESTORE] Failed to get welcome session: {e}")
-        return None
\ No newline at end of file
+        return None
+# Session Store Database Functions
+def get_session_record(record_id):
+    """Serialized session state, or None if missing or expired"""
+    if not db:
+        return None
+    
+    try:
+        doc = _get(db.collection("session_store").document(record_id))
+        if doc.exists:
+            data = doc.to_dict()
+            if data["expires_at"] > datetime.now(timezone.utc):
+                return data["data"]
+        return None
+    except Exception as e:
+        print(f"[FIRESTORE] Failed to get session record: {e}")
+        return None
+
+def save_session_record(record_id, data, ttl_seconds):
+    if not db:
+        return
+    
+    try:
+        db.collection("session_store").document(record_id).set({
+            "data": data,
+            "expires_at": datetime.now(timezone.utc) + timedelta(seconds=ttl_seconds)
+        })
+    except Exception as e:
+        print(f"[FIRESTORE] Failed to save session record: {e}")
+
+def delete_session_record(record_id):
+    if not db:
+        return
+    
+    try:
+        db.collection("session_store").document(record_id).delete()
+    except Exception as e:
+        print(f"[FIRESTORE] Failed to delete session record: {e}")
+
+# Roadmap Cache Database Functions
+def get_cached_roadmap(cache_key):
+    """Get a cached roadmap (and when it was stored) by its normalized-prompt key"""
+    if not db:
+        return None
+    
+    try:
+        doc = _get(db.collection("roadmap_cache").document(cache_key))
+        if doc.exists:
+            return doc.to_dict()
+        return None
+    except Exception as e:
+        print(f"[FIRESTORE] Failed to get cached roadmap: {e}")
+        return None
+
+def save_cached_roadmap(cache_key, normalized_prompt, roadmap_json):
+    """Store a generated roadmap under its normalized-prompt key"""
+    if not db:
+        return
+    
+    try:
+        db.collection("roadmap_cache").document(cache_key).set({
+            "prompt": normalized_prompt,
+            "roadmap": roadmap_json,
+            "created_at": datetime.now(timezone.utc)
+        })
+    except Exception as e:
+        print(f"[FIRESTORE] Failed to save cached roadmap: {e}")
@@ -0,0 +1,248 @@
+import contextvars
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, Hashable, Optional
+from google.api_core import exceptions as api_exceptions
+from .cache import SingleFlight
+from .deadlines import current_deadline
+
+# Priority classes: lower runs first
+INTERACTIVE = 0
+BATCH = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+# Token bucket in front of Vertex AI: sustained requests per second and burst size
+GEMINI_RATE_PER_SECOND = float(os.getenv("GEMINI_RATE_PER_SECOND", "10"))
+GEMINI_BURST = int(os.getenv("GEMINI_BURST", "20"))
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "16"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "4"))
+GEMINI_RETRY_BASE_SECONDS = float(os.getenv("GEMINI_RETRY_BASE_SECONDS", "0.5"))
+GEMINI_RETRY_MAX_SECONDS = float(os.getenv("GEMINI_RETRY_MAX_SECONDS", "8"))
+# How long a call may wait and retry in total, per priority class
+GEMINI_DEADLINES = {
+    INTERACTIVE: float(os.getenv("GEMINI_INTERACTIVE_DEADLINE_SECONDS", "20")),
+    BATCH: float(os.getenv("GEMINI_BATCH_DEADLINE_SECONDS", "90")),
+}
+
+# Quota and overload errors worth retrying after a pause
+RETRYABLE_ERRORS = (
+    api_exceptions.TooManyRequests,
+    api_exceptions.ResourceExhausted,
+    api_exceptions.ServiceUnavailable,
+)
+_QUOTA_ERRORS = (api_exceptions.TooManyRequests, api_exceptions.ResourceExhausted)
+_END = object()
+
+class GeminiOverloaded(Exception):
+    """Gemini couldn't be called before the deadline (quota, overload or queueing)"""
+
+class _Slot:
+    """One admitted call's concurrency slot, released exactly once"""
+
+    def __init__(self, scheduler: "GeminiScheduler"):
+        self.scheduler = scheduler
+        self.held = False
+        self._released = False
+        self._lock = threading.Lock()
+
+    def release(self):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self.scheduler._release()
+
+# Slot of the scheduled call running in this context
+_current_slot: contextvars.ContextVar[Optional[_Slot]] = contextvars.ContextVar("gemini_slot", default=None)
+
+class GeminiScheduler:
+    """Admission control for Gemini calls.
+
+    Calls wait for a token-bucket token and a concurrency slot, interactive
+    calls ahead of batch ones; identical calls in flight share one request;
+    429/503 responses are retried with jittered exponential backoff until the
+    call's deadline.
+    """
+
+    def __init__(self, rate: float = GEMINI_RATE_PER_SECOND, burst: int = GEMINI_BURST,
+                 max_concurrency: int = GEMINI_MAX_CONCURRENCY):
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self._tokens = float(burst)
+        self._refilled = time.monotonic()
+        self._in_flight = 0
+        self._waiters = []  # heap of (priority, seq)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._inflight_calls = SingleFlight()
+        self._metrics = {"admitted": 0, "queued": 0, "retries": 0, "throttled_by_quota": 0, "deadline_exceeded": 0}
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+
+    def _acquire(self, priority: int, deadline: float):
+        with self._cond:
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._waiters, ticket)
+            waited = False
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if self._waiters[0] == ticket and self._in_flight < self.max_concurrency and self._tokens >= 1:
+                        heapq.heappop(self._waiters)
+                        self._tokens -= 1
+                        self._in_flight += 1
+                        self._metrics["admitted"] += 1
+                        # The next waiter may be admissible as well
+                        self._cond.notify_all()
+                        return
+                    if now >= deadline:
+                        self._metrics["deadline_exceeded"] += 1
+                        raise GeminiOverloaded(f"Gemini call not admitted before its deadline ({PRIORITY_NAMES[priority]})")
+                    if not waited:
+                        waited = True
+                        self._metrics["queued"] += 1
+                    timeout = deadline - now
+                    if self._tokens < 1:
+                        timeout = min(timeout, (1 - self._tokens) / self.rate)
+                    self._cond.wait(timeout)
+            except BaseException:
+                if ticket in self._waiters:
+                    self._waiters.remove(ticket)
+                    heapq.heapify(self._waiters)
+                    self._cond.notify_all()
+                raise
+
+    def _release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def _retry_or_raise(self, error: Exception, attempt: int, deadline: float):
+        """Back off before another attempt, or raise when out of retries or time"""
+        if isinstance(error, _QUOTA_ERRORS):
+            with self._cond:
+                # Quota is exhausted server-side: empty the bucket so every caller slows down
+                self._tokens = min(self._tokens, 0.0)
+                self._metrics["throttled_by_quota"] += 1
+        delay = random.uniform(0, min(GEMINI_RETRY_MAX_SECONDS, GEMINI_RETRY_BASE_SECONDS * 2 ** attempt))
+        if attempt >= GEMINI_MAX_RETRIES or time.monotonic() + delay >= deadline:
+            self._metrics["deadline_exceeded"] += 1
+            raise GeminiOverloaded(f"Gemini unavailable after {attempt + 1} attempts: {error}") from error
+        print(f"[GEMINI] {type(error).__name__}, retrying in {delay:.2f}s")
+        self._metrics["retries"] += 1
+        time.sleep(delay)
+
+    def _deadline(self, priority: int, deadline: Optional[float]) -> float:
+        if deadline is None:
+            deadline = time.monotonic() + GEMINI_DEADLINES[priority]
+        # Never queue or retry past the current request's deadline
+        request_deadline = current_deadline()
+        return deadline if request_deadline is None else min(deadline, request_deadline)
+
+    def call(self, func: Callable, priority: int = INTERACTIVE, key: Hashable = None, deadline: float = None):
+        """Run func() once admitted, retrying quota/overload errors; calls with the same key in flight share one result.
+
+        deadline is a time.monotonic() value; it defaults to the priority class's
+        budget, capped by the request's deadline.
+        """
+        deadline = self._deadline(priority, deadline)
+
+        def attempt_all():
+            attempt = 0
+            while True:
+                self._acquire(priority, deadline)
+                slot = _Slot(self)
+                token = _current_slot.set(slot)
+                try:
+                    return func()
+                except RETRYABLE_ERRORS as e:
+                    error = e
+                finally:
+                    _current_slot.reset(token)
+                    if not slot.held:
+                        slot.release()
+                self._retry_or_raise(error, attempt, deadline)
+                attempt += 1
+
+        if key is None:
+            return attempt_all()
+        return self._inflight_calls.do(key, attempt_all)
+
+    def hold_slot(self) -> Callable[[], None]:
+        """Keep the running call's slot after func() returns; the returned callable frees it.
+
+        For work func() abandons but that keeps running (an RPC past its
+        deadline), so the concurrency cap counts it until it really ends.
+        """
+        slot = _current_slot.get()
+        if slot is None:
+            return lambda: None
+        slot.held = True
+        return slot.release
+
+    def stream(self, start: Callable, priority: int = INTERACTIVE, deadline: float = None):
+        """Iterate the stream start() returns while holding one slot.
+
+        Errors before the first chunk are retried like call(); once output has
+        been yielded a failure is passed on, since it can't be replayed. start()
+        runs with the slot current, so it may keep it with hold_slot().
+        """
+        deadline = self._deadline(priority, deadline)
+        attempt = 0
+        while True:
+            self._acquire(priority, deadline)
+            slot = _Slot(self)
+            token = _current_slot.set(slot)
+            try:
+                chunks = iter(start())
+                first = next(chunks, _END)
+                break
+            except RETRYABLE_ERRORS as e:
+                error = e
+            except BaseException:
+                if not slot.held:
+                    slot.release()
+                raise
+            finally:
+                _current_slot.reset(token)
+            if not slot.held:
+                slot.release()
+            self._retry_or_raise(error, attempt, deadline)
+            attempt += 1
+        try:
+            if first is not _END:
+                yield first
+                yield from chunks
+        finally:
+            # A stream that holds its slot frees it once its last read really ends
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+            if not slot.held:
+                slot.release()
+
+    def stats(self) -> Dict:
+        with self._cond:
+            waiting = {name: 0 for name in PRIORITY_NAMES.values()}
+            for priority, _ in self._waiters:
+                waiting[PRIORITY_NAMES[priority]] += 1
+            return dict(
+                self._metrics,
+                in_flight=self._in_flight,
+                waiting=waiting,
+                tokens=round(self._tokens, 2),
+                coalesced=self._inflight_calls.coalesced,
+            )
+
+scheduler = GeminiScheduler()
+
+def gemini_scheduler_stats() -> Dict:
+    return scheduler.stats()
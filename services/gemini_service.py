@@ -1,18 +1,65 @@
-import vertexai
-from vertexai.generative_models import GenerativeModel
 import json
 import os
+import threading
+from google.api_core.exceptions import DeadlineExceeded
+from .clients import get_gemini_model
+from .gemini_scheduler import scheduler, INTERACTIVE, BATCH, GeminiOverloaded
+from .deadlines import call_with_deadline, stream_with_deadline
 
-def generate_roadmap(learning_summary):
-    project_id = os.getenv("GOOGLE_CLOUD_PROJECT")
-    if not project_id:
-        raise Exception("GOOGLE_CLOUD_PROJECT not configured")
-        
-    vertexai.init(project=project_id, location="us-central1")
-    
-    model = GenerativeModel("gemini-2.5-flash-lite")
-    
-    prompt = f"""
+# Kinds of call that can wait behind interactive ones
+BATCH_KINDS = {"roadmap", "greeting"}
+
+def _priority(kind):
+    return BATCH if kind in BATCH_KINDS else INTERACTIVE
+
+# kind -> prompt/output token totals from each response's usage_metadata
+_usage = {}
+_usage_lock = threading.Lock()
+
+def _record_usage(kind, response):
+    """Add a response's token counts to the totals for kind; returns its prompt token count"""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return None
+    prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+    cached_tokens = getattr(usage, "cached_content_token_count", 0) or 0
+    with _usage_lock:
+        totals = _usage.setdefault(kind, {"calls": 0, "prompt_tokens": 0, "cached_prompt_tokens": 0, "output_tokens": 0})
+        totals["calls"] += 1
+        totals["prompt_tokens"] += prompt_tokens
+        totals["cached_prompt_tokens"] += cached_tokens
+        totals["output_tokens"] += getattr(usage, "candidates_token_count", 0) or 0
+    print(f"[GEMINI] {kind}: {prompt_tokens} prompt tokens ({cached_tokens} cached)")
+    return prompt_tokens
+
+def _generate(model, kind, *args, **kwargs):
+    """model.generate_content with its token usage recorded (once, even when the result is shared)"""
+    # The Vertex SDK takes no per-call timeout, so the wait is bounded instead. A call
+    # abandoned at the deadline keeps its scheduler slot until it actually returns.
+    response = call_with_deadline(
+        "gemini", lambda timeout: model.generate_content(*args, **kwargs), enforce=True,
+        pool="gemini_rpc", on_done=scheduler.hold_slot())
+    _record_usage(kind, response)
+    return response
+
+def _stream(model, *args, **kwargs):
+    """model.generate_content(stream=True) with a deadline on the first chunk and between chunks.
+
+    A stream abandoned at its deadline keeps its scheduler slot until the stalled read returns.
+    """
+    return stream_with_deadline(
+        "gemini", lambda: model.generate_content(*args, stream=True, **kwargs),
+        pool="gemini_rpc", on_done=scheduler.hold_slot())
+
+def gemini_usage_stats():
+    with _usage_lock:
+        return {
+            kind: dict(totals, avg_prompt_tokens=round(totals["prompt_tokens"] / totals["calls"], 1))
+            for kind, totals in _usage.items()
+        }
+
+def _roadmap_prompt(learning_summary):
+    return f"""
     Create a detailed learning roadmap based on this summary: {learning_summary}
     
     Return ONLY valid JSON in this format:
@@ -30,13 +77,28 @@ def generate_roadmap(learning_summary):
     }}
     Learning Summary: "{learning_summary}"
     """
-    
-    response = model.generate_content(prompt)
-    
-    print(f"[GEMINI] Raw response: {response.text}")
-    
-    # Clean the response text
-    response_text = response.text.strip()
+
+def _fallback_roadmap():
+    return {
+        "topic": "Learning Topic",
+        "summary": "A comprehensive learning roadmap to help you master your chosen subject.",
+        "days": [
+            {
+                "day": 1,
+                "title": "Getting Started",
+                "tasks": ["Introduction to the topic", "Basic concepts"],
+                "lesson": "Welcome to your learning journey! Today we'll start with the fundamentals and build a strong foundation."
+            }
+        ]
+    }
+
+def is_fallback_roadmap(roadmap):
+    """True for the stub returned when the model output couldn't be parsed"""
+    return roadmap == _fallback_roadmap()
+
+def _parse_roadmap_text(text):
+    """Strip markdown fences from the model output and parse it, falling back to a stub roadmap"""
+    response_text = text.strip()
     
     # Remove markdown code blocks if present
     if response_text.startswith('```json'):
@@ -55,37 +117,185 @@ def generate_roadmap(learning_summary):
         return json.loads(response_text)
     except json.JSONDecodeError as e:
         print(f"[GEMINI] JSON decode error: {e}")
-        print(f"[GEMINI] Failed text: {response_text}")
         # Return a fallback roadmap structure
-        return {
-            "topic": "Learning Topic",
-            "summary": "A comprehensive learning roadmap to help you master your chosen subject.",
-            "days": [
-                {
-                    "day": 1,
-                    "title": "Getting Started",
-                    "tasks": ["Introduction to the topic", "Basic concepts"],
-                    "lesson": "Welcome to your learning journey! Today we'll start with the fundamentals and build a strong foundation."
-                }
-            ]
+        return _fallback_roadmap()
+
+def generate_roadmap(learning_summary):
+    model = get_gemini_model()
+    prompt = _roadmap_prompt(learning_summary)
+    response = scheduler.call(lambda: _generate(model, "roadmap", prompt), BATCH, key=("roadmap", prompt))
+    return _parse_roadmap_text(response.text)
+
+class RoadmapStreamParser:
+    """Incremental scanner over streamed roadmap JSON.
+
+    Emits each completed object of the top-level "days" array as soon as its
+    closing brace arrives, and picks up top-level string fields (topic, summary)
+    along the way. Anything outside the outer object, such as markdown fences,
+    is ignored.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.fields = {}
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._string_start = None
+        self._last_string = None
+        self._key = None
+        self._expect_value = False
+        self._days_depth = None
+        self._object_start = None
+
+    def feed(self, text):
+        """Add text and return the day objects completed by it"""
+        self.buffer += text
+        days = []
+        buf = self.buffer
+        for i in range(self._pos, len(buf)):
+            ch = buf[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        value = json.loads(buf[self._string_start:i + 1])
+                        if self._expect_value:
+                            self.fields[self._key] = value
+                            self._expect_value = False
+                        else:
+                            self._last_string = value
+                continue
+            if ch == '"':
+                if self._depth > 0:
+                    self._in_string = True
+                    self._string_start = i
+            elif ch == ":" and self._depth == 1:
+                self._key = self._last_string
+                self._expect_value = True
+            elif ch == "," and self._depth == 1:
+                self._expect_value = False
+            elif ch in "{[":
+                if ch == "[" and self._depth == 1 and self._key == "days":
+                    self._days_depth = 2
+                elif ch == "{" and self._days_depth is not None and self._depth == self._days_depth:
+                    self._object_start = i
+                self._depth += 1
+                self._expect_value = False
+            elif ch in "}]" and self._depth > 0:
+                self._depth -= 1
+                if ch == "}" and self._object_start is not None and self._depth == self._days_depth:
+                    try:
+                        days.append(json.loads(buf[self._object_start:i + 1]))
+                    except json.JSONDecodeError as e:
+                        print(f"[GEMINI] Skipping unparseable day object: {e}")
+                    self._object_start = None
+                elif ch == "]" and self._depth == 1 and self._days_depth is not None:
+                    self._days_depth = None
+        self._pos = len(buf)
+        return days
+
+def generate_roadmap_stream(learning_summary):
+    """Stream a roadmap: yields ("day", day) for each day as it is generated, then ("roadmap", roadmap)"""
+    model = get_gemini_model()
+    parser = RoadmapStreamParser()
+    days = []
+    chunk = None
+    prompt = _roadmap_prompt(learning_summary)
+    for chunk in scheduler.stream(lambda: _stream(model, prompt), BATCH):
+        try:
+            text = chunk.text
+        except ValueError:
+            # Chunks without text parts (e.g. only finish metadata)
+            continue
+        for day in parser.feed(text):
+            days.append(day)
+            yield "day", day
+    # Token counts arrive with the last chunk
+    _record_usage("roadmap", chunk)
+
+    roadmap = _parse_roadmap_text(parser.buffer)
+    if len(roadmap.get("days", [])) < len(days):
+        # The full text didn't parse but the streamed days did
+        roadmap = {
+            "topic": parser.fields.get("topic", roadmap["topic"]),
+            "summary": parser.fields.get("summary", roadmap.get("summary", "")),
+            "days": days
         }
+    yield "roadmap", roadmap
+
+# Canned replies get_gemini_response returns when Gemini can't answer
+UNAVAILABLE_REPLY = "I'm having trouble connecting. Could you please repeat that?"
+UNCLEAR_REPLY = "I'm having trouble understanding. Could you please repeat that?"
+FALLBACK_REPLIES = (UNAVAILABLE_REPLY, UNCLEAR_REPLY)
 
-def get_gemini_response(prompt):
+def get_gemini_response(prompt, system_instruction=None, kind="chat"):
     """Get a simple text response from Gemini for conversation"""
     try:
         project_id = os.getenv("GOOGLE_CLOUD_PROJECT")
         if not project_id:
-            return "I'm having trouble connecting. Could you please repeat that?"
+            return UNAVAILABLE_REPLY
             
-        vertexai.init(project=project_id, location="us-central1")
-        
-        model = GenerativeModel("gemini-2.5-flash-lite")
-        response = model.generate_content(prompt)
+        model = get_gemini_model(system_instruction)
+        response = scheduler.call(
+            lambda: _generate(model, kind, prompt), _priority(kind), key=(kind, system_instruction, prompt))
         
         if not response or not response.text:
-            return "I'm having trouble understanding. Could you please repeat that?"
+            return UNCLEAR_REPLY
             
         return response.text.strip()
+    except (GeminiOverloaded, DeadlineExceeded) as e:
+        print(f"[GEMINI] Overloaded: {e}")
+        return UNAVAILABLE_REPLY
     except Exception as e:
         print(f"[GEMINI] Error getting response: {e}")
-        return "I'm having trouble understanding. Could you please repeat that?"
\ No newline at end of file
+        return UNCLEAR_REPLY
+
+def get_structured_response(prompt, schema, system_instruction=None, kind="structured"):
+    """JSON response constrained to schema (an OpenAPI-style dict), or None if the call or parsing fails"""
+    try:
+        if not os.getenv("GOOGLE_CLOUD_PROJECT"):
+            return None
+        from vertexai.generative_models import GenerationConfig
+        
+        model = get_gemini_model(system_instruction)
+        config = GenerationConfig(response_mime_type="application/json", response_schema=schema)
+        response = scheduler.call(
+            lambda: _generate(model, kind, prompt, generation_config=config), _priority(kind),
+            key=(kind, system_instruction, prompt, json.dumps(schema, sort_keys=True))
+        )
+        if not response or not response.text:
+            return None
+        return json.loads(response.text)
+    except Exception as e:
+        print(f"[GEMINI] Error getting structured response: {e}")
+        return None
+
+def stream_gemini_response(prompt, system_instruction=None, kind="chat"):
+    """Streaming get_gemini_response: yields pieces of the reply text as they are generated"""
+    fallback = UNCLEAR_REPLY
+    produced = False
+    try:
+        if not os.getenv("GOOGLE_CLOUD_PROJECT"):
+            yield UNAVAILABLE_REPLY
+            return
+        chunk = None
+        model = get_gemini_model(system_instruction)
+        for chunk in scheduler.stream(lambda: _stream(model, prompt), _priority(kind)):
+            try:
+                text = chunk.text
+            except ValueError:
+                continue
+            if text:
+                produced = True
+                yield text
+        _record_usage(kind, chunk)
+    except Exception as e:
+        print(f"[GEMINI] Error streaming response: {e}")
+    if not produced:
+        yield fallback
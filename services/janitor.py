@@ -0,0 +1,124 @@
+import os
+import threading
+import time
+from typing import Dict
+from . import session_writer
+from .audio_cache import AUDIO_DIR
+from .session_store import get_session_store
+from .tts_service import audio_cache
+
+# How often the janitor runs
+JANITOR_INTERVAL_SECONDS = float(os.getenv("JANITOR_INTERVAL_SECONDS", "60"))
+# Files in audio/ the TTS cache doesn't manage (leftover temp files, older
+# uploads) are removed once they are this old...
+AUDIO_MAX_AGE_SECONDS = int(os.getenv("AUDIO_MAX_AGE_SECONDS", "3600"))
+# ...or sooner, oldest first, while audio/ as a whole is over this many bytes.
+# On Cloud Run audio/ lives in memory, so this is effectively a RAM budget.
+AUDIO_DIR_MAX_BYTES = int(os.getenv("AUDIO_DIR_MAX_BYTES", str(512 * 1024 * 1024)))
+
+_stopped = threading.Event()
+_thread = None
+_lock = threading.Lock()
+_gauges = {
+    "runs": 0,
+    "last_run_ms": 0.0,
+    "audio_bytes": 0,
+    "audio_files": 0,
+    "untracked_files_removed": 0,
+    "untracked_bytes_removed": 0,
+    "sessions_expired": 0,
+}
+
+def _scan(directory: str):
+    """(mtime, filename, size) of every file in directory"""
+    files = []
+    if not os.path.isdir(directory):
+        return files
+    for entry in os.scandir(directory):
+        try:
+            if entry.is_file():
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name, stat.st_size))
+        except OSError:
+            continue
+    return files
+
+def sweep_audio(directory: str = AUDIO_DIR):
+    """Enforce the age and size budgets on audio/; returns (files, bytes) left"""
+    # Cached TTS files go through the cache, which keeps files a session still references
+    audio_cache.evict()
+
+    files = _scan(directory)
+    total = sum(size for _, _, size in files)
+    cutoff = time.time() - AUDIO_MAX_AGE_SECONDS
+    removed, removed_bytes, evicted = 0, 0, 0
+    for mtime, name, size in sorted(files):
+        if audio_cache.tracks(name) or audio_cache.pending(name):
+            continue
+        if name.endswith(".tmp") and mtime >= cutoff:
+            # Probably a cache file being written right now
+            continue
+        if mtime >= cutoff and total <= AUDIO_DIR_MAX_BYTES:
+            continue
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+        removed_bytes += size
+
+    if total > AUDIO_DIR_MAX_BYTES:
+        # Still over: shrink the TTS cache by the excess, pinned files included if need be
+        before = audio_cache.stats()
+        print(f"[JANITOR] audio/ is {total} bytes, over its {AUDIO_DIR_MAX_BYTES} byte budget; shrinking the TTS cache")
+        audio_cache.evict(max_bytes=max(0, before["bytes"] - (total - AUDIO_DIR_MAX_BYTES)))
+        after = audio_cache.stats()
+        total -= before["bytes"] - after["bytes"]
+        evicted = before["entries"] - after["entries"]
+    with _lock:
+        _gauges["untracked_files_removed"] += removed
+        _gauges["untracked_bytes_removed"] += removed_bytes
+    return len(files) - removed - evicted, total
+
+def expire_sessions() -> int:
+    """Drop idle sessions that haven't been looked at since they expired"""
+    expired = get_session_store().purge_expired()
+    session_writer.forget_idle()
+    return expired
+
+def run_once():
+    start = time.perf_counter()
+    try:
+        files, total = sweep_audio()
+        expired = expire_sessions()
+    except Exception as e:
+        print(f"[JANITOR] Run failed: {e}")
+        return
+    with _lock:
+        _gauges["runs"] += 1
+        _gauges["last_run_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        _gauges["audio_files"] = files
+        _gauges["audio_bytes"] = total
+        _gauges["sessions_expired"] += expired
+
+def _run():
+    while True:
+        run_once()
+        if _stopped.wait(JANITOR_INTERVAL_SECONDS):
+            break
+
+def start():
+    """Start the background janitor thread (once)"""
+    global _thread
+    if _thread is None:
+        _stopped.clear()
+        _thread = threading.Thread(target=_run, name="janitor", daemon=True)
+        _thread.start()
+
+def stop():
+    _stopped.set()
+
+def janitor_stats() -> Dict:
+    with _lock:
+        return dict(_gauges)
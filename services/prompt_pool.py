@@ -0,0 +1,150 @@
+import itertools
+import os
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+from .gemini_service import get_gemini_response, FALLBACK_REPLIES, UNCLEAR_REPLY
+from .tts_service import generate_audio, audio_cache, resolve_audio_format
+
+# Pre-rendered greeting and fallback lines (text plus audio) for the welcome flow
+WELCOME_POOL_SIZE = int(os.getenv("WELCOME_POOL_SIZE", "5"))
+WELCOME_POOL_REFRESH_SECONDS = float(os.getenv("WELCOME_POOL_REFRESH_SECONDS", str(6 * 3600)))
+# random or round_robin
+WELCOME_POOL_ROTATION = os.getenv("WELCOME_POOL_ROTATION", "random").lower()
+
+GREETING_PROMPT = """
+You are a friendly learning assistant for Vision Path designed for blind users. A new user just arrived.
+Greet them warmly and ask what they would like to learn today.
+Mention that they should press Enter to start recording their response after you finish speaking.
+Be enthusiastic and encouraging. Keep it under 40 words.
+Don't mention days or experience level yet - just focus on what they want to learn.
+"""
+
+FALLBACK_TEXTS = [
+    UNCLEAR_REPLY,
+    "Sorry, I didn't quite catch that. Could you say it again?",
+    "I missed that, could you please repeat it?",
+    "Could you repeat that for me? I didn't understand it.",
+    "Sorry, something went wrong on my side. Could you please say that again?",
+]
+
+# kind -> [{"text", "audio_path"}]
+_pools: Dict[str, List[Dict]] = {"greeting": [], "fallback": []}
+_cursors = {kind: itertools.count() for kind in _pools}
+_lock = threading.Lock()
+_stopped = threading.Event()
+_thread = None
+# kind -> thread re-rendering a pool that lost entries to audio cache eviction
+_rerenders: Dict[str, threading.Thread] = {}
+_metrics = {"hits": 0, "misses": 0, "stale": 0, "refreshes": 0, "last_refresh": None}
+
+def _render(text: str) -> Dict:
+    audio_path = generate_audio(text)
+    # Pooled audio must outlive cache eviction until the next refresh replaces it
+    audio_cache.pin(audio_path, "prompt_pool", WELCOME_POOL_REFRESH_SECONDS * 2)
+    return {"text": text, "audio_path": audio_path}
+
+def _build_greetings() -> List[Dict]:
+    texts = []
+    for variant in range(WELCOME_POOL_SIZE * 2):
+        if len(texts) >= WELCOME_POOL_SIZE:
+            break
+        text = get_gemini_response(
+            f"{GREETING_PROMPT}\nVariation {variant + 1}: word it differently from a typical greeting.\n", kind="greeting")
+        if text in FALLBACK_REPLIES:
+            # Gemini is unavailable; keep whatever was built so far
+            break
+        if text not in texts:
+            texts.append(text)
+    return [_render(text) for text in texts]
+
+def _build_fallbacks() -> List[Dict]:
+    return [_render(text) for text in FALLBACK_TEXTS[:max(WELCOME_POOL_SIZE, 1)]]
+
+_BUILDERS = {"fallback": _build_fallbacks, "greeting": _build_greetings}
+
+def _refresh_kind(kind: str):
+    try:
+        entries = _BUILDERS[kind]()
+    except Exception as e:
+        print(f"[PROMPT_POOL] Failed to build {kind} pool: {e}")
+        return
+    if entries:
+        with _lock:
+            _pools[kind] = entries
+
+def refresh():
+    """Rebuild both pools; a pool that fails to build keeps its previous entries"""
+    for kind in _BUILDERS:
+        _refresh_kind(kind)
+    with _lock:
+        _metrics["refreshes"] += 1
+        _metrics["last_refresh"] = time.time()
+        sizes = {kind: len(entries) for kind, entries in _pools.items()}
+    print(f"[PROMPT_POOL] Refreshed: {sizes}")
+
+def pick(kind: str, audio_format: str = None) -> Optional[Dict]:
+    """A pooled {"text", "audio_path"}, or None if the pool is empty or audio_format isn't the pooled one"""
+    if audio_format and resolve_audio_format(audio_format) != resolve_audio_format():
+        return None
+    entry = None
+    stale = False
+    with _lock:
+        entries = _pools.get(kind)
+        while entries:
+            if WELCOME_POOL_ROTATION == "round_robin":
+                entry = entries[next(_cursors[kind]) % len(entries)]
+            else:
+                entry = random.choice(entries)
+            if os.path.exists(entry["audio_path"]):
+                break
+            # The audio cache evicted this line's file (its pin expired or the disk budget forced it)
+            entries.remove(entry)
+            entry = None
+            stale = True
+            _metrics["stale"] += 1
+        _metrics["hits" if entry else "misses"] += 1
+    if stale:
+        _rerender(kind)
+    return entry
+
+def _rerender(kind: str):
+    """Rebuild one pool in the background after its audio went missing, once at a time"""
+    with _lock:
+        running = _rerenders.get(kind)
+        if running is not None and running.is_alive():
+            return
+        thread = threading.Thread(target=_refresh_kind, args=(kind,), name=f"prompt-pool-{kind}", daemon=True)
+        _rerenders[kind] = thread
+    print(f"[PROMPT_POOL] Pooled {kind} audio was evicted, re-rendering")
+    thread.start()
+
+def add(kind: str, text: str, audio_path: str):
+    """Add a line rendered on the request path while the pool was still empty"""
+    with _lock:
+        if len(_pools[kind]) >= WELCOME_POOL_SIZE or any(entry["text"] == text for entry in _pools[kind]):
+            return
+        _pools[kind].append({"text": text, "audio_path": audio_path})
+    audio_cache.pin(audio_path, "prompt_pool", WELCOME_POOL_REFRESH_SECONDS * 2)
+
+def _run():
+    while True:
+        refresh()
+        if _stopped.wait(WELCOME_POOL_REFRESH_SECONDS):
+            break
+
+def start():
+    """Build the pools in the background and refresh them every WELCOME_POOL_REFRESH_SECONDS"""
+    global _thread
+    if _thread is None and WELCOME_POOL_SIZE > 0:
+        _stopped.clear()
+        _thread = threading.Thread(target=_run, name="prompt-pool", daemon=True)
+        _thread.start()
+
+def stop():
+    _stopped.set()
+
+def prompt_pool_stats() -> Dict:
+    with _lock:
+        return dict(_metrics, sizes={kind: len(entries) for kind, entries in _pools.items()})
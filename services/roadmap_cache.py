@@ -0,0 +1,229 @@
+import copy
+import hashlib
+import json
+import os
+import re
+import time
+import unicodedata
+from typing import Dict, Optional
+from .cache import SingleFlight, TTLCache
+from .gemini_service import generate_roadmap, generate_roadmap_stream, is_fallback_roadmap
+from .firestore_service import get_cached_roadmap, save_cached_roadmap
+
+ROADMAP_CACHE_ENABLED = os.getenv("ROADMAP_CACHE_ENABLED", "true").lower() == "true"
+ROADMAP_CACHE_MAX_ENTRIES = int(os.getenv("ROADMAP_CACHE_MAX_ENTRIES", "1000"))
+ROADMAP_CACHE_TTL_SECONDS = int(os.getenv("ROADMAP_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+# Jaccard similarity of content words above which two prompts may share a roadmap
+ROADMAP_CACHE_SIMILARITY = float(os.getenv("ROADMAP_CACHE_SIMILARITY", "0.8"))
+# ...as long as they also share at least this many content words
+ROADMAP_CACHE_MIN_OVERLAP = int(os.getenv("ROADMAP_CACHE_MIN_OVERLAP", "4"))
+# Rough Gemini pricing (USD per 1k tokens) used for the cost-saved estimate
+GEMINI_INPUT_COST_PER_1K = float(os.getenv("GEMINI_INPUT_COST_PER_1K", "0.0001"))
+GEMINI_OUTPUT_COST_PER_1K = float(os.getenv("GEMINI_OUTPUT_COST_PER_1K", "0.0004"))
+
+# exact key -> {"normalized", "words", "roadmap"}
+_entries = TTLCache(ROADMAP_CACHE_MAX_ENTRIES, ROADMAP_CACHE_TTL_SECONDS)
+# content words -> exact key of a prompt asking for the same roadmap
+_similar = TTLCache(ROADMAP_CACHE_MAX_ENTRIES, ROADMAP_CACHE_TTL_SECONDS)
+_inflight = SingleFlight()
+_metrics = {
+    "exact_hits": 0,
+    "similar_hits": 0,
+    "persistent_hits": 0,
+    "misses": 0,
+    "gemini_calls_saved": 0,
+    "estimated_tokens_saved": 0,
+    "estimated_cost_saved_usd": 0.0,
+}
+
+def normalize_prompt(prompt: str) -> str:
+    """Lowercase, strip punctuation and collapse whitespace.
+
+    "+", "#" and "." stay inside words so "C++", "C#", "C" and ".NET" remain different topics.
+    """
+    text = unicodedata.normalize("NFKC", prompt).lower()
+    text = re.sub(r"[^\w\s+#.]", " ", text)
+    words = (word.rstrip(".") for word in text.split())
+    return " ".join(word for word in words if re.search(r"\w", word))
+
+# Bumped whenever normalization changes, so entries stored under older keys are never served
+CACHE_KEY_VERSION = "2"
+
+def cache_key(normalized: str) -> str:
+    return hashlib.sha256(f"{CACHE_KEY_VERSION}:{normalized}".encode("utf-8")).hexdigest()[:32]
+
+# Filler words that don't change what roadmap is being asked for
+_STOPWORDS = {
+    "a", "an", "the", "i", "id", "im", "me", "my", "to", "in", "on", "for", "of", "and",
+    "as", "at", "want", "wanna", "would", "like", "please", "can", "you", "help", "how", "do",
+    "teach", "learn", "learning", "is", "am", "be", "with", "about", "some",
+}
+
+# Words that change the roadmap however similar the rest of the prompt is
+_LEVELS = {
+    "beginner", "novice", "basic", "intermediate", "advanced", "expert", "junior", "senior", "professional",
+}
+_NEGATIONS = {"not", "no", "without", "except", "excluding", "never", "avoid", "skip"}
+# "don't" normalizes to "don t"
+_CONTRACTED_NEGATIONS = {"don", "doesn", "didn", "can", "won", "isn", "aren"}
+
+def content_words(normalized: str) -> frozenset:
+    """Words that say what roadmap is asked for: no filler words or plurals.
+
+    A negation is kept together with the word it negates, so "Python without
+    Django" and "Django without Python" stay different.
+    """
+    words = normalized.split()
+    result = set()
+    negation = None
+    for i, word in enumerate(words):
+        if word in _CONTRACTED_NEGATIONS and i + 1 < len(words) and words[i + 1] == "t":
+            negation = f"{word}t"
+            continue
+        if word in _NEGATIONS:
+            negation = word
+            continue
+        if word in _STOPWORDS or (word == "t" and negation):
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        if negation:
+            word = f"{negation} {word}"
+            negation = None
+        result.add(word)
+    if negation:
+        result.add(negation)
+    return frozenset(result)
+
+def content_key(normalized: str) -> str:
+    """Key shared by prompts that differ only in filler words, word order and plurals.
+
+    Every other word must match: swapping one topic, level or number for another
+    changes the roadmap however long the rest of the prompt is.
+    """
+    return cache_key(" ".join(sorted(content_words(normalized))))
+
+def _guarded(words) -> frozenset:
+    """Numbers, levels, negations and symbol names ("C++", ".NET"), which must match exactly"""
+    return frozenset(
+        word for word in words
+        if word in _LEVELS or " " in word or re.search(r"[\d+#.]", word)
+        or word in _NEGATIONS or word[:-1] in _CONTRACTED_NEGATIONS
+    )
+
+def _similar_entry(normalized: str) -> Optional[Dict]:
+    """Most similar cached prompt that is safe to answer with, or None.
+
+    Beyond ROADMAP_CACHE_SIMILARITY and ROADMAP_CACHE_MIN_OVERLAP, the prompts
+    must agree on every guarded word and the cached roadmap's topic must be
+    named in the new prompt, so "React" is never answered with "Angular".
+    """
+    words = content_words(normalized)
+    guarded = _guarded(words)
+    best, best_similarity = None, 0.0
+    for _, entry in _entries.items():
+        shared = len(words & entry["words"])
+        if shared < ROADMAP_CACHE_MIN_OVERLAP:
+            continue
+        similarity = shared / len(words | entry["words"])
+        if similarity < ROADMAP_CACHE_SIMILARITY or similarity <= best_similarity:
+            continue
+        if _guarded(entry["words"]) != guarded:
+            continue
+        topic = content_words(normalize_prompt(entry["roadmap"].get("topic", "")))
+        if not topic or not topic <= words:
+            continue
+        best, best_similarity = entry, similarity
+    return best
+
+def _record_saving(prompt: str, roadmap: Dict):
+    input_tokens = len(prompt) // 4 + 150  # prompt template overhead
+    output_tokens = len(json.dumps(roadmap)) // 4
+    _metrics["gemini_calls_saved"] += 1
+    _metrics["estimated_tokens_saved"] += input_tokens + output_tokens
+    _metrics["estimated_cost_saved_usd"] += (
+        input_tokens / 1000 * GEMINI_INPUT_COST_PER_1K + output_tokens / 1000 * GEMINI_OUTPUT_COST_PER_1K
+    )
+
+def _remember(key: str, normalized: str, roadmap: Dict):
+    _entries.set(key, {"normalized": normalized, "words": content_words(normalized), "roadmap": roadmap})
+    _similar.set(content_key(normalized), key)
+
+def lookup_roadmap(prompt: str) -> Optional[Dict]:
+    """Cached roadmap for prompt: exact match, then near-duplicate, then the Firestore tier"""
+    if not ROADMAP_CACHE_ENABLED:
+        return None
+    normalized = normalize_prompt(prompt)
+    key = cache_key(normalized)
+
+    entry = _entries.get(key)
+    if entry is not None:
+        _metrics["exact_hits"] += 1
+        _record_saving(prompt, entry["roadmap"])
+        return copy.deepcopy(entry["roadmap"])
+
+    similar_key = _similar.get(content_key(normalized))
+    best = _entries.get(similar_key) if similar_key else None
+    if best is None:
+        best = _similar_entry(normalized)
+    if best is not None:
+        print(f"[ROADMAP_CACHE] Near-duplicate hit: '{normalized}' ~ '{best['normalized']}'")
+        _metrics["similar_hits"] += 1
+        _record_saving(prompt, best["roadmap"])
+        return copy.deepcopy(best["roadmap"])
+
+    stored = get_cached_roadmap(key)
+    if stored and time.time() - stored["created_at"].timestamp() < ROADMAP_CACHE_TTL_SECONDS:
+        _metrics["persistent_hits"] += 1
+        _remember(key, normalized, stored["roadmap"])
+        _record_saving(prompt, stored["roadmap"])
+        return copy.deepcopy(stored["roadmap"])
+
+    _metrics["misses"] += 1
+    return None
+
+def store_roadmap(prompt: str, roadmap: Dict):
+    """Add a freshly generated roadmap to both cache tiers"""
+    if not ROADMAP_CACHE_ENABLED or is_fallback_roadmap(roadmap):
+        return
+    normalized = normalize_prompt(prompt)
+    key = cache_key(normalized)
+    _remember(key, normalized, copy.deepcopy(roadmap))
+    save_cached_roadmap(key, normalized, roadmap)
+
+def get_or_generate_roadmap(prompt: str) -> Dict:
+    """Cached generate_roadmap; identical prompts in flight at the same time share one Gemini call"""
+    cached = lookup_roadmap(prompt)
+    if cached is not None:
+        return cached
+
+    def generate():
+        roadmap = generate_roadmap(prompt)
+        store_roadmap(prompt, roadmap)
+        return roadmap
+
+    return copy.deepcopy(_inflight.do(cache_key(normalize_prompt(prompt)), generate))
+
+def stream_roadmap(prompt: str):
+    """Cached generate_roadmap_stream: a hit replays its days immediately"""
+    cached = lookup_roadmap(prompt)
+    if cached is not None:
+        for day in cached.get("days", []):
+            yield "day", day
+        yield "roadmap", cached
+        return
+    for kind, payload in generate_roadmap_stream(prompt):
+        if kind == "roadmap":
+            store_roadmap(prompt, payload)
+        yield kind, payload
+
+def roadmap_cache_stats() -> Dict:
+    hits = _metrics["exact_hits"] + _metrics["similar_hits"] + _metrics["persistent_hits"]
+    lookups = hits + _metrics["misses"]
+    return dict(
+        _metrics,
+        estimated_cost_saved_usd=round(_metrics["estimated_cost_saved_usd"], 6),
+        hit_ratio=round(hits / lookups, 4) if lookups else 0.0,
+        coalesced=_inflight.coalesced,
+        entries=_entries.stats()["entries"],
+    )
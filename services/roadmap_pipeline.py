@@ -0,0 +1,121 @@
+import asyncio
+import time
+from typing import Dict
+from .executor import run_blocking
+from .deadlines import without_deadline
+from .roadmap_cache import get_or_generate_roadmap
+from .tts_service import generate_audio, audio_path_for
+from .firestore_service import save_roadmap
+from .session_service import add_audio_to_session
+from .audio_storage import audio_urls_for
+
+# Keeps background synthesis tasks alive until they finish
+_background_tasks = set()
+
+class StageTimings:
+    """Wall-clock duration of each pipeline stage, reported as a Server-Timing header"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations: Dict[str, float] = {}
+
+    async def timed(self, name, awaitable):
+        start = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.durations[name] = (time.perf_counter() - start) * 1000
+
+    def header(self) -> str:
+        stages = dict(self.durations, total=(time.perf_counter() - self.started) * 1000)
+        return ", ".join(f"{name};dur={duration:.1f}" for name, duration in stages.items())
+
+def _log_background_failure(task):
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception():
+        print(f"[TTS] Background synthesis failed: {task.exception()}")
+
+async def synthesize_until_first_chunk(text, audio_format):
+    """Start chunked synthesis and return (first_chunk_path, full_path) once the first chunk is playable.
+
+    The full file keeps synthesizing in the background; /audio/{filename} waits
+    for it if the client asks for it early.
+    """
+    loop = asyncio.get_running_loop()
+    first_chunk = loop.create_future()
+
+    def on_first_chunk(path):
+        loop.call_soon_threadsafe(lambda: first_chunk.done() or first_chunk.set_result(path))
+
+    # The rest of the file is finished after the response is sent, outside the request's budget
+    task = asyncio.ensure_future(
+        run_blocking("tts", without_deadline, generate_audio, text, audio_format, True, on_first_chunk))
+    _background_tasks.add(task)
+    task.add_done_callback(_log_background_failure)
+    await asyncio.wait({first_chunk, task}, return_when=asyncio.FIRST_COMPLETED)
+    if task.done():
+        full_path = task.result()
+        return (first_chunk.result() if first_chunk.done() else full_path), full_path
+    return first_chunk.result(), audio_path_for(text, audio_format)
+
+async def finish_roadmap(prompt, roadmap_json, audio_format, session_id=None, timings=None, day1_audio=None):
+    """Day 1 audio, summary audio and the Firestore write for a generated roadmap, run concurrently.
+
+    The summary audio path is content-addressed, so it is known before synthesis
+    finishes and the roadmap can be saved in parallel with it. day1_audio may be
+    an already started synthesize_until_first_chunk task. Only a failed save
+    fails the call: audio that couldn't be synthesized comes back as a missing
+    URL with the reason in audio_errors.
+    """
+    timings = timings or StageTimings()
+    summary = roadmap_json.get("summary", "")
+    summary_audio_path = audio_path_for(summary, audio_format) if summary else None
+    if day1_audio is None:
+        day1_audio = synthesize_until_first_chunk(roadmap_json["days"][0]["lesson"], audio_format)
+
+    save = timings.timed("save", run_blocking(
+        "firestore", save_roadmap, roadmap_json["topic"], prompt, roadmap_json, summary, summary_audio_path))
+    audio_stages = {"day1": timings.timed("day1_tts", day1_audio)}
+    if summary:
+        audio_stages["summary"] = timings.timed("summary_tts", run_blocking("tts", generate_audio, summary, audio_format))
+    # Let every stage finish before reporting, so a failed save doesn't orphan running synthesis
+    roadmap_id, *audio_results = await asyncio.gather(save, *audio_stages.values(), return_exceptions=True)
+    if isinstance(roadmap_id, BaseException):
+        raise roadmap_id
+
+    audio_errors = {}
+    for stage, outcome in zip(audio_stages, audio_results):
+        if isinstance(outcome, BaseException):
+            print(f"[TTS] {stage} audio failed for roadmap {roadmap_id}: {outcome}")
+            audio_errors[stage] = str(outcome)
+    first_chunk_path = audio_path = None
+    if "day1" not in audio_errors:
+        first_chunk_path, audio_path = audio_results[0]
+    if "summary" in audio_errors:
+        # Still saved with the roadmap: /roadmap-summary-audio synthesizes it on demand
+        summary_audio_path = None
+
+    # Add audio files to session for cleanup
+    if session_id:
+        await run_blocking("sessions", add_audio_to_session, session_id, audio_path, first_chunk_path, summary_audio_path)
+
+    # Signing URLs may call out to the storage backend
+    day1_url, first_chunk_url, summary_url = await run_blocking(
+        "storage", audio_urls_for, audio_path, first_chunk_path, summary_audio_path)
+    result = {
+        "roadmap_id": roadmap_id,
+        "roadmap": roadmap_json,
+        "day1_audio_url": day1_url,
+        "day1_first_chunk_audio_url": first_chunk_url,
+        "summary_audio_url": summary_url
+    }
+    if audio_errors:
+        result["audio_errors"] = audio_errors
+    return result
+
+async def run_roadmap_pipeline(prompt, audio_format, session_id=None):
+    """Generate a roadmap, then fan out its audio and persistence. Returns (result, timings)."""
+    timings = StageTimings()
+    roadmap_json = await timings.timed("gemini", run_blocking("gemini", get_or_generate_roadmap, prompt))
+    result = await finish_roadmap(prompt, roadmap_json, audio_format, session_id, timings)
+    return result, timings
@@ -1,27 +1,52 @@
 import os
 import uuid
-from typing import Dict, List
+from typing import List
+from .session_store import get_session_store, SESSION_TTL_SECONDS
+from .tts_service import audio_cache
 
-# In-memory session storage (use Redis in production)
-sessions: Dict[str, List[str]] = {}
+# Audio sessions: session_id -> {"files": [audio paths]} in the shared session store
+NAMESPACE = "audio"
+# Cached audio a session uses is kept this long after the session's last activity
+SESSION_AUDIO_PIN_SECONDS = min(int(os.getenv("SESSION_AUDIO_PIN_SECONDS", "1800")), SESSION_TTL_SECONDS)
 
 def create_session() -> str:
     session_id = str(uuid.uuid4())
-    sessions[session_id] = []
+    get_session_store().set(NAMESPACE, session_id, {"files": []})
     return session_id
 
-def add_audio_to_session(session_id: str, audio_path: str):
-    if session_id in sessions:
-        sessions[session_id].append(audio_path)
+def add_audio_to_session(session_id: str, *audio_paths: str):
+    """Track audio files for cleanup with one store read and at most one write (None paths are skipped)"""
+    store = get_session_store()
+    session = store.get(NAMESPACE, session_id)
+    if session is not None:
+        added = False
+        for audio_path in audio_paths:
+            if audio_path and audio_path not in session["files"]:
+                session["files"].append(audio_path)
+                added = True
+        # Cached audio can be shared by several sessions: hold a reference instead of
+        # owning it, and renew the session's older references while it is active
+        for audio_path in session["files"]:
+            # Includes files still being synthesized: the pin applies once they are stored
+            if audio_cache.manages(audio_path):
+                audio_cache.pin(audio_path, session_id, SESSION_AUDIO_PIN_SECONDS)
+        if added:
+            store.set(NAMESPACE, session_id, session)
 
 def cleanup_session(session_id: str):
-    if session_id in sessions:
-        for audio_path in sessions[session_id]:
-            if os.path.exists(audio_path):
+    store = get_session_store()
+    session = store.get(NAMESPACE, session_id)
+    if session is not None:
+        for audio_path in session["files"]:
+            if audio_cache.manages(audio_path):
+                # Left to the cache's eviction once no other session holds it
+                audio_cache.unpin(audio_path, session_id)
+            elif os.path.exists(audio_path):
                 os.remove(audio_path)
-        del sessions[session_id]
+        store.delete(NAMESPACE, session_id)
         return True
     return False
 
 def get_session_files(session_id: str) -> List[str]:
-    return sessions.get(session_id, [])
\ No newline at end of file
+    session = get_session_store().get(NAMESPACE, session_id)
+    return session["files"] if session else []
@@ -0,0 +1,133 @@
+import json
+import os
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, Optional
+from .cache import TTLCache
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# memory (single instance only), redis (any Redis-protocol server) or firestore
+SESSION_STORE_BACKEND = os.getenv("SESSION_STORE_BACKEND", "memory").lower()
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", str(24 * 3600)))
+SESSION_STORE_MAX_ENTRIES = int(os.getenv("SESSION_STORE_MAX_ENTRIES", "10000"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+REDIS_KEY_PREFIX = os.getenv("REDIS_KEY_PREFIX", "vlt:")
+
+def _dumps(value: Dict) -> str:
+    return json.dumps(value, separators=(",", ":"))
+
+class SessionStore(ABC):
+    """Key/value store for session state shared by every instance.
+
+    Values are JSON-serializable dicts grouped by namespace ("audio",
+    "welcome"); each key expires ttl seconds after it was last written.
+    """
+
+    @abstractmethod
+    def get(self, namespace: str, key: str) -> Optional[Dict]:
+        ...
+
+    @abstractmethod
+    def set(self, namespace: str, key: str, value: Dict, ttl: int = SESSION_TTL_SECONDS):
+        ...
+
+    @abstractmethod
+    def delete(self, namespace: str, key: str):
+        ...
+
+    def purge_expired(self) -> int:
+        """Drop expired sessions now; backends with native expiry have nothing to do"""
+        return 0
+
+    def stats(self) -> Dict:
+        return {"backend": SESSION_STORE_BACKEND}
+
+class MemorySessionStore(SessionStore):
+    """Bounded in-process store; sessions are lost on restart and not shared between instances"""
+
+    def __init__(self, max_entries: int = SESSION_STORE_MAX_ENTRIES, ttl_seconds: int = SESSION_TTL_SECONDS):
+        self._entries = TTLCache(max_entries, ttl_seconds)
+
+    def get(self, namespace, key):
+        data = self._entries.get((namespace, key))
+        return json.loads(data) if data is not None else None
+
+    def set(self, namespace, key, value, ttl=None):
+        # Stored serialized, like the shared backends, so callers can't alias the stored state.
+        # Without a ttl the store's own ttl_seconds applies.
+        self._entries.set((namespace, key), _dumps(value), ttl)
+
+    def delete(self, namespace, key):
+        self._entries.delete((namespace, key))
+
+    def purge_expired(self):
+        return len(self._entries.purge_expired())
+
+    def stats(self):
+        return dict(super().stats(), **self._entries.stats())
+
+class RedisSessionStore(SessionStore):
+    def __init__(self, url: str = REDIS_URL, prefix: str = REDIS_KEY_PREFIX, client=None):
+        if client is None:
+            if redis is None:
+                raise Exception("SESSION_STORE_BACKEND=redis requires the redis package (pip install redis)")
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, namespace, key):
+        return f"{self.prefix}{namespace}:{key}"
+
+    def get(self, namespace, key):
+        data = self.client.get(self._key(namespace, key))
+        return json.loads(data) if data is not None else None
+
+    def set(self, namespace, key, value, ttl=SESSION_TTL_SECONDS):
+        self.client.set(self._key(namespace, key), _dumps(value), ex=ttl)
+
+    def delete(self, namespace, key):
+        self.client.delete(self._key(namespace, key))
+
+class FirestoreSessionStore(SessionStore):
+    """Sessions in the "session_store" collection; expired documents are ignored on read.
+
+    Configure a Firestore TTL policy on the expires_at field to have them deleted.
+    """
+
+    def get(self, namespace, key):
+        from .firestore_service import get_session_record
+        data = get_session_record(f"{namespace}:{key}")
+        return json.loads(data) if data is not None else None
+
+    def set(self, namespace, key, value, ttl=SESSION_TTL_SECONDS):
+        from .firestore_service import save_session_record
+        save_session_record(f"{namespace}:{key}", _dumps(value), ttl)
+
+    def delete(self, namespace, key):
+        from .firestore_service import delete_session_record
+        delete_session_record(f"{namespace}:{key}")
+
+_BACKENDS = {
+    "memory": MemorySessionStore,
+    "redis": RedisSessionStore,
+    "firestore": FirestoreSessionStore,
+}
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_session_store() -> SessionStore:
+    """Process-wide store for SESSION_STORE_BACKEND, created on first use"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if SESSION_STORE_BACKEND not in _BACKENDS:
+                    raise Exception(f"Unknown SESSION_STORE_BACKEND '{SESSION_STORE_BACKEND}'")
+                _store = _BACKENDS[SESSION_STORE_BACKEND]()
+                print(f"[SESSIONS] Using {SESSION_STORE_BACKEND} session store")
+    return _store
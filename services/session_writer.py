@@ -0,0 +1,126 @@
+import copy
+import os
+import threading
+from typing import Dict
+from .cache import TTLCache
+from .firestore_service import save_welcome_session_updates
+from .session_store import SESSION_TTL_SECONDS
+
+# How often queued welcome session changes are written to Firestore
+SESSION_FLUSH_INTERVAL_SECONDS = float(os.getenv("SESSION_FLUSH_INTERVAL_SECONDS", "2"))
+# A session change that fails this many flushes in a row is dropped (e.g. a document over 1 MiB)
+SESSION_WRITE_MAX_ATTEMPTS = int(os.getenv("SESSION_WRITE_MAX_ATTEMPTS", "5"))
+
+# guest_id -> pending update; successive turns of one session merge into one entry
+_pending: Dict[str, Dict] = {}
+# guest_id -> number of chat_history messages already queued or written;
+# forgotten along with the session once it has been idle for the session TTL
+_queued_counts = TTLCache(100000, SESSION_TTL_SECONDS)
+_lock = threading.Lock()
+_wake = threading.Event()
+_stopped = threading.Event()
+_flusher = None
+_metrics = {"enqueued": 0, "flushes": 0, "sessions_written": 0, "messages_written": 0, "failures": 0, "dropped": 0}
+
+def _ensure_flusher():
+    global _flusher
+    if _flusher is None and not _stopped.is_set():
+        _flusher = threading.Thread(target=_run, name="session-writer", daemon=True)
+        _flusher.start()
+
+def _run():
+    while not _stopped.is_set():
+        _wake.wait(SESSION_FLUSH_INTERVAL_SECONDS)
+        _wake.clear()
+        flush()
+
+def mark_persisted(guest_id: str, message_count: int):
+    """Record that the first message_count messages are already stored (e.g. a session loaded from Firestore)"""
+    with _lock:
+        _queued_counts.set(guest_id, max(_queued_counts.get(guest_id, 0), message_count))
+
+def enqueue(session):
+    """Queue the session's current state for the next flush; never blocks on Firestore"""
+    # chat_history may hold only the tail of the conversation, starting at message history_offset
+    offset = getattr(session, "history_offset", 0)
+    with _lock:
+        already_queued = _queued_counts.get(session.guest_id, 0)
+        new_messages = copy.deepcopy(session.chat_history[max(already_queued - offset, 0):])
+        _queued_counts.set(session.guest_id, offset + len(session.chat_history))
+        update = _pending.setdefault(session.guest_id, {"guest_id": session.guest_id, "new_messages": []})
+        update["new_messages"].extend(new_messages)
+        update["session_name"] = session.session_name
+        update["collected_info"] = copy.deepcopy(session.collected_info)
+        update["current_step"] = session.current_step
+        _metrics["enqueued"] += 1
+    if _stopped.is_set():
+        # After shutdown there is no flusher left to pick the change up
+        flush()
+    else:
+        _ensure_flusher()
+
+def _requeue(update: Dict):
+    """Put a failed change back ahead of anything queued for its session meanwhile (call with _lock held)"""
+    update["attempts"] = update.get("attempts", 0) + 1
+    if update["attempts"] >= SESSION_WRITE_MAX_ATTEMPTS:
+        _metrics["dropped"] += 1
+        print(f"[SESSION_WRITER] Dropping change for {update['guest_id']} after {update['attempts']} failed writes")
+        return
+    newer = _pending.get(update["guest_id"])
+    if newer:
+        update["new_messages"].extend(newer["new_messages"])
+        newer["new_messages"] = update["new_messages"]
+        newer["attempts"] = update["attempts"]
+    else:
+        _pending[update["guest_id"]] = update
+
+def flush():
+    """Write every queued session change in one batch.
+
+    If the batch fails, each change is retried on its own so one bad change
+    can't hold back the rest; changes that keep failing are dropped after
+    SESSION_WRITE_MAX_ATTEMPTS flushes.
+    """
+    global _pending
+    with _lock:
+        if not _pending:
+            return
+        updates, _pending = _pending, {}
+
+    written = list(updates.values())
+    try:
+        save_welcome_session_updates(written)
+    except Exception as e:
+        print(f"[SESSION_WRITER] Flush of {len(updates)} sessions failed, writing them one by one: {e}")
+        written = []
+        for update in updates.values():
+            try:
+                save_welcome_session_updates([update])
+            except Exception as e:
+                print(f"[SESSION_WRITER] Write for {update['guest_id']} failed: {e}")
+                with _lock:
+                    _metrics["failures"] += 1
+                    _requeue(update)
+            else:
+                written.append(update)
+
+    with _lock:
+        _metrics["flushes"] += 1
+        _metrics["sessions_written"] += len(written)
+        _metrics["messages_written"] += sum(len(update["new_messages"]) for update in written)
+
+def forget_idle() -> int:
+    """Stop tracking sessions idle past the session TTL; returns how many were dropped"""
+    return len(_queued_counts.purge_expired())
+
+def stop():
+    """Stop the background flusher and write whatever is still queued"""
+    _stopped.set()
+    _wake.set()
+    if _flusher is not None:
+        _flusher.join(timeout=SESSION_FLUSH_INTERVAL_SECONDS + 5)
+    flush()
+
+def session_writer_stats() -> Dict:
+    with _lock:
+        return dict(_metrics, pending_sessions=len(_pending))
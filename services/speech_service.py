@@ -1,54 +1,145 @@
+from concurrent.futures import as_completed
+from google.api_core.exceptions import DeadlineExceeded
 from google.cloud import speech
+from .clients import get_speech_client
+from .audio_sniffer import sniff_audio
+from .cache import TTLCache
+from .deadlines import call_with_deadline
+from .executor import submit
 
-def transcribe_audio(audio_bytes):
-    client = speech.SpeechClient()
-    
+# Tried (concurrently) only when the upload's format can't be detected
+FALLBACK_FORMATS = [
+    ("WEBM_OPUS", 48000),
+    ("WEBM_OPUS", 16000),
+    ("ENCODING_UNSPECIFIED", None),
+]
+
+# Content types worth remembering a format for; anything else is client-controlled noise
+LEARNABLE_CONTENT_TYPES = {
+    "audio/webm", "video/webm", "audio/ogg", "audio/opus", "audio/wav", "audio/x-wav", "audio/wave",
+    "audio/flac", "audio/x-flac", "audio/mpeg", "audio/mp4", "audio/aac", "audio/3gpp", "audio/amr",
+    "application/octet-stream",
+}
+# Relearned after this long, in case a client changes what it records
+LEARNED_FORMAT_TTL_SECONDS = 3600
+
+# Client MIME type -> (encoding, sample rate) that last worked for it
+_learned_formats = TTLCache(len(LEARNABLE_CONTENT_TYPES), LEARNED_FORMAT_TTL_SECONDS)
+
+def _format_key(content_type):
+    """MIME type without parameters ("audio/webm;codecs=opus" -> "audio/webm"), None if not learnable"""
+    if not content_type:
+        return None
+    mime = content_type.split(";", 1)[0].strip().lower()
+    return mime if mime in LEARNABLE_CONTENT_TYPES else None
+
+def _recognition_config(encoding, sample_rate):
+    config = speech.RecognitionConfig(
+        encoding=speech.RecognitionConfig.AudioEncoding[encoding],
+        language_code="en-US",
+        enable_automatic_punctuation=True,
+    )
+    if sample_rate:
+        config.sample_rate_hertz = sample_rate
+    return config
+
+def _recognize(audio, audio_format):
+    """Transcript for one config: None if the config was rejected, "" if there was no speech"""
+    encoding, sample_rate = audio_format
+    config = _recognition_config(encoding, sample_rate)
+    try:
+        response = call_with_deadline(
+            "speech", lambda timeout: get_speech_client().recognize(config=config, audio=audio, timeout=timeout))
+    except DeadlineExceeded:
+        # Out of time, not a rejected config: trying other configs won't help
+        raise
+    except Exception as e:
+        print(f"[SPEECH] Config {encoding}/{sample_rate or 'auto'} failed: {str(e)}")
+        return None
+    print(f"[SPEECH] {encoding}/{sample_rate or 'auto'}: {len(response.results)} results")
+    if not response.results:
+        return ""
+    transcript = response.results[0].alternatives[0].transcript
+    confidence = response.results[0].alternatives[0].confidence
+    print(f"[SPEECH] Success: '{transcript}' (confidence: {confidence})")
+    return transcript
+
+def _race(audio, formats):
+    """Try formats concurrently; the first one that yields a transcript wins"""
+    futures = {submit("speech_fallback", _recognize, audio, audio_format): audio_format for audio_format in formats}
+    winner, transcript = None, ""
+    for future in as_completed(futures):
+        result = future.result()
+        if result:
+            winner, transcript = futures[future], result
+            break
+    for future in futures:
+        future.cancel()
+    return winner, transcript
+
+def transcribe_audio(audio_bytes, content_type=None):
     print(f"[SPEECH] Processing {len(audio_bytes)} bytes")
-    
+
     audio = speech.RecognitionAudio(content=audio_bytes)
-    
-    # Try multiple configurations for WebM
-    configs = [
-        # WebM Opus configuration
-        speech.RecognitionConfig(
-            encoding=speech.RecognitionConfig.AudioEncoding.WEBM_OPUS,
-            sample_rate_hertz=48000,
-            language_code="en-US",
-            enable_automatic_punctuation=True,
-        ),
-        # Alternative WebM configuration
-        speech.RecognitionConfig(
-            encoding=speech.RecognitionConfig.AudioEncoding.WEBM_OPUS,
-            sample_rate_hertz=16000,
-            language_code="en-US",
-            enable_automatic_punctuation=True,
-        ),
-        # Auto-detect encoding
-        speech.RecognitionConfig(
-            encoding=speech.RecognitionConfig.AudioEncoding.ENCODING_UNSPECIFIED,
-            language_code="en-US",
-            enable_automatic_punctuation=True,
-        )
-    ]
-    
-    for i, config in enumerate(configs):
-        try:
-            print(f"[SPEECH] Trying config {i+1}: {config.encoding.name}, sample_rate: {getattr(config, 'sample_rate_hertz', 'auto')}")
-            response = client.recognize(config=config, audio=audio)
-            
-            print(f"[SPEECH] Response received: {len(response.results)} results")
-            
-            if response.results:
-                transcript = response.results[0].alternatives[0].transcript
-                confidence = response.results[0].alternatives[0].confidence
-                print(f"[SPEECH] Success with config {i+1}: '{transcript}' (confidence: {confidence})")
+    format_key = _format_key(content_type)
+
+    # Pick the config from the container header instead of guessing
+    detected = sniff_audio(audio_bytes)
+    if detected:
+        print(f"[SPEECH] Detected {detected['container']}: {detected['encoding']} @ {detected['sample_rate']} Hz")
+        transcript = _recognize(audio, (detected["encoding"], detected["sample_rate"]))
+        if transcript is not None:
+            return transcript
+        candidates = list(FALLBACK_FORMATS)
+    else:
+        learned = _learned_formats.get(format_key) if format_key else None
+        if learned:
+            transcript = _recognize(audio, learned)
+            if transcript:
                 return transcript
-            else:
-                print(f"[SPEECH] Config {i+1}: No results")
-                
-        except Exception as e:
-            print(f"[SPEECH] Config {i+1} failed: {str(e)}")
-            continue
-    
+        candidates = [audio_format for audio_format in FALLBACK_FORMATS if audio_format != learned]
+
+    winner, transcript = _race(audio, candidates)
+    if winner:
+        if format_key:
+            _learned_formats.set(format_key, winner)
+        return transcript
+
     print(f"[SPEECH] All configurations failed")
-    return ""
\ No newline at end of file
+    return ""
+
+def stream_transcribe(audio_chunks, interim_results=True):
+    """Transcribe audio while it is still arriving.
+
+    audio_chunks is a (blocking) iterator of byte frames; the encoding is
+    sniffed from the first frame, which carries the container header. Yields
+    {"transcript", "is_final", "stability"} dicts as results come back.
+    """
+    chunks = iter(audio_chunks)
+    first_chunk = next(chunks, b"")
+    if not first_chunk:
+        return
+
+    detected = sniff_audio(first_chunk)
+    encoding, sample_rate = (detected["encoding"], detected["sample_rate"]) if detected else FALLBACK_FORMATS[0]
+    print(f"[SPEECH] Streaming recognition: {encoding} @ {sample_rate or 'auto'} Hz")
+    streaming_config = speech.StreamingRecognitionConfig(
+        config=_recognition_config(encoding, sample_rate),
+        interim_results=interim_results,
+    )
+
+    def requests():
+        yield speech.StreamingRecognizeRequest(audio_content=first_chunk)
+        for chunk in chunks:
+            yield speech.StreamingRecognizeRequest(audio_content=chunk)
+
+    responses = get_speech_client().streaming_recognize(config=streaming_config, requests=requests())
+    for response in responses:
+        for result in response.results:
+            if not result.alternatives:
+                continue
+            yield {
+                "transcript": result.alternatives[0].transcript,
+                "is_final": result.is_final,
+                "stability": result.stability,
+            }
@@ -1,26 +1,310 @@
 from google.cloud import texttospeech
+import io
 import os
+import re
+import struct
+import wave
+from collections import deque
+from .clients import get_tts_client
+from .audio_cache import AudioCache, make_key
+from .deadlines import call_with_deadline
+from .executor import submit
+
+VOICE_LANGUAGE = "en-US"
+VOICE_GENDER = texttospeech.SsmlVoiceGender.NEUTRAL
+
+# Output format -> (TTS encoding, media type, accepted aliases)
+AUDIO_FORMATS = {
+    "wav": (texttospeech.AudioEncoding.LINEAR16, "audio/wav", ("audio/x-wav", "audio/wave")),
+    "mp3": (texttospeech.AudioEncoding.MP3, "audio/mpeg", ("audio/mp3",)),
+    "ogg": (texttospeech.AudioEncoding.OGG_OPUS, "audio/ogg", ("audio/opus",)),
+}
+DEFAULT_AUDIO_FORMAT = os.getenv("TTS_AUDIO_FORMAT", "wav").lower()
+
+# The synthesize API rejects inputs over 5000 bytes; keep a margin
+TTS_MAX_CHUNK_BYTES = int(os.getenv("TTS_MAX_CHUNK_BYTES", "4500"))
+# Keep the first chunk short so it is ready to play quickly
+TTS_FIRST_CHUNK_BYTES = int(os.getenv("TTS_FIRST_CHUNK_BYTES", "300"))
+# Chunks of one text synthesized at the same time
+TTS_CHUNK_FANOUT = int(os.getenv("TTS_CHUNK_FANOUT", "4"))
+
+# Read size when replaying a cached file into a stream
+STREAM_READ_BYTES = 64 * 1024
+
+_SENTENCE_END = re.compile(r"(?<=[.!?;:])\s+")
+
+# Shared by every request in this process
+audio_cache = AudioCache()
+
+def resolve_audio_format(audio_format=None) -> str:
+    """Validate a requested format name, falling back to the deployment default"""
+    audio_format = (audio_format or DEFAULT_AUDIO_FORMAT).lower()
+    if audio_format not in AUDIO_FORMATS:
+        raise ValueError(f"Unsupported audio format: {audio_format}")
+    return audio_format
+
+def media_type_for(path) -> str:
+    """Media type for an audio file based on its extension"""
+    extension = os.path.splitext(path)[1].lstrip(".").lower()
+    if extension in AUDIO_FORMATS:
+        return AUDIO_FORMATS[extension][1]
+    return "application/octet-stream"
+
+def _accept_ranges(accept_header):
+    """(media range, quality) pairs of an Accept header; a malformed q counts as 0"""
+    ranges = []
+    for part in accept_header.split(","):
+        media, *params = [item.strip().lower() for item in part.split(";")]
+        if not media:
+            continue
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        ranges.append((media, quality))
+    return ranges
+
+def accepts_audio_ranges(accept_header) -> bool:
+    """Whether an Accept header says anything about audio (an audio type, audio/* or */*)"""
+    return any(media.startswith("audio/") or media == "*/*" for media, _ in _accept_ranges(accept_header or ""))
+
+def negotiate_audio_format(accept_header, available=None):
+    """Pick the best format for an Accept header, or None if nothing acceptable is available.
+
+    Each format takes the quality of the most specific range that matches it;
+    q=0 means not acceptable. Ties go to the more specific match, then to the
+    deployment default.
+    """
+    available = [fmt for fmt in (available or AUDIO_FORMATS) if fmt in AUDIO_FORMATS]
+    if not available:
+        return None
+    # Prefer the deployment default when the client doesn't care
+    if DEFAULT_AUDIO_FORMAT in available:
+        available.remove(DEFAULT_AUDIO_FORMAT)
+        available.insert(0, DEFAULT_AUDIO_FORMAT)
+    if not accept_header:
+        return available[0]
+
+    ranges = _accept_ranges(accept_header)
+    best, best_rank = None, None
+    for index, fmt in enumerate(available):
+        _, media_type, aliases = AUDIO_FORMATS[fmt]
+        match = None  # (specificity, quality) of the most specific matching range
+        for media, quality in ranges:
+            if media == media_type or media in aliases:
+                specificity = 2
+            elif media == "audio/*":
+                specificity = 1
+            elif media == "*/*":
+                specificity = 0
+            else:
+                continue
+            if match is None or (specificity, quality) > match:
+                match = (specificity, quality)
+        if match is None or match[1] <= 0:
+            continue
+        rank = (match[1], match[0], -index)
+        if best_rank is None or rank > best_rank:
+            best, best_rank = fmt, rank
+    return best
+
+def _synthesize(text, audio_format):
+    client = get_tts_client()
 
-def generate_audio(text):
-    client = texttospeech.TextToSpeechClient()
-    
     synthesis_input = texttospeech.SynthesisInput(text=text)
     voice = texttospeech.VoiceSelectionParams(
-        language_code="en-US",
-        ssml_gender=texttospeech.SsmlVoiceGender.NEUTRAL
+        language_code=VOICE_LANGUAGE,
+        ssml_gender=VOICE_GENDER
     )
     audio_config = texttospeech.AudioConfig(
-        audio_encoding=texttospeech.AudioEncoding.LINEAR16
+        audio_encoding=AUDIO_FORMATS[audio_format][0]
     )
-    
-    response = client.synthesize_speech(
-        input=synthesis_input, voice=voice, audio_config=audio_config
+
+    response = call_with_deadline("tts", lambda timeout: client.synthesize_speech(
+        input=synthesis_input, voice=voice, audio_config=audio_config, timeout=timeout
+    ))
+    return response.audio_content
+
+def _utf8_len(text):
+    return len(text.encode("utf-8"))
+
+def split_text(text, max_bytes=None, first_chunk_bytes=None):
+    """Split text at sentence boundaries into chunks the TTS API accepts"""
+    max_bytes = max_bytes or TTS_MAX_CHUNK_BYTES
+    first_chunk_bytes = first_chunk_bytes or TTS_FIRST_CHUNK_BYTES
+    pieces = []
+    for sentence in _SENTENCE_END.split(text.strip()):
+        if _utf8_len(sentence) <= max_bytes:
+            pieces.append(sentence)
+            continue
+        # A single run-on "sentence" over the limit: fall back to word boundaries
+        current = ""
+        for word in sentence.split():
+            candidate = f"{current} {word}" if current else word
+            if current and _utf8_len(candidate) > max_bytes:
+                pieces.append(current)
+                current = word
+            else:
+                current = candidate
+        if current:
+            pieces.append(current)
+
+    chunks = []
+    current = ""
+    for piece in pieces:
+        limit = first_chunk_bytes if not chunks else max_bytes
+        candidate = f"{current} {piece}" if current else piece
+        if current and _utf8_len(candidate) > limit:
+            chunks.append(current)
+            current = piece
+        else:
+            current = candidate
+    if current:
+        chunks.append(current)
+    return chunks
+
+def split_complete_sentences(buffer):
+    """Split streamed text into finished sentences and the unfinished remainder"""
+    parts = _SENTENCE_END.split(buffer)
+    sentences = [part.strip() for part in parts[:-1] if part.strip()]
+    return sentences, parts[-1]
+
+def synthesize_async(text, audio_format=None):
+    """Start synthesizing text on the chunk pool; returns a Future of the audio bytes"""
+    return submit("tts_chunks", _synthesize, text, resolve_audio_format(audio_format))
+
+def iter_synthesized_chunks(chunks, audio_format):
+    """Synthesize chunks with a bounded fan-out, yielding their audio in order"""
+    remaining = iter(chunks)
+    in_flight = deque()
+    for chunk in remaining:
+        in_flight.append(submit("tts_chunks", _synthesize, chunk, audio_format))
+        if len(in_flight) >= TTS_CHUNK_FANOUT:
+            break
+    while in_flight:
+        data = in_flight.popleft().result()
+        next_chunk = next(remaining, None)
+        if next_chunk is not None:
+            in_flight.append(submit("tts_chunks", _synthesize, next_chunk, audio_format))
+        yield data
+
+def stitch_audio(parts, audio_format):
+    """Join separately synthesized chunks into one file without re-encoding.
+
+    WAV chunks become one file with a single header. MP3 and Ogg chunks are
+    concatenated as they are: MP3 frames play back to back, but Ogg Opus
+    becomes a chained stream, which some players stop after the first link
+    or seek badly in. There is no encoder here to do better, so prefer WAV
+    (or MP3) where long chunked lessons must play everywhere.
+    """
+    if not parts:
+        raise ValueError("No audio to stitch")
+    if audio_format != "wav":
+        return b"".join(parts)
+    output = io.BytesIO()
+    with wave.open(output, "wb") as out:
+        for i, part in enumerate(parts):
+            with wave.open(io.BytesIO(part), "rb") as chunk:
+                if i == 0:
+                    out.setparams(chunk.getparams())
+                out.writeframes(chunk.readframes(chunk.getnframes()))
+    return output.getvalue()
+
+def _cache_key(text):
+    return make_key(VOICE_LANGUAGE, VOICE_GENDER.name, text)
+
+def store_audio(text, parts, audio_format=None):
+    """Cache separately synthesized parts of text as the audio for the whole text"""
+    audio_format = resolve_audio_format(audio_format)
+    return audio_cache.put(_cache_key(text), audio_format, stitch_audio(parts, audio_format))
+
+def audio_path_for(text, audio_format=None):
+    """Path generate_audio will produce for text, known before synthesis finishes"""
+    audio_format = resolve_audio_format(audio_format)
+    return audio_cache.path_for(audio_cache.filename_for(_cache_key(text), audio_format))
+
+def generate_audio(text, audio_format=None, chunked=False, on_first_chunk=None):
+    """Synthesize text to an audio file, reusing the cached file for identical requests.
+
+    Variants of the same text share a digest and differ only by extension, so
+    tts_<digest>.wav and tts_<digest>.ogg are the same utterance. In chunked mode
+    (always used for text over the API limit) the text is split at sentence
+    boundaries and synthesized in parallel; on_first_chunk receives the path of
+    the first chunk's own file as soon as it can be played.
+    """
+    audio_format = resolve_audio_format(audio_format)
+    if not text or not text.strip():
+        raise ValueError("No text to synthesize")
+    chunks = split_text(text) if chunked or _utf8_len(text) > TTS_MAX_CHUNK_BYTES else [text]
+    first_chunk_sent = False
+
+    def produce():
+        nonlocal first_chunk_sent
+        if len(chunks) == 1:
+            return _synthesize(text, audio_format)
+        parts = []
+        for data in iter_synthesized_chunks(chunks, audio_format):
+            if not parts and on_first_chunk:
+                on_first_chunk(audio_cache.put(_cache_key(chunks[0]), audio_format, data))
+                first_chunk_sent = True
+            parts.append(data)
+        return stitch_audio(parts, audio_format)
+
+    audio_path = audio_cache.get_or_create(_cache_key(text), audio_format, produce)
+    if on_first_chunk and not first_chunk_sent:
+        # Single chunk or cache hit: the whole file is the first chunk
+        on_first_chunk(audio_path)
+    return audio_path
+
+def _wav_stream_header(params):
+    """WAV header with unknown lengths, for audio whose size isn't known up front"""
+    byte_rate = params.framerate * params.nchannels * params.sampwidth
+    block_align = params.nchannels * params.sampwidth
+    return (
+        b"RIFF" + struct.pack("<I", 0xFFFFFFFF) + b"WAVE"
+        + b"fmt " + struct.pack("<IHHIIHH", 16, 1, params.nchannels, params.framerate,
+                                byte_rate, block_align, params.sampwidth * 8)
+        + b"data" + struct.pack("<I", 0xFFFFFFFF)
     )
-    
-    os.makedirs("audio", exist_ok=True)
-    audio_path = f"audio/lesson_{hash(text) % 10000}.wav"
-    
-    with open(audio_path, "wb") as out:
-        out.write(response.audio_content)
-    
-    return audio_path
\ No newline at end of file
+
+def stream_audio(text, audio_format=None):
+    """Yield audio for text as each chunk is synthesized, then store the whole file in the cache.
+
+    Replays of the same text are served from the cached file, and concurrent
+    streams of the same text share one synthesis. WAV output is sent as one
+    header followed by raw frames so the stream is a single playable file.
+    """
+    audio_format = resolve_audio_format(audio_format)
+    if not text or not text.strip():
+        raise ValueError("No text to synthesize")
+
+    def produce():
+        parts = []
+        for data in iter_synthesized_chunks(split_text(text), audio_format):
+            if audio_format == "wav":
+                with wave.open(io.BytesIO(data), "rb") as chunk:
+                    if not parts:
+                        yield _wav_stream_header(chunk.getparams())
+                    frames = chunk.readframes(chunk.getnframes())
+                yield frames
+            else:
+                yield data
+            parts.append(data)
+        return stitch_audio(parts, audio_format)
+
+    yield from audio_cache.stream(_cache_key(text), audio_format, produce, STREAM_READ_BYTES)
+
+def pending_audio(path):
+    """Future for an audio file still being synthesized, or None"""
+    return audio_cache.pending(os.path.basename(path))
+
+def find_audio_variant(path, audio_format):
+    """Path of an already synthesized variant of the same utterance, if it exists"""
+    variant = f"{os.path.splitext(path)[0]}.{audio_format}"
+    return variant if os.path.exists(variant) else None
+
+def tts_cache_stats():
+    return audio_cache.stats()
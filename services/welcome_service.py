@@ -1,15 +1,70 @@
 from typing import Dict, List, Optional
+import os
 import uuid
+from collections import deque
 from datetime import datetime
-from .firestore_service import db, save_welcome_session as save_session_to_db
-from .gemini_service import generate_roadmap, get_gemini_response
-from .tts_service import generate_audio
+from . import session_writer
+from .firestore_service import get_welcome_session_from_db
+from .session_store import get_session_store
+from .audio_storage import audio_url_for
+from .chat_context import ChatWindow
+from . import prompt_pool
+
+# Namespace of welcome sessions in the shared session store
+NAMESPACE = "welcome"
+# One JSON model call per turn for the reply, extracted fields and summary
+WELCOME_STRUCTURED_TURNS = os.getenv("WELCOME_STRUCTURED_TURNS", "true").lower() == "true"
+
+# Static part of every turn, sent as the model's system instruction instead of
+# being repeated in each prompt
+WELCOME_SYSTEM_INSTRUCTION = """
+You are a learning assistant for blind users. You need to collect:
+1. Topic they want to learn
+2. Number of days (7-30)
+3. Experience level
+4. Final confirmation
+
+Instructions:
+- This is for a blind user - always end with "Press Enter to record your response."
+- Don't repeat questions you already asked
+- Move to next step based on what you've collected
+- If you have topic, days, and experience, ask if they want to add anything else
+- Keep responses under 50 words
+- Be conversational and encouraging
+- Respond naturally based on the conversation flow
+"""
+
+WELCOME_STRUCTURED_INSTRUCTION = WELCOME_SYSTEM_INSTRUCTION + """
+Answer in JSON:
+- reply: your response to the user
+- topic, days (7-30), experience_level: what the user has told you so far, or null if not given
+- summary: as instructed in the message
+"""
+
+WELCOME_TURN_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "reply": {"type": "string"},
+        "topic": {"type": "string", "nullable": True},
+        "days": {"type": "integer", "nullable": True},
+        "experience_level": {"type": "string", "nullable": True},
+        "summary": {"type": "string", "nullable": True},
+    },
+    "required": ["reply"],
+}
+from .gemini_service import (
+    generate_roadmap, get_gemini_response, stream_gemini_response, get_structured_response,
+    FALLBACK_REPLIES, UNCLEAR_REPLY
+)
+from .tts_service import generate_audio, synthesize_async, split_complete_sentences, store_audio
 
 class WelcomeSession:
     def __init__(self, guest_id: str):
         self.guest_id = guest_id
         self.session_name = "welcome_session"
         self.chat_history = []
+        # Earlier messages not loaded into chat_history (they are in the database)
+        self.history_offset = 0
         self.collected_info = {
             "topic": None,
             "days": None,
@@ -19,6 +74,16 @@ class WelcomeSession:
             "confirmation_asked": False
         }
         self.current_step = "topic"
+        # Learning summary and the (topic, days, experience_level) it was written for
+        self.learning_summary = None
+        self.summary_key = None
+        # Token-budgeted tail of chat_history for prompts, built on first use
+        self._chat_window = None
+
+    @property
+    def message_count(self) -> int:
+        """Messages in the whole conversation, including ones not loaded"""
+        return self.history_offset + len(self.chat_history)
 
     def add_message(self, role: str, content: str, audio_url: str = None):
         message = {
@@ -28,22 +93,64 @@ class WelcomeSession:
             "audio_url": audio_url
         }
         self.chat_history.append(message)
+        if self._chat_window is not None:
+            self._chat_window.append(message)
 
-    def process_user_input(self, user_input: str) -> Dict:
-        """Process user input using Gemini AI for all responses"""
-        from .gemini_service import get_gemini_response
-        
-        # First, extract information from user input
-        self._extract_info_from_user_input(user_input)
-        
-        # Create comprehensive context with chat history for Gemini
-        context = f"""
-You are a learning assistant for blind users. You need to collect:
-1. Topic they want to learn
-2. Number of days (7-30)
-3. Experience level
-4. Final confirmation
+    def to_dict(self) -> Dict:
+        """Compact form for the session store: short keys, empty audio URLs left out.
 
+        Only the messages the prompt window uses are kept, so the record stays the
+        same size however long the conversation gets; the write-behind writer
+        stores the full history in the database.
+        """
+        if self._chat_window is None:
+            self._chat_window = ChatWindow.from_history(self.chat_history)
+        tail = self.chat_history[len(self.chat_history) - len(self._chat_window):]
+        history = []
+        for msg in tail:
+            compact = {"r": msg["role"], "c": msg["content"], "t": msg["timestamp"]}
+            if msg.get("audio_url"):
+                compact["a"] = msg["audio_url"]
+            history.append(compact)
+        data = {
+            "g": self.guest_id,
+            "n": self.session_name,
+            "h": history,
+            "o": self.message_count - len(tail),
+            "i": self.collected_info,
+            "s": self.current_step,
+        }
+        if self.summary_key is not None:
+            data["l"] = self.learning_summary
+            data["lk"] = self.summary_key
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "WelcomeSession":
+        """Inverse of to_dict; also accepts the full-field documents saved to Firestore"""
+        if "guest_id" in data:
+            session = cls(data["guest_id"])
+            session.session_name = data.get("session_name", session.session_name)
+            session.chat_history = list(data.get("chat_history", []))
+            session.collected_info.update(data.get("collected_info") or {})
+            session.current_step = data.get("current_step", session.current_step)
+            return session
+        session = cls(data["g"])
+        session.session_name = data["n"]
+        session.chat_history = [
+            {"role": msg["r"], "content": msg["c"], "timestamp": msg["t"], "audio_url": msg.get("a")}
+            for msg in data["h"]
+        ]
+        session.history_offset = data.get("o", 0)
+        session.collected_info.update(data["i"])
+        session.current_step = data["s"]
+        session.learning_summary = data.get("l")
+        session.summary_key = data.get("lk")
+        return session
+
+    def _build_turn_prompt(self, user_input: str) -> str:
+        """Per-turn context for Gemini; the static instructions are in WELCOME_SYSTEM_INSTRUCTION"""
+        return f"""
 Current progress:
 - Topic: {self.collected_info.get('topic', 'Not collected')}
 - Days: {self.collected_info.get('days', 'Not collected')}
@@ -55,64 +162,157 @@ Conversation history:
 {self._get_chat_context()}
 
 User just said: "{user_input}"
+"""
 
-Instructions:
-- This is for a blind user - always end with "Press Enter to record your response."
-- Don't repeat questions you already asked
-- Move to next step based on what you've collected
-- If you have topic, days, and experience, ask if they want to add anything else
-- Keep responses under 50 words
-- Be conversational and encouraging
+    def _build_structured_turn_prompt(self, user_input: str) -> str:
+        """_build_turn_prompt for a JSON answer that also carries the extracted fields and summary"""
+        if self._summary_key() == self.summary_key:
+            summary_instruction = "Summary: null (already written)"
+        else:
+            summary_instruction = (
+                "Summary: once topic, days and experience level are all known (including from this message), "
+                "a professional 2-3 sentence summary under 50 words of what the user wants to learn; otherwise null"
+            )
+        return self._build_turn_prompt(user_input) + f"{summary_instruction}\n"
 
-Just respond naturally to their confirmation.
+    def _merge_extracted(self, turn: Dict):
+        """Fill fields the keyword extraction missed with what the model picked up"""
+        if not self.collected_info.get("topic") and turn.get("topic"):
+            self.collected_info["topic"] = turn["topic"].strip()
+        days = turn.get("days")
+        if not self.collected_info.get("days") and isinstance(days, int) and 7 <= days <= 30:
+            self.collected_info["days"] = days
+        if not self.collected_info.get("experience_level") and turn.get("experience_level"):
+            self.collected_info["experience_level"] = turn["experience_level"].strip()
+        if all(self.collected_info.get(field) for field in ("topic", "days", "experience_level")):
+            self.collected_info["info_complete"] = True
 
-Respond naturally based on the conversation flow:
-"""
-        
-        # Get response from Gemini
-        response_text = get_gemini_response(context)
-        
+    def _summary_key(self) -> List:
+        return [self.collected_info.get(field) for field in ("topic", "days", "experience_level")]
+
+    def _memoized_summary(self, generated: str = None) -> str:
+        """Learning summary, regenerated only when the collected fields change"""
+        key = self._summary_key()
+        if self.summary_key != key:
+            self.learning_summary = generated or self._generate_learning_summary()
+            self.summary_key = key
+        return self.learning_summary
+
+    def _finish_turn(self, user_input: str, response_text: str, audio_url: str, summary: str = None) -> Dict:
+        """Record the exchange and build the turn result"""
         # Simple logic: if info is complete and confirmation was asked, set ready to generate
         if self.collected_info.get('info_complete') and self.collected_info.get('confirmation_asked'):
             self.collected_info['ready_to_generate'] = True
 
+        # Add messages to chat history
+        self.add_message("user", user_input)
+        self.add_message("assistant", response_text, audio_url)
+        
+        # Summary once info is complete (even if not ready to generate yet)
+        if self.collected_info["info_complete"] or self.collected_info["ready_to_generate"]:
+            summary = self._memoized_summary(summary)
+        else:
+            summary = None
+        
+        return {
+            "response": response_text,
+            "audio_url": audio_url,
+            "ready_to_generate": self.collected_info["ready_to_generate"],
+            "learning_summary": summary,
+            "collected_info": self.collected_info,
+            "current_step": self.current_step
+        }
+
+    def _fallback_turn(self, audio_format: str = None) -> Dict:
+        pooled = prompt_pool.pick("fallback", audio_format)
+        if pooled:
+            response_text, audio_path = pooled["text"], pooled["audio_path"]
+        else:
+            response_text = UNCLEAR_REPLY
+            audio_path = generate_audio(response_text, audio_format)
+        audio_url = audio_url_for(audio_path)
+        
+        return {
+            "response": response_text,
+            "audio_url": audio_url,
+            "ready_to_generate": False,
+            "learning_summary": None,
+            "collected_info": self.collected_info,
+            "current_step": self.current_step
+        }
+
+    def process_user_input(self, user_input: str) -> Dict:
+        """Process user input using Gemini AI for all responses"""
+        # First, extract information from user input
+        self._extract_info_from_user_input(user_input)
+        
+        # Get response (and, in structured mode, fields and summary) from Gemini
+        turn = None
+        if WELCOME_STRUCTURED_TURNS:
+            turn = get_structured_response(
+                self._build_structured_turn_prompt(user_input), WELCOME_TURN_SCHEMA,
+                WELCOME_STRUCTURED_INSTRUCTION, kind="welcome_turn"
+            )
+        if turn and turn.get("reply"):
+            self._merge_extracted(turn)
+            response_text = turn["reply"].strip()
+            summary = turn.get("summary")
+        else:
+            response_text = get_gemini_response(
+                self._build_turn_prompt(user_input), WELCOME_SYSTEM_INSTRUCTION, kind="welcome_turn")
+            summary = None
+
         try:
             # Generate audio for response
             audio_path = generate_audio(response_text)
-            audio_url = f"/audio/{audio_path.split('/')[-1]}"
-            
-            # Add messages to chat history
-            self.add_message("user", user_input)
-            self.add_message("assistant", response_text, audio_url)
-            
-            # Generate summary if info is complete (even if not ready to generate yet)
-            summary = None
-            if self.collected_info["info_complete"] or self.collected_info["ready_to_generate"]:
-                summary = self._generate_learning_summary()
-            
-            return {
-                "response": response_text,
-                "audio_url": audio_url,
-                "ready_to_generate": self.collected_info["ready_to_generate"],
-                "learning_summary": summary,
-                "collected_info": self.collected_info,
-                "current_step": self.current_step
-            }
+            audio_url = audio_url_for(audio_path)
+            return self._finish_turn(user_input, response_text, audio_url, summary)
         except Exception as e:
             print(f"Error in process_user_input: {e}")
             # Fallback response
-            response_text = "I'm having trouble understanding. Could you please repeat that?"
-            audio_path = generate_audio(response_text)
-            audio_url = f"/audio/{audio_path.split('/')[-1]}"
-            
-            return {
-                "response": response_text,
-                "audio_url": audio_url,
-                "ready_to_generate": False,
-                "learning_summary": None,
-                "collected_info": self.collected_info,
-                "current_step": self.current_step
-            }
+            return self._fallback_turn()
+
+    def process_user_input_stream(self, user_input: str, audio_format: str = None):
+        """Streaming variant of process_user_input for voice conversations.
+
+        Gemini's reply is consumed token by token; each sentence is sent to TTS
+        as soon as it is complete, overlapping synthesis with generation. Yields
+        ("sentence", text, audio_bytes) in order as audio becomes ready, then
+        ("result", result) with the same shape process_user_input returns.
+        """
+        self._extract_info_from_user_input(user_input)
+        prompt = self._build_turn_prompt(user_input)
+
+        try:
+            pending = deque()
+            parts = []
+            response_text = ""
+            buffer = ""
+            for piece in stream_gemini_response(prompt, WELCOME_SYSTEM_INSTRUCTION, kind="welcome_turn"):
+                response_text += piece
+                sentences, buffer = split_complete_sentences(buffer + piece)
+                for sentence in sentences:
+                    pending.append((sentence, synthesize_async(sentence, audio_format)))
+                # Hand over every sentence whose audio is ready, without waiting
+                while pending and pending[0][1].done():
+                    sentence, future = pending.popleft()
+                    parts.append(future.result())
+                    yield "sentence", sentence, parts[-1]
+            if buffer.strip():
+                pending.append((buffer.strip(), synthesize_async(buffer.strip(), audio_format)))
+            while pending:
+                sentence, future = pending.popleft()
+                parts.append(future.result())
+                yield "sentence", sentence, parts[-1]
+
+            response_text = response_text.strip()
+            # The stitched sentences double as the cached audio for the whole reply
+            audio_path = store_audio(response_text, parts, audio_format)
+            audio_url = audio_url_for(audio_path)
+            yield "result", self._finish_turn(user_input, response_text, audio_url)
+        except Exception as e:
+            print(f"Error in process_user_input_stream: {e}")
+            yield "result", self._fallback_turn(audio_format)
     
     def _extract_info_from_user_input(self, user_input: str):
         """Extract information from user input and update state"""
@@ -166,86 +366,68 @@ Make it sound professional and clear. Keep it under 50 words.
 """
         
         try:
-            return get_gemini_response(context)
+            return get_gemini_response(context, kind="welcome_summary")
         except:
             return f"Learn {self.collected_info['topic']} in {self.collected_info['days']} days with {self.collected_info['experience_level']} level experience."
     
     def _get_chat_context(self) -> str:
-        """Get recent chat history for context"""
+        """Get recent chat history for context, as much as fits the token budget"""
         if not self.chat_history:
             return "No previous conversation"
         
-        recent_messages = self.chat_history[-6:] if len(self.chat_history) > 6 else self.chat_history
-        context = ""
-        for msg in recent_messages:
-            # Clean the content to remove "Press Enter" instructions for context
-            clean_content = msg['content'].replace("Press Enter to record your response.", "").strip()
-            context += f"{msg['role']}: {clean_content}\n"
-        return context
+        if self._chat_window is None:
+            self._chat_window = ChatWindow.from_history(self.chat_history)
+        return self._chat_window.render()
     
 
 
-# In-memory session storage
-welcome_sessions: Dict[str, WelcomeSession] = {}
-
 def create_welcome_session():
-    """Create a new welcome session with Gemini-generated welcome message"""
-    from .gemini_service import get_gemini_response
-    from .tts_service import generate_audio
-    
+    """Create a new welcome session with a pre-rendered (or, until the pool is built, fresh) greeting"""
     guest_id = str(uuid.uuid4())
     session = WelcomeSession(guest_id)
     
-    # Get welcome message from Gemini
-    welcome_prompt = """
-You are a friendly learning assistant for Vision Path designed for blind users. A new user just arrived. 
-Greet them warmly and ask what they would like to learn today. 
-Mention that they should press Enter to start recording their response after you finish speaking.
-Be enthusiastic and encouraging. Keep it under 40 words.
-Don't mention days or experience level yet - just focus on what they want to learn.
-"""
-    
-    welcome_message = get_gemini_response(welcome_prompt)
-    
-    # Generate audio for welcome message
-    audio_path = generate_audio(welcome_message)
-    audio_url = f"/audio/{audio_path.split('/')[-1]}"
+    pooled = prompt_pool.pick("greeting")
+    if pooled:
+        welcome_message, audio_path = pooled["text"], pooled["audio_path"]
+    else:
+        # Get welcome message from Gemini
+        welcome_message = get_gemini_response(prompt_pool.GREETING_PROMPT)
+        
+        # Generate audio for welcome message
+        audio_path = generate_audio(welcome_message)
+        if welcome_message not in FALLBACK_REPLIES:
+            prompt_pool.add("greeting", welcome_message, audio_path)
+    audio_url = audio_url_for(audio_path)
     
     # Add welcome message to chat history
     session.add_message("assistant", welcome_message, audio_url)
     
-    welcome_sessions[guest_id] = session
-    
-    # Save to database (optional)
-    try:
-        save_session_to_db(
-            guest_id,
-            session.session_name,
-            session.chat_history,
-            session.collected_info,
-            session.current_step
-        )
-    except Exception as e:
-        print(f"[WARNING] Database save failed, continuing with in-memory storage: {e}")
+    save_welcome_session(session)
     
     return guest_id, welcome_message, audio_url
 
 def get_welcome_session(guest_id: str) -> Optional[WelcomeSession]:
-    """Get existing welcome session"""
-    return welcome_sessions.get(guest_id)
+    """Get existing welcome session from the session store, falling back to Firestore"""
+    store = get_session_store()
+    data = store.get(NAMESPACE, guest_id)
+    if data is not None:
+        session = WelcomeSession.from_dict(data)
+    else:
+        # Expired from the store, or created before a restart: rehydrate from the database
+        data = get_welcome_session_from_db(guest_id)
+        if data is None:
+            return None
+        print(f"[WELCOME] Rehydrated session from database for guest: {guest_id}")
+        session = WelcomeSession.from_dict(data)
+        store.set(NAMESPACE, guest_id, session.to_dict())
+    # Whatever was loaded is already (or about to be) written by whoever stored it
+    session_writer.mark_persisted(guest_id, session.message_count)
+    return session
 
 def save_welcome_session(session: WelcomeSession):
-    """Save session to database"""
-    try:
-        save_session_to_db(
-            session.guest_id,
-            session.session_name,
-            session.chat_history,
-            session.collected_info,
-            session.current_step
-        )
-    except Exception as e:
-        print(f"[WARNING] Database save failed, continuing with in-memory storage: {e}")
+    """Store the session for other requests and queue it for the background database writer"""
+    get_session_store().set(NAMESPACE, session.guest_id, session.to_dict())
+    session_writer.enqueue(session)
 
 def process_welcome_input(guest_id: str, user_input: str) -> Dict:
     """Process user input in welcome session"""
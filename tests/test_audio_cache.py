@@ -0,0 +1,224 @@
+import os
+import threading
+import time
+
+import pytest
+
+from services import janitor, session_service
+from services.audio_cache import AudioCache
+from services.session_store import MemorySessionStore
+
+def fill(cache, *names, size=100):
+    return [cache.put(name, "wav", b"x" * size) for name in names]
+
+@pytest.fixture
+def cache(tmp_path):
+    return AudioCache(directory=str(tmp_path), max_bytes=1000, max_age_seconds=3600)
+
+def test_lru_eviction_skips_pinned_files(cache):
+    a, b, c = fill(cache, "a", "b", "c")
+    cache.pin(a, "s1", 60)
+    cache.evict(max_bytes=200)
+    assert os.path.exists(a)
+    assert not os.path.exists(b)
+    assert os.path.exists(c)
+    assert cache.stats()["pinned_evictions"] == 0
+
+def test_budget_is_hard_even_for_pinned_files(cache):
+    a, b, c = fill(cache, "a", "b", "c")
+    for path in (a, b, c):
+        cache.pin(path, "s1", 60)
+    cache.evict(max_bytes=150)
+    # Least recently used pinned files go first
+    assert not os.path.exists(a) and not os.path.exists(b)
+    assert os.path.exists(c)
+    stats = cache.stats()
+    assert stats["bytes"] == 100
+    assert stats["pinned"] == 1
+    assert stats["pinned_evictions"] == 2
+
+def test_expired_pins_are_forgotten(cache):
+    (a,) = fill(cache, "a")
+    cache.pin(a, "s1", -1)
+    cache.evict(max_bytes=0)
+    assert not os.path.exists(a)
+    assert cache.stats()["pinned_evictions"] == 0
+
+def test_unpin_releases_only_that_owner(cache):
+    (a,) = fill(cache, "a")
+    cache.pin(a, "s1", 60)
+    cache.pin(a, "s2", 60)
+    cache.unpin(a, "s1")
+    assert cache.stats()["pinned"] == 1
+    cache.unpin(a, "s2")
+    assert cache.stats()["pinned"] == 0
+
+def test_startup_skips_partial_writes_and_removes_stale_ones(tmp_path):
+    (tmp_path / "tts_done.wav").write_bytes(b"x" * 10)
+    stale = tmp_path / "tts_stale.wav.1.2.tmp"
+    stale.write_bytes(b"x" * 10)
+    old = time.time() - 3600
+    os.utime(stale, (old, old))
+    fresh = tmp_path / "tts_fresh.wav.1.3.tmp"
+    fresh.write_bytes(b"x" * 10)
+
+    cache = AudioCache(directory=str(tmp_path), max_bytes=1000, max_age_seconds=3600)
+    assert cache.tracks("tts_done.wav")
+    assert not cache.tracks(fresh.name)
+    assert cache.stats()["bytes"] == 10
+    assert not stale.exists()
+    # Possibly another worker's write in progress
+    assert fresh.exists()
+
+def test_hits_and_misses_are_counted_once_under_concurrency(cache):
+    started = threading.Event()
+    release = threading.Event()
+
+    def produce():
+        started.set()
+        release.wait(2)
+        return b"x" * 10
+
+    threads = [threading.Thread(target=cache.get_or_create, args=("k", "wav", produce)) for _ in range(4)]
+    threads[0].start()
+    started.wait(2)
+    for thread in threads[1:]:
+        thread.start()
+    deadline = time.monotonic() + 2
+    while cache.stats()["coalesced"] < 3 and time.monotonic() < deadline:
+        time.sleep(0.005)
+    release.set()
+    for thread in threads:
+        thread.join(2)
+    cache.get_or_create("k", "wav", produce)
+    assert cache.cached_path("k", "wav")
+    assert cache.cached_path("other", "wav") is None
+    stats = cache.stats()
+    assert stats["misses"] == 1
+    assert stats["hits"] == 2
+    assert stats["coalesced"] == 3
+
+@pytest.fixture
+def sessions(cache, monkeypatch):
+    store = MemorySessionStore(max_entries=10, ttl_seconds=3600)
+    monkeypatch.setattr(session_service, "get_session_store", lambda: store)
+    monkeypatch.setattr(session_service, "audio_cache", cache)
+    return store
+
+def test_session_pins_follow_idle_ttl(cache, sessions, monkeypatch):
+    pins = []
+    monkeypatch.setattr(cache, "pin", lambda path, owner, ttl: pins.append((os.path.basename(path), owner, ttl)))
+    a, b = fill(cache, "a", "b")
+    session_id = session_service.create_session()
+    session_service.add_audio_to_session(session_id, a, None, "audio/untracked.wav")
+    assert pins == [("tts_a.wav", session_id, session_service.SESSION_AUDIO_PIN_SECONDS)]
+    # New activity renews the session's earlier pins too
+    pins.clear()
+    session_service.add_audio_to_session(session_id, b)
+    assert [name for name, _, _ in pins] == ["tts_a.wav", "tts_b.wav"]
+    assert session_service.SESSION_AUDIO_PIN_SECONDS <= session_service.SESSION_TTL_SECONDS
+
+def test_pin_on_a_file_still_being_written_applies_when_stored(cache):
+    path = cache.path_for(cache.filename_for("a", "wav"))
+    cache.pin(path, "s1", 60)
+    assert cache.stats()["pinned"] == 0
+    cache.put("a", "wav", b"x" * 100)
+    assert cache.stats()["pinned"] == 1
+    cache.evict(max_bytes=0)
+    # Pinned files are only evicted as a last resort, and counted as such
+    assert cache.stats()["pinned_evictions"] == 1
+
+def test_pending_pins_expire_and_unpin(cache):
+    a = cache.path_for(cache.filename_for("a", "wav"))
+    b = cache.path_for(cache.filename_for("b", "wav"))
+    cache.pin(a, "s1", -1)
+    cache.pin(b, "s1", 60)
+    cache.unpin(b, "s1")
+    cache.evict()
+    fill(cache, "a", "b")
+    assert cache.stats()["pinned"] == 0
+
+def test_session_pins_audio_that_is_still_synthesizing(cache, sessions):
+    (a,) = fill(cache, "a")
+    chunked = cache.path_for(cache.filename_for("chunked", "wav"))
+    session_id = session_service.create_session()
+    session_service.add_audio_to_session(session_id, chunked, a)
+    cache.put("chunked", "wav", b"x" * 100)
+    fill(cache, "c", "d", "e", "f", "g", "h", "i", "j", "k")
+    # Over budget: the unpinned files go first
+    assert os.path.exists(chunked) and os.path.exists(a)
+    assert cache.stats()["pinned"] == 2
+    assert session_service.cleanup_session(session_id)
+    assert cache.stats()["pinned"] == 0
+    # Shared cache entries aren't deleted with the session
+    assert os.path.exists(chunked)
+
+def test_cleanup_unpins_cached_audio(cache, sessions):
+    (a,) = fill(cache, "a")
+    session_id = session_service.create_session()
+    session_service.add_audio_to_session(session_id, a)
+    assert cache.stats()["pinned"] == 1
+    assert session_service.cleanup_session(session_id)
+    assert cache.stats()["pinned"] == 0
+    assert os.path.exists(a)
+
+def test_janitor_shrinks_cache_to_directory_budget(cache, tmp_path, monkeypatch):
+    monkeypatch.setattr(janitor, "audio_cache", cache)
+    monkeypatch.setattr(janitor, "AUDIO_DIR_MAX_BYTES", 250)
+    paths = fill(cache, "a", "b", "c", "d")
+    for path in paths:
+        cache.pin(path, "s1", 60)
+    files, total = janitor.sweep_audio(str(tmp_path))
+    assert (files, total) == (2, 200)
+    assert sorted(os.listdir(tmp_path)) == ["tts_c.wav", "tts_d.wav"]
+
+def test_concurrent_streams_share_one_build(cache):
+    release = threading.Event()
+    builds = []
+
+    def produce():
+        builds.append(1)
+        yield b"ab"
+        release.wait(2)
+        yield b"cd"
+        return b"abcd"
+
+    results = [None, None]
+
+    def consume(i):
+        results[i] = b"".join(cache.stream("k", "wav", produce, block_bytes=1))
+
+    threads = [threading.Thread(target=consume, args=(i,)) for i in range(2)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 2
+    while cache.stats()["coalesced"] < 1 and time.monotonic() < deadline:
+        time.sleep(0.005)
+    release.set()
+    for thread in threads:
+        thread.join(2)
+    assert results == [b"abcd", b"abcd"]
+    assert builds == [1]
+    stats = cache.stats()
+    assert (stats["misses"], stats["coalesced"]) == (1, 1)
+    # Later streams replay the file
+    assert b"".join(cache.stream("k", "wav", produce)) == b"abcd"
+    assert builds == [1]
+
+def test_abandoned_stream_hands_the_build_over(cache):
+    def produce():
+        yield b"ab"
+        return b"ab"
+
+    stream = cache.stream("k", "wav", produce)
+    assert next(stream) == b"ab"
+    follower = []
+    thread = threading.Thread(target=lambda: follower.append(b"".join(cache.stream("k", "wav", produce))))
+    thread.start()
+    deadline = time.monotonic() + 2
+    while cache.stats()["coalesced"] < 1 and time.monotonic() < deadline:
+        time.sleep(0.005)
+    stream.close()
+    thread.join(2)
+    assert follower == [b"ab"]
+    assert cache.cached_path("k", "wav")
@@ -0,0 +1,48 @@
+import pytest
+
+from services import tts_service
+from services.tts_service import accepts_audio_ranges, negotiate_audio_format
+
+@pytest.fixture(autouse=True)
+def wav_default(monkeypatch):
+    monkeypatch.setattr(tts_service, "DEFAULT_AUDIO_FORMAT", "wav")
+
+@pytest.mark.parametrize("accept, expected", [
+    (None, "wav"),
+    ("", "wav"),
+    ("audio/ogg", "ogg"),
+    ("audio/opus", "ogg"),
+    ("audio/mpeg, audio/ogg;q=0.9", "mp3"),
+    ("audio/ogg;q=0.5, */*", "wav"),
+    # Equal quality: an explicitly named type beats a wildcard...
+    ("audio/ogg, */*", "ogg"),
+    # ...and between equally specific matches the deployment default, then the table order, wins
+    ("audio/ogg;q=0.8, audio/mpeg;q=0.8", "mp3"),
+    ("audio/*", "wav"),
+    ("application/json", None),
+])
+def test_negotiation(accept, expected):
+    assert negotiate_audio_format(accept) == expected
+
+@pytest.mark.parametrize("accept, available, expected", [
+    ("audio/wav;q=0", ["wav"], None),
+    ("*/*;q=0", None, None),
+    ("audio/*;q=0", None, None),
+    # The specific q=0 overrides the wildcard for that type only
+    ("audio/*;q=0.5, audio/wav;q=0", None, "mp3"),
+    ("*/*, audio/wav;q=0", ["wav"], None),
+    ("audio/ogg;q=0, audio/*;q=0.1", ["ogg", "mp3"], "mp3"),
+    ("audio/wav;q=bogus", ["wav"], None),
+])
+def test_q_zero_is_not_acceptable(accept, available, expected):
+    assert negotiate_audio_format(accept, available) == expected
+
+@pytest.mark.parametrize("accept, expected", [
+    ("application/json", False),
+    ("text/html, application/xhtml+xml", False),
+    ("*/*;q=0", True),
+    ("audio/wav;q=0", True),
+    (None, False),
+])
+def test_accepts_audio_ranges(accept, expected):
+    assert accepts_audio_ranges(accept) == expected
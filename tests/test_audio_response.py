@@ -0,0 +1,58 @@
+import os
+
+import pytest
+
+from services.audio_response import AudioFileResponse, _etag_for, _parse_range, safe_audio_path
+
+def _write(directory, name, data):
+    path = os.path.join(directory, name)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+def test_parse_range_forms():
+    assert _parse_range("bytes=0-99", 1000) == (0, 99)
+    assert _parse_range("bytes=900-", 1000) == (900, 999)
+    assert _parse_range("bytes=-100", 1000) == (900, 999)
+    assert _parse_range("bytes=950-2000", 1000) == (950, 999)
+
+def test_parse_range_ignored_and_unsatisfiable():
+    assert _parse_range("items=0-1", 1000) is None
+    assert _parse_range("bytes=0-1,5-6", 1000) is None
+    assert _parse_range("bytes=a-b", 1000) is None
+    assert _parse_range("bytes=1000-", 1000) == "unsatisfiable"
+    assert _parse_range("bytes=-0", 1000) == "unsatisfiable"
+
+def test_safe_audio_path_rejects_traversal(tmp_path):
+    assert safe_audio_path("../main.py", str(tmp_path)) is None
+    assert safe_audio_path(".hidden", str(tmp_path)) is None
+    assert safe_audio_path("tts_abc.wav", str(tmp_path)) == f"{tmp_path}/tts_abc.wav"
+
+def test_variants_of_one_utterance_get_distinct_etags(tmp_path):
+    etags = set()
+    for extension, data in (("wav", b"RIFF"), ("mp3", b"ID3"), ("ogg", b"OggS")):
+        path = _write(str(tmp_path), f"tts_0123abcd.{extension}", data)
+        etags.add(_etag_for(path, os.stat(path)))
+    assert len(etags) == 3
+
+@pytest.mark.parametrize("headers, status", [
+    ({}, 200),
+    ({"range": "bytes=2-5"}, 206),
+    ({"range": "bytes=50-"}, 416),
+])
+def test_audio_file_response_status(tmp_path, headers, status):
+    path = _write(str(tmp_path), "tts_feed.wav", b"0123456789")
+    response = AudioFileResponse(path, headers, "audio/wav")
+    assert response.status_code == status
+    if status == 206:
+        assert response.headers["content-range"] == "bytes 2-5/10"
+        assert response.headers["content-length"] == "4"
+
+def test_conditional_requests_use_the_variant_etag(tmp_path):
+    wav = _write(str(tmp_path), "tts_feed.wav", b"0123456789")
+    mp3 = _write(str(tmp_path), "tts_feed.mp3", b"ID3-bytes")
+    wav_etag = AudioFileResponse(wav, {}, "audio/wav").headers["etag"]
+    assert AudioFileResponse(wav, {"if-none-match": wav_etag}, "audio/wav").status_code == 304
+    assert AudioFileResponse(mp3, {"if-none-match": wav_etag}, "audio/mpeg").status_code == 200
+    # A stale If-Range validator means the whole file, not a range of different bytes
+    assert AudioFileResponse(mp3, {"range": "bytes=0-1", "if-range": wav_etag}, "audio/mpeg").status_code == 200
@@ -0,0 +1,55 @@
+import io
+import struct
+import wave
+
+from services.audio_sniffer import sniff_audio
+
+def _wav(sample_rate=16000, channels=1):
+    output = io.BytesIO()
+    with wave.open(output, "wb") as out:
+        out.setnchannels(channels)
+        out.setsampwidth(2)
+        out.setframerate(sample_rate)
+        out.writeframes(b"\x00\x00" * channels * 10)
+    return output.getvalue()
+
+def _flac(sample_rate=44100, channels=2):
+    streaminfo = bytearray(34)
+    streaminfo[10] = (sample_rate >> 12) & 0xFF
+    streaminfo[11] = (sample_rate >> 4) & 0xFF
+    streaminfo[12] = ((sample_rate & 0x0F) << 4) | ((channels - 1) << 1)
+    return b"fLaC" + b"\x80\x00\x00\x22" + bytes(streaminfo)
+
+def _ogg_opus(input_rate=16000, channels=1):
+    head = b"OpusHead" + bytes([1, channels]) + struct.pack("<H", 312) + struct.pack("<I", input_rate)
+    return b"OggS" + bytes(24) + head + bytes(3)
+
+def _webm(sample_rate=None):
+    data = b"\x1a\x45\xdf\xa3" + bytes(16) + b"\x86\x86A_OPUS"
+    if sample_rate is not None:
+        data += b"\xe1\x89\xb5\x88" + struct.pack(">d", sample_rate)
+    return data
+
+def test_wav_linear16():
+    assert sniff_audio(_wav(22050, 2)) == {
+        "container": "wav", "encoding": "LINEAR16", "sample_rate": 22050, "channels": 2}
+
+def test_flac_streaminfo():
+    assert sniff_audio(_flac(44100, 2)) == {
+        "container": "flac", "encoding": "FLAC", "sample_rate": 44100, "channels": 2}
+
+def test_ogg_opus_input_rate():
+    assert sniff_audio(_ogg_opus(16000))["sample_rate"] == 16000
+    # Rates the Speech API doesn't take for Opus fall back to 48 kHz
+    assert sniff_audio(_ogg_opus(44100))["sample_rate"] == 48000
+
+def test_webm_opus_sampling_frequency():
+    assert sniff_audio(_webm(16000.0)) == {
+        "container": "webm", "encoding": "WEBM_OPUS", "sample_rate": 16000, "channels": None}
+    assert sniff_audio(_webm())["sample_rate"] == 48000
+
+def test_unknown_and_truncated_input():
+    assert sniff_audio(b"") is None
+    assert sniff_audio(b"ID3\x04" + bytes(100)) is None
+    assert sniff_audio(_wav()[:20]) is None
+    assert sniff_audio(b"OggS" + bytes(10)) is None
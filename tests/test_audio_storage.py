@@ -0,0 +1,201 @@
+import threading
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from services import audio_storage
+from services.audio_cache import AudioCache
+
+class SlowStorage(audio_storage.LocalAudioStorage):
+    def __init__(self):
+        self.release = threading.Event()
+        self.published = []
+
+    def publish(self, path):
+        self.release.wait(5)
+        self.published.append(path)
+
+def test_gcs_upload_runs_off_the_storing_thread(tmp_path, monkeypatch):
+    cache = AudioCache(directory=str(tmp_path), max_bytes=1000, max_age_seconds=3600)
+    storage = SlowStorage()
+    monkeypatch.setattr(audio_storage, "AUDIO_STORAGE_BACKEND", "gcs")
+    monkeypatch.setattr(audio_storage, "GCSAudioStorage", lambda: storage)
+    monkeypatch.setattr(audio_storage, "audio_cache", cache)
+    monkeypatch.setattr(audio_storage, "_storage", None)
+
+    assert audio_storage.get_audio_storage() is storage
+    # Returns while the upload is still blocked
+    path = cache.put("a", "wav", b"x")
+    assert storage.published == []
+    storage.release.set()
+    for _ in range(100):
+        if storage.published:
+            break
+        threading.Event().wait(0.01)
+    assert storage.published == [path]
+
+class FakeBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.cache_control = None
+
+    def upload_from_filename(self, path, content_type=None):
+        if self.bucket.fail_uploads:
+            raise Exception("503 Service Unavailable")
+        with open(path, "rb") as f:
+            self.bucket.objects[self.name] = (f.read(), content_type, self.cache_control)
+        self.bucket.upload_threads.append(threading.current_thread().name)
+
+    def exists(self):
+        return self.name in self.bucket.objects
+
+    def generate_signed_url(self, **kwargs):
+        self.bucket.signed.append(kwargs)
+        return f"https://storage.googleapis.com/{self.bucket.name}/{self.name}?X-Goog-Signature={len(self.bucket.signed)}"
+
+class FakeBucket:
+    def __init__(self, name):
+        self.name = name
+        self.objects = {}
+        self.signed = []
+        self.upload_threads = []
+        self.fail_uploads = False
+
+    def blob(self, name):
+        return FakeBlob(self, name)
+
+class KeyCredentials:
+    """Service account key: signs locally"""
+
+    def sign_bytes(self, data):
+        return b"signature"
+
+class MetadataCredentials:
+    """Cloud Run / GCE credentials: no key, sign through IAM after a refresh"""
+
+    def __init__(self):
+        self.service_account_email = "runner@project.iam.gserviceaccount.com"
+        self.token = None
+        self.refreshed_with = []
+
+    def refresh(self, request):
+        self.refreshed_with.append(request)
+        self.token = "ya29.token"
+
+class FakeStorageClient:
+    def __init__(self, credentials=None):
+        self._credentials = credentials or KeyCredentials()
+        self.buckets = {}
+
+    def bucket(self, name):
+        return self.buckets.setdefault(name, FakeBucket(name))
+
+@pytest.fixture
+def gcs(tmp_path, monkeypatch):
+    client = FakeStorageClient()
+    cache = AudioCache(directory=str(tmp_path), max_bytes=10000, max_age_seconds=3600)
+    monkeypatch.setattr(audio_storage, "get_storage_client", lambda: client)
+    monkeypatch.setattr(audio_storage, "audio_cache", cache)
+    monkeypatch.setattr(audio_storage, "STORAGE_EMULATOR_HOST", None)
+    storage = audio_storage.GCSAudioStorage("lessons")
+    return SimpleNamespace(storage=storage, bucket=client.bucket("lessons"), client=client, cache=cache)
+
+def test_publish_uploads_each_file_once(gcs):
+    path = gcs.cache.put("a", "wav", b"RIFF")
+    gcs.storage.publish(path)
+    gcs.storage.publish(path)
+    assert gcs.bucket.objects == {
+        "audio/tts_a.wav": (b"RIFF", "audio/wav", "public, max-age=31536000, immutable")}
+    assert gcs.storage.stats()["uploads"] == 1
+    assert gcs.storage.is_published("tts_a.wav")
+
+def test_failed_upload_keeps_serving_locally(gcs):
+    gcs.bucket.fail_uploads = True
+    path = gcs.cache.put("a", "wav", b"RIFF")
+    gcs.storage.publish(path)
+    assert gcs.storage.stats()["upload_failures"] == 1
+    assert not gcs.storage.is_published("tts_a.wav")
+    assert gcs.storage.url_for(path) == "/audio/tts_a.wav"
+
+def test_objects_uploaded_elsewhere_count_as_published(gcs):
+    gcs.bucket.objects["audio/tts_b.wav"] = (b"RIFF", "audio/wav", None)
+    assert gcs.storage.is_published("tts_b.wav")
+    assert not gcs.storage.is_published("tts_c.wav")
+    # Not on this instance's disk: link straight to the bucket
+    url = gcs.storage.url_for(f"{gcs.cache.directory}/tts_b.wav")
+    assert url.startswith("https://storage.googleapis.com/lessons/audio/tts_b.wav?")
+    assert gcs.storage.remote_url("tts_c.wav") is None
+
+def test_url_for_prefers_the_bucket_once_published(gcs):
+    path = gcs.cache.put("a", "wav", b"RIFF")
+    assert gcs.storage.url_for(path) == "/audio/tts_a.wav"
+    gcs.storage.publish(path)
+    url = gcs.storage.url_for(path)
+    assert url.startswith("https://storage.googleapis.com/lessons/audio/tts_a.wav?")
+    # Signed once, then reused
+    assert gcs.storage.url_for(path) == url
+    assert len(gcs.bucket.signed) == 1
+
+def test_url_for_audio_still_synthesizing_is_local(gcs):
+    started, release = threading.Event(), threading.Event()
+
+    def produce():
+        started.set()
+        release.wait(2)
+        return b"RIFF"
+
+    worker = threading.Thread(target=gcs.cache.get_or_create, args=("a", "wav", produce))
+    worker.start()
+    started.wait(2)
+    gcs.bucket.objects["audio/tts_a.wav"] = (b"RIFF", "audio/wav", None)
+    assert gcs.storage.url_for(f"{gcs.cache.directory}/tts_a.wav") == "/audio/tts_a.wav"
+    release.set()
+    worker.join(2)
+
+def test_signed_url_with_a_key_signs_locally(gcs):
+    gcs.storage.signed_url("tts_a.wav")
+    assert gcs.bucket.signed == [{
+        "version": "v4", "expiration": timedelta(seconds=audio_storage.AUDIO_URL_TTL_SECONDS), "method": "GET"}]
+
+def test_signed_url_without_a_key_signs_through_iam(gcs):
+    credentials = MetadataCredentials()
+    gcs.client._credentials = credentials
+    gcs.storage.signed_url("tts_a.wav")
+    assert len(credentials.refreshed_with) == 1
+    (kwargs,) = gcs.bucket.signed
+    assert kwargs["service_account_email"] == "runner@project.iam.gserviceaccount.com"
+    assert kwargs["access_token"] == "ya29.token"
+    assert kwargs["version"] == "v4"
+
+def test_emulator_urls_link_to_the_object(gcs, monkeypatch):
+    monkeypatch.setattr(audio_storage, "STORAGE_EMULATOR_HOST", "http://localhost:9023/")
+    assert gcs.storage.signed_url("tts_a.wav") == (
+        "http://localhost:9023/download/storage/v1/b/lessons/o/audio%2Ftts_a.wav?alt=media")
+    assert gcs.bucket.signed == []
+
+def test_stored_audio_is_uploaded_on_the_storage_pool(gcs, monkeypatch):
+    monkeypatch.setattr(audio_storage, "AUDIO_STORAGE_BACKEND", "gcs")
+    monkeypatch.setattr(audio_storage, "GCSAudioStorage", lambda: gcs.storage)
+    monkeypatch.setattr(audio_storage, "_storage", None)
+    monkeypatch.setattr(gcs.cache, "on_store", [])
+    audio_storage.get_audio_storage()
+    gcs.cache.put("a", "wav", b"RIFF")
+    for _ in range(200):
+        if gcs.bucket.upload_threads:
+            break
+        threading.Event().wait(0.01)
+    assert [name.split("-worker")[0] for name in gcs.bucket.upload_threads] == ["storage"]
+
+def test_audio_endpoint_redirects_to_the_bucket(gcs, monkeypatch, tmp_path):
+    import main
+
+    gcs.bucket.objects["audio/tts_remote.wav"] = (b"RIFF", "audio/wav", None)
+    monkeypatch.setattr(audio_storage, "_storage", gcs.storage)
+    monkeypatch.chdir(tmp_path)
+    response = TestClient(main.app).get("/audio/tts_remote.wav", follow_redirects=False)
+    assert response.status_code == 307
+    assert response.headers["location"].startswith("https://storage.googleapis.com/lessons/audio/tts_remote.wav?")
+    assert TestClient(main.app).get("/audio/tts_missing.wav", follow_redirects=False).status_code == 404
@@ -0,0 +1,54 @@
+import os
+import subprocess
+import sys
+
+BENCHMARKS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks")
+
+def run_benchmark(name, *args):
+    """Run a benchmark script in its own process (it installs fakes into the service modules)"""
+    completed = subprocess.run(
+        [sys.executable, os.path.join(BENCHMARKS, name), *args],
+        capture_output=True, text=True, timeout=120,
+    )
+    assert completed.returncode == 0, completed.stdout + completed.stderr
+    return completed.stdout
+
+def test_health_stays_fast_while_roadmaps_generate():
+    output = run_benchmark(
+        "health_under_load.py", "--generations", "20", "--gemini-latency", "0.3", "--tts-latency", "0.1",
+        "--baseline-seconds", "0.2", "--max-p99-ms", "250")
+    assert "0 failed" in output
+
+def test_client_setup_benchmark_runs_offline():
+    output = run_benchmark("client_setup.py", "--iterations", "3", "--backend", "tts", "--backend", "firestore")
+    assert "tts" in output and "firestore" in output
+
+def test_audio_format_benchmark_runs():
+    output = run_benchmark("audio_formats.py", "--lengths", "200", "--tts-latency", "0.01")
+    assert "mp3" in output and "ogg" in output
+
+def test_audio_range_benchmark_runs():
+    output = run_benchmark("audio_ranges.py", "--minutes", "1", "--concurrency", "4", "--requests", "5", "--full-gets", "1")
+    assert "range 256 KiB" in output and "full file" in output
+
+def test_speech_format_benchmark_runs():
+    output = run_benchmark("speech_formats.py", "--repeats", "2", "--speech-latency", "0.01", "--flood", "50")
+    assert "webm chunk 16k" in output and "Learned formats after 50" in output
+
+def test_roadmap_listing_benchmark_reads_one_page_at_a_time():
+    output = run_benchmark("roadmap_listing.py", "--docs", "2000", "--pages", "3", "--limit", "10")
+    assert "paged, uncached" in output
+    assert "whole collection (2000)" in output
+
+def test_read_cache_benchmark_runs():
+    output = run_benchmark("read_cache.py", "--roadmaps", "10", "--concurrency", "4", "--seconds", "0.3")
+    assert "no cache" in output and "read cache" in output
+
+def test_welcome_turn_benchmark_counts_gemini_calls():
+    output = run_benchmark("welcome_turns.py", "--conversations", "2", "--gemini-latency", "0.01", "--tts-latency", "0.01")
+    assert "plain" in output and "structured" in output
+
+def test_welcome_context_benchmark_runs():
+    output = run_benchmark("welcome_context.py", "--turns", "6", "--bucket", "3", "--gemini-latency", "0.01",
+                           "--seconds-per-token", "0")
+    assert "whole history" in output and "budgeted window" in output
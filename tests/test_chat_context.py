@@ -0,0 +1,41 @@
+from services.chat_context import PRESS_ENTER, ChatWindow, estimate_tokens, render_message
+
+def message(role, content):
+    return {"role": role, "content": content}
+
+def test_render_message_drops_press_enter():
+    assert render_message(message("assistant", f"What do you want to learn? {PRESS_ENTER}")) == \
+        "assistant: What do you want to learn?"
+
+def test_append_keeps_the_newest_lines_within_budget():
+    line_tokens = estimate_tokens(render_message(message("user", "x" * 40)))
+    window = ChatWindow(token_budget=line_tokens * 3)
+    for index in range(5):
+        window.append(message("user", str(index) * 40))
+    assert len(window) == 3
+    assert window.tokens == line_tokens * 3
+    assert window.render().splitlines() == [f"user: {str(index) * 40}" for index in (2, 3, 4)]
+
+def test_newest_line_is_kept_even_when_over_budget():
+    window = ChatWindow(token_budget=5)
+    window.append(message("user", "short"))
+    window.append(message("user", "y" * 200))
+    assert len(window) == 1
+    assert window.render() == "user: " + "y" * 200
+
+def test_from_history_matches_appending_one_by_one():
+    history = [message("user" if index % 2 else "assistant", f"turn {index} " * 10) for index in range(20)]
+    appended = ChatWindow(token_budget=100)
+    for entry in history:
+        appended.append(entry)
+    built = ChatWindow.from_history(history, token_budget=100)
+    assert built.render() == appended.render()
+    assert built.tokens == appended.tokens
+    assert built.tokens <= 100
+
+def test_render_is_refreshed_after_append():
+    window = ChatWindow(token_budget=100)
+    window.append(message("user", "hi"))
+    assert window.render() == "user: hi"
+    window.append(message("assistant", "hello"))
+    assert window.render() == "user: hi\nassistant: hello"
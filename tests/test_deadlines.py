@@ -0,0 +1,171 @@
+import threading
+import time
+
+import pytest
+from google.api_core import exceptions as api_exceptions
+
+from services import deadlines, executor
+from services.deadlines import (
+    budget_for, call_with_deadline, reset_deadline, rpc_timeout, set_deadline, stream_with_deadline
+)
+from services.gemini_scheduler import GeminiScheduler
+
+@pytest.fixture
+def deadline():
+    tokens = []
+    yield lambda seconds: tokens.append(set_deadline(seconds))
+    for token in reversed(tokens):
+        reset_deadline(token)
+
+def test_budget_for_uses_the_longest_prefix():
+    assert budget_for("/welcome/generate-roadmap") == budget_for("/create-roadmap")
+    assert budget_for("/unknown") == budget_for("/")
+
+def test_rpc_timeout_is_capped_by_the_request_budget(deadline):
+    deadline(0.5)
+    assert rpc_timeout("gemini") <= 0.5
+
+def test_exhausted_budget_fails_before_the_call(deadline):
+    deadline(-1)
+    calls = []
+    with pytest.raises(api_exceptions.DeadlineExceeded):
+        call_with_deadline("firestore", lambda timeout: calls.append(timeout))
+    assert calls == []
+
+def test_inline_call_reports_done_immediately():
+    done = []
+    assert call_with_deadline("firestore", lambda timeout: "doc", hedge=False, on_done=lambda: done.append(1)) == "doc"
+    assert done == [1]
+
+def test_enforced_call_is_abandoned_on_its_own_pool(deadline):
+    deadline(0.1)
+    release = threading.Event()
+    finished = threading.Event()
+    threads = []
+
+    def slow(timeout):
+        threads.append(threading.current_thread().name)
+        release.wait(2)
+        return "late"
+
+    with pytest.raises(api_exceptions.DeadlineExceeded):
+        call_with_deadline("gemini", slow, enforce=True, pool="gemini_rpc", on_done=finished.set)
+    assert threads[0].startswith("gemini_rpc-worker")
+    # Still running in the background: not done yet
+    assert not finished.is_set()
+    release.set()
+    assert finished.wait(2)
+
+def test_abandoned_gemini_call_keeps_its_scheduler_slot(deadline):
+    scheduler = GeminiScheduler(rate=1000, burst=100, max_concurrency=1)
+    release = threading.Event()
+
+    def generate():
+        return call_with_deadline("gemini", lambda timeout: release.wait(2), enforce=True,
+                                  pool="gemini_rpc", on_done=scheduler.hold_slot())
+
+    deadline(0.1)
+    with pytest.raises(api_exceptions.DeadlineExceeded):
+        scheduler.call(generate)
+    assert scheduler.stats()["in_flight"] == 1
+    release.set()
+    end = time.monotonic() + 2
+    while scheduler.stats()["in_flight"] and time.monotonic() < end:
+        time.sleep(0.005)
+    assert scheduler.stats()["in_flight"] == 0
+
+def test_hold_slot_outside_a_scheduled_call_is_a_no_op():
+    scheduler = GeminiScheduler()
+    scheduler.hold_slot()()
+    assert scheduler.stats()["in_flight"] == 0
+
+def wait_until_idle(scheduler):
+    end = time.monotonic() + 2
+    while scheduler.stats()["in_flight"] and time.monotonic() < end:
+        time.sleep(0.005)
+    return scheduler.stats()["in_flight"]
+
+def test_queued_attempt_is_cancelled_at_the_deadline(deadline, monkeypatch):
+    monkeypatch.setitem(executor.BACKEND_LIMITS, "deadline_test", 1)
+    busy = threading.Event()
+    executor.submit("deadline_test", busy.wait, 2)
+    started = []
+
+    deadline(0.1)
+    with pytest.raises(api_exceptions.DeadlineExceeded):
+        call_with_deadline("firestore", lambda timeout: started.append(timeout), enforce=True, pool="deadline_test")
+    busy.set()
+    executor.submit("deadline_test", lambda: None).result(2)
+    # Never ran, even once the pool was free
+    assert started == []
+
+@pytest.fixture
+def stream_timeouts(monkeypatch):
+    monkeypatch.setattr(deadlines, "STREAM_FIRST_CHUNK_TIMEOUT_SECONDS", 0.1)
+    monkeypatch.setattr(deadlines, "STREAM_CHUNK_TIMEOUT_SECONDS", 0.1)
+
+def stalling_stream(chunks, release):
+    def start():
+        yield from chunks
+        release.wait(2)
+        yield "late"
+    return start
+
+def test_stream_passes_chunks_through(stream_timeouts):
+    assert list(stream_with_deadline("gemini", lambda: iter(["a", "b"]), pool="gemini_rpc")) == ["a", "b"]
+
+def test_stream_with_no_first_chunk_exceeds_its_deadline(stream_timeouts):
+    release = threading.Event()
+    start = time.monotonic()
+    with pytest.raises(api_exceptions.DeadlineExceeded, match="first chunk"):
+        list(stream_with_deadline("gemini", stalling_stream([], release), pool="gemini_rpc"))
+    assert time.monotonic() - start < 1
+    release.set()
+
+def test_stream_stalling_between_chunks_exceeds_its_deadline(stream_timeouts):
+    release = threading.Event()
+    received = []
+    with pytest.raises(api_exceptions.DeadlineExceeded, match="no chunk"):
+        for chunk in stream_with_deadline("gemini", stalling_stream(["a", "b"], release), pool="gemini_rpc"):
+            received.append(chunk)
+    assert received == ["a", "b"]
+    release.set()
+
+def test_stream_wait_is_capped_by_the_request_budget(deadline, monkeypatch):
+    monkeypatch.setattr(deadlines, "STREAM_FIRST_CHUNK_TIMEOUT_SECONDS", 30)
+    release = threading.Event()
+    deadline(0.1)
+    start = time.monotonic()
+    with pytest.raises(api_exceptions.DeadlineExceeded):
+        list(stream_with_deadline("gemini", stalling_stream([], release), pool="gemini_rpc"))
+    assert time.monotonic() - start < 1
+    release.set()
+
+def test_abandoned_gemini_stream_keeps_its_scheduler_slot(stream_timeouts):
+    scheduler = GeminiScheduler(rate=1000, burst=100, max_concurrency=1)
+    release = threading.Event()
+
+    def start():
+        return stream_with_deadline("gemini", stalling_stream(["a"], release), pool="gemini_rpc",
+                                    on_done=scheduler.hold_slot())
+
+    with pytest.raises(api_exceptions.DeadlineExceeded):
+        list(scheduler.stream(start))
+    assert scheduler.stats()["in_flight"] == 1
+    release.set()
+    assert wait_until_idle(scheduler) == 0
+
+def test_finished_gemini_stream_frees_its_scheduler_slot(stream_timeouts):
+    scheduler = GeminiScheduler(rate=1000, burst=100, max_concurrency=1)
+
+    def start():
+        return stream_with_deadline("gemini", lambda: iter(["a", "b"]), pool="gemini_rpc",
+                                    on_done=scheduler.hold_slot())
+
+    assert list(scheduler.stream(start)) == ["a", "b"]
+    assert wait_until_idle(scheduler) == 0
+    # Closing a stream part way through frees it as well
+    chunks = scheduler.stream(start)
+    assert next(chunks) == "a"
+    chunks.close()
+    assert wait_until_idle(scheduler) == 0
@@ -0,0 +1,124 @@
+import threading
+import time
+
+import pytest
+from google.api_core import exceptions as api_exceptions
+
+from services import gemini_scheduler
+from services.deadlines import reset_deadline, set_deadline
+from services.gemini_scheduler import BATCH, INTERACTIVE, GeminiOverloaded, GeminiScheduler
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(gemini_scheduler, "GEMINI_RETRY_BASE_SECONDS", 0.001)
+    monkeypatch.setattr(gemini_scheduler, "GEMINI_RETRY_MAX_SECONDS", 0.01)
+
+def wait_for(condition, timeout=2.0):
+    end = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < end, "timed out"
+        time.sleep(0.005)
+
+def test_interactive_calls_run_before_batch_calls():
+    scheduler = GeminiScheduler(rate=1000, burst=100, max_concurrency=1)
+    release = threading.Event()
+    order = []
+    holder = threading.Thread(target=scheduler.call, args=(lambda: release.wait(2),))
+    holder.start()
+    wait_for(lambda: scheduler.stats()["in_flight"] == 1)
+
+    batch = threading.Thread(target=scheduler.call, args=(lambda: order.append("batch"), BATCH))
+    batch.start()
+    wait_for(lambda: scheduler.stats()["waiting"]["batch"] == 1)
+    interactive = threading.Thread(target=scheduler.call, args=(lambda: order.append("interactive"), INTERACTIVE))
+    interactive.start()
+    wait_for(lambda: scheduler.stats()["waiting"]["interactive"] == 1)
+
+    release.set()
+    for thread in (holder, batch, interactive):
+        thread.join(2)
+    assert order == ["interactive", "batch"]
+    assert scheduler.stats()["queued"] == 2
+
+def test_identical_calls_in_flight_share_one_request():
+    scheduler = GeminiScheduler(rate=1000, burst=100, max_concurrency=4)
+    release = threading.Event()
+    calls = []
+
+    def generate():
+        calls.append(1)
+        release.wait(2)
+        return {"title": "Python"}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(scheduler.call(generate, key="python")))
+               for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    wait_for(lambda: scheduler.stats()["coalesced"] == 2)
+    release.set()
+    for thread in threads:
+        thread.join(2)
+    assert len(calls) == 1
+    assert results == [{"title": "Python"}] * 3
+
+def flaky(errors, result="ok"):
+    attempts = []
+
+    def func():
+        attempts.append(1)
+        if len(attempts) <= len(errors):
+            raise errors[len(attempts) - 1]
+        return result
+
+    return func, attempts
+
+def test_429_is_retried_until_it_succeeds():
+    scheduler = GeminiScheduler(rate=1000, burst=100, max_concurrency=4)
+    func, attempts = flaky([api_exceptions.TooManyRequests("slow down"), api_exceptions.ServiceUnavailable("busy")])
+    assert scheduler.call(func) == "ok"
+    assert len(attempts) == 3
+    stats = scheduler.stats()
+    assert stats["retries"] == 2
+    assert stats["throttled_by_quota"] == 1
+    assert stats["in_flight"] == 0
+
+def test_retries_stop_at_the_limit(monkeypatch):
+    monkeypatch.setattr(gemini_scheduler, "GEMINI_MAX_RETRIES", 2)
+    scheduler = GeminiScheduler(rate=1000, burst=100, max_concurrency=4)
+    func, attempts = flaky([api_exceptions.ResourceExhausted("quota")] * 10)
+    with pytest.raises(GeminiOverloaded) as raised:
+        scheduler.call(func)
+    assert isinstance(raised.value.__cause__, api_exceptions.ResourceExhausted)
+    assert len(attempts) == 3
+
+def test_quota_error_drains_the_bucket_until_the_deadline():
+    # One token per 100s: once a 429 empties the bucket, the retry can't be admitted in time
+    scheduler = GeminiScheduler(rate=0.01, burst=5, max_concurrency=4)
+    func, attempts = flaky([api_exceptions.TooManyRequests("quota")] * 10)
+    start = time.monotonic()
+    with pytest.raises(GeminiOverloaded):
+        scheduler.call(func, deadline=start + 0.2)
+    assert len(attempts) == 1
+    assert time.monotonic() - start < 1
+    stats = scheduler.stats()
+    assert stats["throttled_by_quota"] == 1
+    assert stats["tokens"] < 1
+    assert stats["deadline_exceeded"] == 1
+
+def test_other_errors_are_not_retried():
+    scheduler = GeminiScheduler(rate=1000, burst=100, max_concurrency=4)
+    func, attempts = flaky([ValueError("bad prompt")])
+    with pytest.raises(ValueError):
+        scheduler.call(func)
+    assert len(attempts) == 1
+    assert scheduler.stats()["in_flight"] == 0
+
+def test_request_deadline_caps_the_call_deadline():
+    scheduler = GeminiScheduler(rate=1000, burst=100, max_concurrency=4)
+    token = set_deadline(0.5)
+    try:
+        deadline = scheduler._deadline(BATCH, None)
+    finally:
+        reset_deadline(token)
+    assert deadline - time.monotonic() <= 0.5
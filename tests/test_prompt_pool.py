@@ -0,0 +1,60 @@
+import itertools
+import os
+
+import pytest
+
+from services import prompt_pool
+from services.audio_cache import AudioCache
+
+@pytest.fixture
+def pool(tmp_path, monkeypatch):
+    """Pools rendered into a small real audio cache, with a distinct fake greeting per Gemini call"""
+    cache = AudioCache(directory=str(tmp_path), max_bytes=10_000, max_age_seconds=3600)
+    greetings = (f"Hello number {n}! What would you like to learn?" for n in itertools.count())
+
+    def generate_audio(text, audio_format=None):
+        return cache.put(f"tts_{abs(hash(text))}", "wav", b"x" * 100)
+
+    monkeypatch.setattr(prompt_pool, "audio_cache", cache)
+    monkeypatch.setattr(prompt_pool, "generate_audio", generate_audio)
+    monkeypatch.setattr(prompt_pool, "get_gemini_response", lambda prompt, kind=None: next(greetings))
+    monkeypatch.setattr(prompt_pool, "WELCOME_POOL_SIZE", 3)
+    monkeypatch.setattr(prompt_pool, "WELCOME_POOL_ROTATION", "round_robin")
+    monkeypatch.setattr(prompt_pool, "_pools", {"greeting": [], "fallback": []})
+    monkeypatch.setattr(prompt_pool, "_rerenders", {})
+    prompt_pool.refresh()
+    return cache
+
+def wait_for_rerender(kind):
+    prompt_pool._rerenders[kind].join(timeout=5)
+
+def test_pick_serves_pooled_audio(pool):
+    picked = [prompt_pool.pick("greeting") for _ in range(3)]
+    assert len({entry["text"] for entry in picked}) == 3
+    assert all(os.path.exists(entry["audio_path"]) for entry in picked)
+
+def test_pick_skips_evicted_audio_and_rerenders(pool):
+    entries = list(prompt_pool._pools["greeting"])
+    # Six pinned 100 byte files (fallbacks first); the budget is hard, so the
+    # three fallbacks and the oldest greeting go even though they are pinned
+    pool.evict(max_bytes=200)
+    evicted = [entry for entry in entries if not os.path.exists(entry["audio_path"])]
+    assert evicted == entries[:1]
+
+    for _ in range(len(entries)):
+        picked = prompt_pool.pick("greeting")
+        assert picked not in evicted
+        assert os.path.exists(picked["audio_path"])
+    assert prompt_pool.prompt_pool_stats()["stale"] >= 1
+
+    wait_for_rerender("greeting")
+    rebuilt = prompt_pool._pools["greeting"]
+    assert len(rebuilt) == 3
+    assert all(os.path.exists(entry["audio_path"]) for entry in rebuilt)
+
+def test_pool_with_all_audio_gone_is_a_miss_until_rebuilt(pool):
+    for entry in prompt_pool._pools["fallback"]:
+        os.remove(entry["audio_path"])
+    assert prompt_pool.pick("fallback") is None
+    wait_for_rerender("fallback")
+    assert os.path.exists(prompt_pool.pick("fallback")["audio_path"])
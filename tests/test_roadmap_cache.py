@@ -0,0 +1,98 @@
+import pytest
+
+from services import roadmap_cache
+from services.roadmap_cache import cache_key, content_key, content_words, normalize_prompt
+
+SUMMARY = (
+    "The user is a {level} who wants to learn {topic} in 14 days. They already know basic HTML "
+    "and CSS, can spend about an hour each evening, prefer short practical exercises over theory, "
+    "and want to finish by building a small personal portfolio site they can show employers."
+)
+
+@pytest.fixture(autouse=True)
+def isolated_cache(monkeypatch):
+    monkeypatch.setattr(roadmap_cache, "_entries", roadmap_cache.TTLCache(100, 3600))
+    monkeypatch.setattr(roadmap_cache, "_similar", roadmap_cache.TTLCache(100, 3600))
+    monkeypatch.setattr(roadmap_cache, "ROADMAP_CACHE_ENABLED", True)
+    monkeypatch.setattr(roadmap_cache, "get_cached_roadmap", lambda key: None)
+    monkeypatch.setattr(roadmap_cache, "save_cached_roadmap", lambda *args: None)
+
+def _roadmap(topic):
+    return {"topic": topic, "summary": "", "days": [{"day": 1, "title": topic, "lesson": topic}]}
+
+@pytest.mark.parametrize("a, b", [
+    ("Learn C++ in 7 days", "Learn C in 7 days"),
+    ("Learn C# in 7 days", "Learn C in 7 days"),
+    ("Learn C++ in 7 days", "Learn C# in 7 days"),
+    ("Learn .NET in 7 days", "Learn NET in 7 days"),
+])
+def test_language_names_keep_their_symbols(a, b):
+    assert cache_key(normalize_prompt(a)) != cache_key(normalize_prompt(b))
+    assert content_key(normalize_prompt(a)) != content_key(normalize_prompt(b))
+
+def test_normalize_drops_sentence_punctuation():
+    assert normalize_prompt("I want to learn C++!  Please...") == "i want to learn c++ please"
+    assert normalize_prompt("Node.js, in 7 days.") == "node.js in 7 days"
+    assert normalize_prompt("Learn Python.") == normalize_prompt("learn python")
+
+def test_filler_words_order_and_plurals_share_a_roadmap():
+    roadmap_cache.store_roadmap("I want to learn Python in 7 days", _roadmap("python"))
+    hit = roadmap_cache.lookup_roadmap("Please teach me Python, 7 day")
+    assert hit == _roadmap("python")
+
+REPHRASED = SUMMARY.replace("about an hour each evening", "roughly an hour every evening")
+
+@pytest.mark.parametrize("stored, asked", [
+    (SUMMARY.format(level="beginner", topic="React"), SUMMARY.format(level="beginner", topic="Angular")),
+    (SUMMARY.format(level="beginner", topic="React"), SUMMARY.format(level="advanced developer", topic="React")),
+    (SUMMARY.format(level="beginner", topic="React"), REPHRASED.format(level="intermediate", topic="React")),
+    (SUMMARY.format(level="beginner", topic="C++"), REPHRASED.format(level="beginner", topic="C#")),
+    ("Learn Spanish in 7 days", "Learn Spanish in 30 days"),
+])
+def test_long_prompts_differing_in_one_detail_miss(stored, asked):
+    topic = "Spanish" if "Spanish" in stored else stored.split(" learn ")[1].split()[0]
+    roadmap_cache.store_roadmap(stored, _roadmap(topic))
+    assert roadmap_cache.lookup_roadmap(asked) is None
+
+def test_rephrased_long_prompt_is_a_near_duplicate():
+    roadmap_cache.store_roadmap(SUMMARY.format(level="beginner", topic="React"), _roadmap("React"))
+    assert roadmap_cache.lookup_roadmap(REPHRASED.format(level="beginner", topic="React")) == _roadmap("React")
+    assert roadmap_cache.roadmap_cache_stats()["similar_hits"] >= 1
+
+def test_similarity_threshold_is_configurable(monkeypatch):
+    monkeypatch.setattr(roadmap_cache, "ROADMAP_CACHE_SIMILARITY", 1.0)
+    roadmap_cache.store_roadmap(SUMMARY.format(level="beginner", topic="React"), _roadmap("React"))
+    assert roadmap_cache.lookup_roadmap(REPHRASED.format(level="beginner", topic="React")) is None
+
+def test_short_prompts_need_the_minimum_overlap():
+    roadmap_cache.store_roadmap("Python for data science", _roadmap("Python"))
+    assert roadmap_cache.lookup_roadmap("Python for data science projects") is None
+
+WEB = "Build web applications with Python {clause} over 30 days with small weekly projects and a final deployment"
+
+@pytest.mark.parametrize("stored, asked", [
+    # Same words, different order: which one is excluded changes
+    (WEB.format(clause="without Django"), WEB.replace("Python", "Django").format(clause="without Python")),
+    (WEB.format(clause="and Django"), WEB.format(clause="but not Django")),
+    (WEB.format(clause="and Django"), WEB.format(clause="but don't use Django")),
+    (WEB.format(clause="without Django"), WEB.format(clause="without Flask")),
+])
+def test_negation_and_word_order_near_misses(stored, asked):
+    roadmap_cache.store_roadmap(stored, _roadmap("Python"))
+    assert roadmap_cache.lookup_roadmap(asked) is None
+
+def test_negation_stays_with_its_word():
+    assert content_words(normalize_prompt("Python without Django")) == {"python", "without django"}
+    assert content_words(normalize_prompt("I don't want Java")) == {"dont java"}
+    assert content_key(normalize_prompt("Python without Django")) != content_key(normalize_prompt("Django without Python"))
+
+def test_near_duplicate_with_the_same_negation_hits():
+    roadmap_cache.store_roadmap(WEB.format(clause="without Django"), _roadmap("Python"))
+    asked = WEB.format(clause="without Django").replace("small weekly", "short weekly")
+    assert roadmap_cache.lookup_roadmap(asked) == _roadmap("Python")
+
+def test_exact_hit_returns_a_copy():
+    roadmap_cache.store_roadmap("Learn Go", _roadmap("go"))
+    hit = roadmap_cache.lookup_roadmap("learn go!")
+    hit["days"].clear()
+    assert roadmap_cache.lookup_roadmap("Learn Go") == _roadmap("go")
@@ -0,0 +1,152 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from google.cloud import firestore
+
+from services import firestore_service
+from services.cache import TTLCache
+from services.firestore_service import _decode_cursor, _encode_cursor, get_all_roadmaps
+
+def test_cursor_round_trip():
+    created_at = datetime(2026, 3, 1, 12, 30, 5, 123000, tzinfo=timezone.utc)
+    assert _decode_cursor(_encode_cursor(created_at, "abc-123")) == (created_at, "abc-123")
+
+@pytest.mark.parametrize("cursor", ["", "not base64!", "eyJmb28iOiAxfQ=="])
+def test_bad_cursors_raise_value_error(cursor):
+    with pytest.raises(ValueError):
+        _decode_cursor(cursor)
+
+class _Doc:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+class _Query:
+    """Enough of a Firestore collection query to page through, recording what was asked"""
+
+    def __init__(self, db, orders=(), limit_to=None, after=None):
+        self.db = db
+        self.orders = orders
+        self.limit_to = limit_to
+        self.after = after
+
+    def document(self, doc_id):
+        return _Ref(self.db, doc_id)
+
+    def select(self, fields):
+        self.db.selected = list(fields)
+        return self
+
+    def order_by(self, field, direction=None):
+        return _Query(self.db, self.orders + ((field, direction),), self.limit_to, self.after)
+
+    def limit(self, count):
+        return _Query(self.db, self.orders, count, self.after)
+
+    def start_after(self, values):
+        return _Query(self.db, self.orders, self.limit_to, values)
+
+    def stream(self, timeout=None):
+        self.db.queries.append(self)
+        docs = sorted(self.db.docs.items(), key=lambda item: (item[1]["created_at"], item[0]), reverse=True)
+        if self.after is not None:
+            position = (self.after["created_at"], self.after["__name__"])
+            docs = [(doc_id, data) for doc_id, data in docs if (data["created_at"], doc_id) < position]
+        return iter([_Doc(doc_id, data) for doc_id, data in docs[:self.limit_to]])
+
+class _Ref:
+    def __init__(self, db, doc_id, top_level=True):
+        self.db = db
+        self.id = doc_id
+        self.top_level = top_level
+
+    def collection(self, name):
+        return self
+
+    def document(self, doc_id):
+        return _Ref(self.db, doc_id, top_level=False)
+
+class _Batch:
+    def __init__(self, db):
+        self.db = db
+        self.writes = []
+
+    def set(self, ref, data):
+        self.writes.append((ref, data))
+
+    def commit(self):
+        for ref, data in self.writes:
+            if ref.top_level:
+                # Firestore hands timestamps back timezone-aware
+                self.db.docs[ref.id] = dict(data, created_at=data["created_at"].astimezone(timezone.utc))
+
+class _FakeDB:
+    def __init__(self, count):
+        start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        # Pairs of roadmaps share a timestamp, so the id has to break ties
+        self.docs = {
+            f"id-{i:03d}": {"topic": f"Topic {i}", "description": "", "created_at": start + timedelta(minutes=i // 2)}
+            for i in range(count)
+        }
+        self.queries = []
+        self.selected = None
+
+    def collection(self, name):
+        assert name == "roadmaps"
+        return _Query(self)
+
+    def batch(self):
+        return _Batch(self)
+
+@pytest.fixture
+def listing_db(monkeypatch):
+    db = _FakeDB(25)
+    monkeypatch.setattr(firestore_service, "db", db)
+    monkeypatch.setattr(firestore_service, "_listing_cache", TTLCache(16, 60))
+    monkeypatch.setattr(firestore_service, "ROADMAP_LIST_CACHE_TTL_SECONDS", 60)
+    return db
+
+def test_pages_cover_every_roadmap_once_newest_first(listing_db):
+    seen, cursor, pages = [], None, 0
+    while True:
+        roadmaps, cursor = get_all_roadmaps(limit=10, cursor=cursor)
+        seen.extend(roadmap["id"] for roadmap in roadmaps)
+        pages += 1
+        if cursor is None:
+            break
+    assert pages == 3
+    assert seen == sorted(listing_db.docs, key=lambda i: (listing_db.docs[i]["created_at"], i), reverse=True)
+    query = listing_db.queries[0]
+    assert [field for field, _ in query.orders] == ["created_at", "__name__"]
+    assert all(direction == firestore.Query.DESCENDING for _, direction in query.orders)
+    # One extra document tells whether there is a next page
+    assert query.limit_to == 11
+    assert "days" not in listing_db.selected
+
+def test_last_full_page_has_no_cursor(listing_db):
+    roadmaps, cursor = get_all_roadmaps(limit=25)
+    assert len(roadmaps) == 25 and cursor is None
+
+def test_listing_is_cached_until_a_roadmap_is_saved(listing_db, monkeypatch):
+    first = get_all_roadmaps(limit=5)
+    assert get_all_roadmaps(limit=5) is first
+    assert len(listing_db.queries) == 1
+
+    roadmap_id = firestore_service.save_roadmap("Go", "learn go", {"topic": "Go", "days": []})
+    roadmaps, _ = get_all_roadmaps(limit=5)
+    assert len(listing_db.queries) == 2
+    assert roadmaps[0]["id"] == roadmap_id
+
+@pytest.mark.parametrize("limit, status", [(0, 400), (101, 400), (-5, 400), (1, 200), (100, 200)])
+def test_roadmaps_endpoint_enforces_limit_bounds(limit, status, monkeypatch):
+    import main
+
+    calls = []
+    monkeypatch.setattr(main, "get_all_roadmaps", lambda limit, cursor: calls.append(limit) or ([], None))
+    response = TestClient(main.app).get("/roadmaps", params={"limit": limit})
+    assert response.status_code == status
+    assert calls == ([limit] if status == 200 else [])
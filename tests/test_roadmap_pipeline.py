@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from services import roadmap_pipeline
+from services.roadmap_pipeline import finish_roadmap
+
+ROADMAP = {
+    "topic": "Python",
+    "summary": "A week of Python.",
+    "days": [{"day": 1, "title": "Day 1", "tasks": [], "lesson": "Variables and values."}],
+}
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """Fake synthesis and storage; set failures["<text>"] to make synthesizing that text fail"""
+    saved = []
+    failures = {}
+
+    def generate_audio(text, audio_format=None, chunked=False, on_first_chunk=None):
+        if text in failures:
+            raise failures[text]
+        path = f"audio/tts_{len(text)}.{audio_format}"
+        if on_first_chunk:
+            on_first_chunk(path)
+        return path
+
+    def save_roadmap(topic, prompt, roadmap, summary, summary_audio_path):
+        if "save" in failures:
+            raise failures["save"]
+        saved.append(summary_audio_path)
+        return "roadmap-1"
+
+    monkeypatch.setattr(roadmap_pipeline, "generate_audio", generate_audio)
+    monkeypatch.setattr(roadmap_pipeline, "audio_path_for", lambda text, audio_format: f"audio/tts_{len(text)}.{audio_format}")
+    monkeypatch.setattr(roadmap_pipeline, "save_roadmap", save_roadmap)
+    monkeypatch.setattr(roadmap_pipeline, "audio_urls_for", lambda *paths: [f"/{path}" if path else None for path in paths])
+    return saved, failures
+
+def finish():
+    return asyncio.run(finish_roadmap("learn python", ROADMAP, "wav"))
+
+def test_all_stages_succeed(pipeline):
+    result = finish()
+    assert result["roadmap_id"] == "roadmap-1"
+    assert result["day1_audio_url"] == "/audio/tts_21.wav"
+    assert result["summary_audio_url"] == "/audio/tts_17.wav"
+    assert "audio_errors" not in result
+
+def test_day1_tts_failure_still_returns_the_saved_roadmap(pipeline):
+    saved, failures = pipeline
+    failures["Variables and values."] = Exception("TTS unavailable")
+    result = finish()
+    assert result["roadmap_id"] == "roadmap-1"
+    assert result["day1_audio_url"] is None
+    assert result["day1_first_chunk_audio_url"] is None
+    assert result["summary_audio_url"] == "/audio/tts_17.wav"
+    assert result["audio_errors"] == {"day1": "TTS unavailable"}
+    assert saved == ["audio/tts_17.wav"]
+
+def test_summary_tts_failure_drops_only_its_url(pipeline):
+    saved, failures = pipeline
+    failures["A week of Python."] = Exception("quota")
+    result = finish()
+    assert result["day1_audio_url"] == "/audio/tts_21.wav"
+    assert result["summary_audio_url"] is None
+    assert result["audio_errors"] == {"summary": "quota"}
+    # The saved path lets /roadmap-summary-audio synthesize it later
+    assert saved == ["audio/tts_17.wav"]
+
+def test_failed_save_fails_the_call(pipeline):
+    _, failures = pipeline
+    failures["save"] = Exception("Firestore down")
+    with pytest.raises(Exception, match="Firestore down"):
+        finish()
@@ -0,0 +1,44 @@
+import json
+
+from services.gemini_service import RoadmapStreamParser, _parse_roadmap_text, is_fallback_roadmap
+
+ROADMAP = {
+    "topic": "Python \"basics\"",
+    "summary": "Seven days of Python {with braces} and [brackets]",
+    "days": [
+        {"day": 1, "title": "Setup", "lesson": "Install Python. Say \"hello\" {world}."},
+        {"day": 2, "title": "Lists", "lesson": "Lists use [square] brackets, escaped \\\" quotes too."},
+        {"day": 3, "title": "Dicts", "lesson": "Nested {\"a\": [1, 2]} values."},
+    ],
+}
+
+def _feed_in_pieces(text, size):
+    parser = RoadmapStreamParser()
+    days = []
+    for start in range(0, len(text), size):
+        days.extend(parser.feed(text[start:start + size]))
+    return parser, days
+
+def test_days_are_emitted_as_they_complete():
+    text = json.dumps(ROADMAP)
+    parser = RoadmapStreamParser()
+    first_day_end = text.index(', {"day": 2')
+    assert parser.feed(text[:first_day_end - 1]) == []
+    assert parser.feed(text[first_day_end - 1:first_day_end]) == [ROADMAP["days"][0]]
+
+def test_any_chunking_gives_the_same_days_and_fields():
+    text = "```json\n" + json.dumps(ROADMAP, indent=2) + "\n```"
+    for size in (1, 3, 7, 64, len(text)):
+        parser, days = _feed_in_pieces(text, size)
+        assert days == ROADMAP["days"]
+        assert parser.fields["topic"] == ROADMAP["topic"]
+        assert parser.fields["summary"] == ROADMAP["summary"]
+
+def test_nested_arrays_are_not_mistaken_for_days():
+    text = json.dumps({"topic": "x", "tags": [{"day": 9}], "days": [{"day": 1, "lesson": "a"}]})
+    _, days = _feed_in_pieces(text, 5)
+    assert days == [{"day": 1, "lesson": "a"}]
+
+def test_parse_roadmap_text_strips_fences_and_falls_back():
+    assert _parse_roadmap_text("```json\n" + json.dumps(ROADMAP) + "\n```") == ROADMAP
+    assert is_fallback_roadmap(_parse_roadmap_text("{not json"))
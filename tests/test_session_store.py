@@ -0,0 +1,137 @@
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from services import cache, firestore_service
+from services.session_store import FirestoreSessionStore, MemorySessionStore, RedisSessionStore, SessionStore
+
+class FakeRedis:
+    """The slice of redis.Redis the store uses, with expiry on a fake clock"""
+
+    def __init__(self, clock=None):
+        self.clock = clock or SimpleNamespace(now=0.0)
+        self.data = {}
+
+    @property
+    def now(self):
+        return self.clock.now
+
+    @now.setter
+    def now(self, value):
+        self.clock.now = value
+
+    def get(self, key):
+        value, expires_at = self.data.get(key, (None, None))
+        if expires_at is not None and self.now >= expires_at:
+            del self.data[key]
+            return None
+        return value.encode("utf-8") if value is not None else None
+
+    def set(self, key, value, ex=None):
+        self.data[key] = (value, self.now + ex if ex else None)
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+class FakeFirestore:
+    """Documents of the session_store collection"""
+
+    def __init__(self):
+        self.docs = {}
+
+    def collection(self, name):
+        assert name == "session_store"
+        return self
+
+    def document(self, record_id):
+        return SimpleNamespace(
+            get=lambda timeout=None: SimpleNamespace(
+                exists=record_id in self.docs, to_dict=lambda: dict(self.docs[record_id])),
+            set=lambda data: self.docs.__setitem__(record_id, data),
+            delete=lambda: self.docs.pop(record_id, None),
+        )
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Seconds since the test started, as seen by every store; tests move it forward"""
+    clock = SimpleNamespace(now=0.0)
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+    class FrozenDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return start + timedelta(seconds=clock.now)
+
+    monkeypatch.setattr(cache, "time", SimpleNamespace(monotonic=lambda: clock.now))
+    monkeypatch.setattr(firestore_service, "datetime", FrozenDatetime)
+    return clock
+
+@pytest.fixture(params=["memory", "redis", "firestore"])
+def store(request, clock, monkeypatch):
+    if request.param == "memory":
+        return MemorySessionStore(max_entries=10, ttl_seconds=60)
+    if request.param == "redis":
+        return RedisSessionStore(prefix="test:", client=FakeRedis(clock))
+    monkeypatch.setattr(firestore_service, "db", FakeFirestore())
+    return FirestoreSessionStore()
+
+def test_session_store_is_abstract():
+    with pytest.raises(TypeError):
+        SessionStore()
+
+def test_round_trip_and_namespaces(store):
+    store.set("audio", "s1", {"files": ["a.wav"]})
+    store.set("welcome", "s1", {"g": "s1"})
+    assert store.get("audio", "s1") == {"files": ["a.wav"]}
+    assert store.get("welcome", "s1") == {"g": "s1"}
+    assert store.get("audio", "missing") is None
+
+def test_values_are_copies(store):
+    value = {"files": []}
+    store.set("audio", "s1", value)
+    value["files"].append("late.wav")
+    store.get("audio", "s1")["files"].append("other.wav")
+    assert store.get("audio", "s1") == {"files": []}
+
+def test_delete(store):
+    store.set("audio", "s1", {"files": []})
+    store.delete("audio", "s1")
+    store.delete("audio", "s1")
+    assert store.get("audio", "s1") is None
+
+def test_redis_keys_are_prefixed_and_expire():
+    client = FakeRedis()
+    store = RedisSessionStore(prefix="vlt:", client=client)
+    store.set("audio", "s1", {"files": []}, ttl=30)
+    assert list(client.data) == ["vlt:audio:s1"]
+    client.now = 29
+    assert store.get("audio", "s1") == {"files": []}
+    client.now = 30
+    assert store.get("audio", "s1") is None
+
+def test_memory_store_expires_and_purges():
+    store = MemorySessionStore(max_entries=10, ttl_seconds=0.05)
+    store.set("audio", "s1", {"files": []})
+    time.sleep(0.06)
+    assert store.purge_expired() == 1
+    assert store.get("audio", "s1") is None
+
+def test_each_key_expires_after_its_own_ttl(store, clock):
+    store.set("audio", "short", {"files": []}, ttl=10)
+    store.set("audio", "long", {"files": []}, ttl=100)
+    clock.now = 9
+    assert store.get("audio", "short") == {"files": []}
+    clock.now = 11
+    assert store.get("audio", "short") is None
+    assert store.get("audio", "long") == {"files": []}
+    clock.now = 101
+    assert store.get("audio", "long") is None
+
+def test_rewriting_a_key_renews_its_ttl(store, clock):
+    store.set("audio", "s1", {"files": []}, ttl=10)
+    clock.now = 8
+    store.set("audio", "s1", {"files": ["a.wav"]}, ttl=10)
+    clock.now = 15
+    assert store.get("audio", "s1") == {"files": ["a.wav"]}
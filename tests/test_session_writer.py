@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+
+import pytest
+
+from services import session_writer
+
+@pytest.fixture
+def writes(monkeypatch):
+    """Batches passed to Firestore; a batch containing guest "bad" fails"""
+    batches = []
+
+    def save(updates):
+        if any(update["guest_id"] == "bad" for update in updates):
+            raise Exception("document too large")
+        batches.append([(update["guest_id"], list(update["new_messages"])) for update in updates])
+
+    monkeypatch.setattr(session_writer, "save_welcome_session_updates", save)
+    monkeypatch.setattr(session_writer, "_ensure_flusher", lambda: None)
+    monkeypatch.setattr(session_writer, "_pending", {})
+    monkeypatch.setattr(session_writer, "_queued_counts", session_writer.TTLCache(100, 3600))
+    monkeypatch.setattr(session_writer, "_metrics", dict.fromkeys(session_writer._metrics, 0))
+    return batches
+
+def _session(guest_id, *messages):
+    return SimpleNamespace(
+        guest_id=guest_id, session_name="s", current_step="topic", collected_info={},
+        chat_history=[{"role": "user", "content": text} for text in messages])
+
+def test_turns_merge_and_only_new_messages_are_sent(writes):
+    session = _session("a", "hi")
+    session_writer.enqueue(session)
+    session.chat_history.append({"role": "assistant", "content": "hello"})
+    session_writer.enqueue(session)
+    session_writer.flush()
+    session.chat_history.append({"role": "user", "content": "python"})
+    session_writer.enqueue(session)
+    session_writer.flush()
+    assert [[(guest, len(messages)) for guest, messages in batch] for batch in writes] == [[("a", 2)], [("a", 1)]]
+
+def test_one_failing_change_does_not_block_the_others(writes):
+    session_writer.enqueue(_session("a", "hi"))
+    session_writer.enqueue(_session("bad", "x" * 10))
+    session_writer.enqueue(_session("b", "hey"))
+    session_writer.flush()
+    assert sorted(guest for batch in writes for guest, _ in batch) == ["a", "b"]
+    stats = session_writer.session_writer_stats()
+    assert stats["sessions_written"] == 2
+    assert stats["pending_sessions"] == 1
+
+def test_persistently_failing_change_is_dropped(writes, monkeypatch):
+    monkeypatch.setattr(session_writer, "SESSION_WRITE_MAX_ATTEMPTS", 3)
+    bad = _session("bad", "x")
+    session_writer.enqueue(bad)
+    session_writer.flush()
+    bad.chat_history.append({"role": "user", "content": "y"})
+    session_writer.enqueue(bad)
+    # Newer messages stay behind the failed ones
+    assert [m["content"] for m in session_writer._pending["bad"]["new_messages"]] == ["x", "y"]
+    for _ in range(2):
+        session_writer.flush()
+    stats = session_writer.session_writer_stats()
+    assert stats["dropped"] == 1
+    assert stats["pending_sessions"] == 0
+    session_writer.enqueue(_session("a", "hi"))
+    session_writer.flush()
+    assert writes == [[("a", [{"role": "user", "content": "hi"}])]]
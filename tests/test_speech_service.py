@@ -0,0 +1,36 @@
+import pytest
+
+from services import speech_service
+from services.cache import TTLCache
+
+ACCEPTED = ("WEBM_OPUS", 16000)
+
+@pytest.fixture
+def recognized(monkeypatch):
+    """Formats tried, in order; only ACCEPTED yields a transcript"""
+    tried = []
+
+    def recognize(audio, audio_format):
+        tried.append(audio_format)
+        return "hello" if audio_format == ACCEPTED else None
+
+    monkeypatch.setattr(speech_service, "_recognize", recognize)
+    monkeypatch.setattr(speech_service, "_learned_formats", TTLCache(4, 3600))
+    return tried
+
+def test_learned_format_ignores_mime_parameters(recognized):
+    assert speech_service.transcribe_audio(bytes(64), "audio/webm;codecs=opus") == "hello"
+    recognized.clear()
+    assert speech_service.transcribe_audio(bytes(64), "Audio/WebM; codecs=\"opus\"") == "hello"
+    assert recognized == [ACCEPTED]
+
+@pytest.mark.parametrize("content_type", [None, "", "text/plain", "audio/x-made-up", "audio/webm-but-not"])
+def test_unknown_content_types_are_not_learned(recognized, content_type):
+    speech_service.transcribe_audio(bytes(64), content_type)
+    assert speech_service._learned_formats.stats()["entries"] == 0
+
+def test_learned_formats_stay_bounded(recognized):
+    for i in range(100):
+        speech_service.transcribe_audio(bytes(64), f"audio/webm;session={i}")
+        speech_service.transcribe_audio(bytes(64), f"audio/x-{i}")
+    assert speech_service._learned_formats.stats()["entries"] == 1
@@ -0,0 +1,16 @@
+from services.firestore_service import split_roadmap
+
+def test_header_excludes_days():
+    header, days = split_roadmap({"topic": "Go", "summary": "s", "days": [{"day": 1, "lesson": "a"}]})
+    assert header == {"topic": "Go", "summary": "s"}
+    assert days == [{"day": 1, "lesson": "a"}]
+
+def test_unnumbered_days_fall_back_to_their_position():
+    roadmap = {"topic": "Go", "days": [{"day": 1, "lesson": "a"}, {"lesson": "b"}, {"day": None, "lesson": "c"}]}
+    _, days = split_roadmap(roadmap)
+    assert [day["day"] for day in days] == [1, 2, 3]
+    # The caller's roadmap is left as it was
+    assert "day" not in roadmap["days"][1]
+
+def test_roadmap_without_days():
+    assert split_roadmap({"topic": "Go"}) == ({"topic": "Go"}, [])
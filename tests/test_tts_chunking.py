@@ -0,0 +1,128 @@
+import io
+import threading
+import wave
+
+import pytest
+
+from services import tts_service
+from services.audio_cache import AudioCache
+from services.tts_service import generate_audio, split_text, stitch_audio
+
+def wav(frames, rate=24000, fill=b"\x01\x00"):
+    output = io.BytesIO()
+    with wave.open(output, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(rate)
+        out.writeframes(fill * frames)
+    return output.getvalue()
+
+def utf8_len(text):
+    return len(text.encode("utf-8"))
+
+def test_split_text_respects_the_first_and_later_chunk_limits():
+    text = " ".join(f"Sentence number {i} explains one idea." for i in range(40))
+    chunks = split_text(text, max_bytes=200, first_chunk_bytes=60)
+    assert utf8_len(chunks[0]) <= 60
+    assert all(utf8_len(chunk) <= 200 for chunk in chunks[1:])
+    # Only whole sentences, and nothing lost or reordered
+    assert all(chunk.endswith(".") for chunk in chunks)
+    assert " ".join(chunks) == text
+
+def test_split_text_breaks_run_on_sentences_at_words():
+    text = "word " * 100
+    chunks = split_text(text, max_bytes=50, first_chunk_bytes=50)
+    assert all(utf8_len(chunk) <= 50 for chunk in chunks)
+    assert " ".join(chunks).split() == text.split()
+
+def test_split_text_counts_bytes_not_characters():
+    text = "é" * 30 + ". " + "ü" * 30 + "."
+    chunks = split_text(text, max_bytes=70, first_chunk_bytes=70)
+    assert chunks == ["é" * 30 + ".", "ü" * 30 + "."]
+
+@pytest.mark.parametrize("text", ["", "   \n "])
+def test_split_text_of_nothing_is_empty(text):
+    assert split_text(text) == []
+
+def test_stitched_wav_has_one_correct_header():
+    parts = [wav(100), wav(250, fill=b"\x02\x00"), wav(7, fill=b"\x03\x00")]
+    with wave.open(io.BytesIO(stitch_audio(parts, "wav")), "rb") as stitched:
+        assert stitched.getnchannels() == 1
+        assert stitched.getsampwidth() == 2
+        assert stitched.getframerate() == 24000
+        assert stitched.getnframes() == 357
+        frames = stitched.readframes(357)
+    assert frames == b"\x01\x00" * 100 + b"\x02\x00" * 250 + b"\x03\x00" * 7
+
+def test_compressed_parts_are_concatenated():
+    assert stitch_audio([b"ID3a", b"b"], "mp3") == b"ID3ab"
+
+def test_stitching_nothing_fails_cleanly():
+    with pytest.raises(ValueError):
+        stitch_audio([], "wav")
+
+@pytest.fixture
+def synthesized(tmp_path, monkeypatch):
+    """Fake TTS: 10 frames per character; records every text synthesized"""
+    texts = []
+    lock = threading.Lock()
+
+    def synthesize(text, audio_format):
+        with lock:
+            texts.append(text)
+        return wav(10 * len(text))
+
+    monkeypatch.setattr(tts_service, "_synthesize", synthesize)
+    monkeypatch.setattr(tts_service, "audio_cache", AudioCache(directory=str(tmp_path)))
+    monkeypatch.setattr(tts_service, "TTS_FIRST_CHUNK_BYTES", 40)
+    monkeypatch.setattr(tts_service, "TTS_MAX_CHUNK_BYTES", 100)
+    return texts
+
+def frames_of(path):
+    with wave.open(path, "rb") as audio:
+        return audio.getnframes()
+
+def test_first_chunk_is_reported_before_the_whole_file(synthesized):
+    text = " ".join(f"This is sentence {i}." for i in range(12))
+    first_chunks = []
+    path = generate_audio(text, "wav", chunked=True, on_first_chunk=first_chunks.append)
+
+    chunks = split_text(text, 100, 40)
+    assert len(chunks) > 2
+    assert sorted(synthesized) == sorted(chunks)
+    assert len(first_chunks) == 1
+    assert first_chunks[0] != path
+    assert frames_of(first_chunks[0]) == 10 * len(chunks[0])
+    assert frames_of(path) == sum(10 * len(chunk) for chunk in chunks)
+
+def test_cache_hit_reports_the_whole_file_as_first_chunk(synthesized):
+    text = "One short line."
+    path = generate_audio(text, "wav", chunked=True)
+    first_chunks = []
+    assert generate_audio(text, "wav", chunked=True, on_first_chunk=first_chunks.append) == path
+    assert first_chunks == [path]
+    assert synthesized == [text]
+
+@pytest.mark.parametrize("text", ["", "  "])
+def test_empty_text_is_rejected(synthesized, text):
+    with pytest.raises(ValueError):
+        generate_audio(text, "wav", chunked=True)
+    assert synthesized == []
+
+def test_concurrent_streams_of_one_text_synthesize_once(synthesized):
+    text = " ".join(f"This is sentence {i}." for i in range(12))
+    outputs = [None] * 3
+
+    def listen(i):
+        outputs[i] = b"".join(tts_service.stream_audio(text, "wav"))
+
+    threads = [threading.Thread(target=listen, args=(i,)) for i in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert sorted(synthesized) == sorted(split_text(text))
+    # The leader streams an open-ended header, the others replay the stored file
+    assert all(output.startswith(b"RIFF") for output in outputs)
+    assert len({output[44:] for output in outputs}) == 1
+    assert tts_service.audio_cache.stats()["misses"] == 1
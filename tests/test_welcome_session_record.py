@@ -0,0 +1,39 @@
+import json
+
+import pytest
+
+from services import session_writer
+from services.welcome_service import WelcomeSession
+
+@pytest.fixture
+def writer(monkeypatch):
+    monkeypatch.setattr(session_writer, "_ensure_flusher", lambda: None)
+    monkeypatch.setattr(session_writer, "_pending", {})
+    monkeypatch.setattr(session_writer, "_queued_counts", session_writer.TTLCache(100, 3600))
+    return session_writer
+
+def _long_session(turns):
+    session = WelcomeSession("guest")
+    for turn in range(turns):
+        session.add_message("user", f"message {turn} " + "word " * 40)
+        session.add_message("assistant", f"reply {turn} " + "word " * 40)
+    return session
+
+def test_store_record_size_does_not_grow_with_the_conversation():
+    short = json.dumps(_long_session(20).to_dict())
+    long = json.dumps(_long_session(200).to_dict())
+    assert abs(len(long) - len(short)) < len(short) * 0.1
+
+def test_record_round_trip_keeps_the_message_count():
+    session = _long_session(50)
+    restored = WelcomeSession.from_dict(session.to_dict())
+    assert restored.message_count == 100
+    assert restored.chat_history[-1]["content"] == session.chat_history[-1]["content"]
+    assert restored._get_chat_context() == session._get_chat_context()
+
+def test_writer_only_queues_new_messages_of_a_restored_session(writer):
+    restored = WelcomeSession.from_dict(_long_session(50).to_dict())
+    writer.mark_persisted("guest", restored.message_count)
+    restored.add_message("user", "new one")
+    writer.enqueue(restored)
+    assert [m["content"] for m in writer._pending["guest"]["new_messages"]] == ["new one"]